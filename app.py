@@ -3,25 +3,47 @@ import subprocess
 import os
 import shutil
 from tools.ocr_script import perform_ocr
-from tools.response_generator import auto_draft_response, save_response_to_docx
+from tools.response_generator import auto_draft_response, build_docx, export_reports_zip
 import database  # Import database functions
-from docx import Document  # Import Document
-from io import BytesIO    # Import BytesIO
+import hashlib
+import tempfile
+import uuid
 from tools.metadata_extractor import extract_metadata # Import metadata extraction
+from tools.date_extractor import extract_due_date # Single-pass due date scanner
 import re # Import regex module
 from datetime import datetime # Import datetime for reminders
 import pandas as pd
+from tools import blob_store, bulk_io, dashboard_data, dedup, document_classifier, document_search, financials, gstr2b, ledger_delta, ledger_store, chat_memory, llm_scheduler, metrics, portfolio, profiling, reconciliation, retrieval, tax_periods
+
+# No-op unless FINIQ_PROFILE is set; a rerun interrupted by st.rerun() is discarded by the next one
+rerun_profile = profiling.start("app_rerun", replace=True)
+
+# Route this session to its firm/branch database (tools and stores follow database.get_tenant())
+if "tenant" not in st.session_state:
+    st.session_state.tenant = database.get_tenant() # FINIQ_TENANT, or the default tenant
+database.set_tenant(st.session_state.tenant)
 
 # Initialize database
 database.create_database()
 
 # Initialize session state for chat
-if "messages" not in st.session_state:
-    st.session_state.messages = [{"role": "assistant", "content": "How can I assist you with financial matters today?"}]
+if "chat_session_id" not in st.session_state:
+    st.session_state.chat_session_id = None # chat_sessions row, created with the first question
+if "chat_pages" not in st.session_state:
+    st.session_state.chat_pages = 1 # History pages rendered (see tools/chat_memory.PAGE_SIZE)
 if "due_date" not in st.session_state:
     st.session_state.due_date = None # Initialize due_date in session state
 if "selected_client_id" not in st.session_state:
     st.session_state.selected_client_id = None
+if "processed_docs" not in st.session_state:
+    st.session_state.processed_docs = {} # file name -> OCR text, drafted response and due date
+if "pending_duplicates" not in st.session_state:
+    st.session_state.pending_duplicates = {} # file name -> unconfirmed near duplicate (see tools/dedup.confirm_near)
+if "docx_cache" not in st.session_state:
+    st.session_state.docx_cache = {} # download key -> (text hash, .docx bytes) built on request
+if "llm_user" not in st.session_state:
+    st.session_state.llm_user = uuid.uuid4().hex # One LLM fairness bucket per browser session
+llm_scheduler.set_user(st.session_state.llm_user)
 
 
 # Configure page
@@ -36,109 +58,147 @@ with col1:
         st.subheader("FinIQ") # Fallback if logo not found
 with col2:
     st.title("FinIQ")
+    # A deployment pinned with FINIQ_TENANT serves one firm/branch; otherwise staff pick one
+    tenants = database.list_tenants()
+    if not os.getenv("FINIQ_TENANT") and len(tenants) > 1:
+        selected_tenant = st.selectbox("Firm / branch", tenants, index=tenants.index(st.session_state.tenant) if st.session_state.tenant in tenants else 0)
+        if selected_tenant != st.session_state.tenant:
+            st.session_state.tenant = selected_tenant
+            # Documents, clients and chats belong to the previous tenant
+            for key in ("processed_docs", "pending_duplicates", "docx_cache", "selected_client_id", "due_date", "chat_session_id", "chat_pages"):
+                st.session_state.pop(key, None)
+            st.rerun()
 
 # --- Core Financial Calculations ---
+# The calculations live in tools/financials.py so batch jobs can reuse them without Streamlit;
+# these wrappers add the UI warnings and error handling.
 def parse_excel_data(file):
     """Parses the uploaded Excel file and extracts relevant data."""
     try:
-        # Read the Excel file into a pandas DataFrame
-        df = pd.read_excel(file)
+        df = financials.read_ledger(file)
         # Basic validation: Check if essential columns might exist (adjust column names as needed)
-        # This is a very basic check; more robust validation might be needed.
-        required_cols_check = ['Transaction Type', 'Amount']
-        if not all(col in df.columns for col in required_cols_check):
-             st.warning(f"Uploaded Excel might be missing expected columns like: {', '.join(required_cols_check)}. Calculations might be affected.")
-        return df
+        missing = financials.missing_columns(df)
+        if missing:
+             st.warning(f"Uploaded Excel might be missing expected columns like: {', '.join(financials.REQUIRED_COLUMNS)}. Calculations might be affected.")
+        # Compact dtypes (categoricals, bools, int32, exact paise) so large ledgers fit in the session
+        normalized = financials.normalize_ledger(df, arrow=True)
+        report = financials.memory_report(df, normalized)
+        st.caption(f"Ledger memory: {report['before_bytes'] / 1e6:,.2f} MB → {report['after_bytes'] / 1e6:,.2f} MB ({report['ratio']:.1f}x smaller)")
+        return normalized
     except Exception as e:
         st.error(f"Error reading or parsing Excel file: {e}")
         return None # Return None to indicate failure
 
 def analyze_financials(df):
     """Calculates income, expenses, profit, and margin from the DataFrame."""
-    if df is None or not all(col in df.columns for col in ['Transaction Type', 'Amount']):
-        return 0, 0, 0, 0 # Return zeros or handle error appropriately
     try:
-        income = df.loc[df['Transaction Type'] == 'Income', 'Amount'].sum()
-        expenses = df.loc[df['Transaction Type'] == 'Expense', 'Amount'].sum()
-        profit = income - expenses
-        margin = profit / income if income else 0
-        return income, expenses, profit, margin
+        return financials.analyze_financials(df)
     except Exception as e:
         st.error(f"Error analyzing financials: {e}")
         return 0, 0, 0, 0
 
-def estimate_tax(df, rate=0.25):
-    """Estimates tax liability based on income and sums TDS."""
-    if df is None or not all(col in df.columns for col in ['Transaction Type', 'Amount']):
-        return 0, 0
+def estimate_tax(df, rate=0.25, slabs=None):
+    """Estimates tax liability (flat rate on income, or slabs on profit) and sums TDS."""
     try:
-        income_total = df.loc[df['Transaction Type'] == 'Income', 'Amount'].sum()
-        tax = income_total * rate
-        # Safely get TDS, sum only numeric values, default to 0 if column missing or non-numeric
-        tds = pd.to_numeric(df.get('TDS Deducted', pd.Series(dtype=float)), errors='coerce').fillna(0).sum()
-        return tax, tds
+        return financials.estimate_tax(df, rate, slabs)
     except Exception as e:
         st.error(f"Error estimating tax: {e}")
         return 0, 0
 
-def summarize_gst(df, gst_rate=0.18):
+def compute_periods(df):
+    """Monthly/quarterly/FY GST and tax tables with advance-tax installments, or None."""
+    if 'Date' not in df.columns:
+        st.info("Add a 'Date' column to the ledger to see the period breakdown.")
+        return None
+    try:
+        return tax_periods.compute_periods(df)
+    except Exception as e:
+        st.error(f"Error computing period breakdown: {e}")
+        return None
+
+def summarize_gst(df, gst_rate=0.18, eligible_itc=None):
     """Summarizes Input and Output GST based on 'GST Included' column."""
-    input_gst = output_gst = 0.0
-    if df is None or not all(col in df.columns for col in ['Transaction Type', 'Amount', 'GST Included']):
+    if financials.missing_columns(df, financials.GST_COLUMNS):
         st.warning("GST calculation requires 'Transaction Type', 'Amount', and 'GST Included' columns.")
         return 0, 0, 0
     try:
-        for _, row in df.iterrows():
-            # Ensure 'GST Included' is treated as boolean, handle potential non-boolean values
-            gst_included_flag = False
-            if isinstance(row['GST Included'], bool):
-                gst_included_flag = row['GST Included']
-            elif isinstance(row['GST Included'], str):
-                 gst_included_flag = row['GST Included'].strip().upper() == 'TRUE' # Example handling for string 'TRUE'
-
-            if gst_included_flag:
-                amount = pd.to_numeric(row['Amount'], errors='coerce')
-                if pd.isna(amount): continue # Skip if amount is not numeric
-
-                base = amount / (1 + gst_rate)
-                gst_amt = base * gst_rate
-                if row['Transaction Type'] in ['Income', 'GST Sale']:
-                    output_gst += gst_amt
-                elif row['Transaction Type'] in ['Expense', 'Asset']: # Assuming Assets also have input GST
-                    input_gst += gst_amt
-        net_gst = output_gst - input_gst
-        return input_gst, output_gst, net_gst
+        return financials.summarize_gst(df, gst_rate, eligible_itc)
     except Exception as e:
         st.error(f"Error summarizing GST: {e}")
         return 0, 0, 0
 
-def generate_visual_dashboards(df):
-    """Generates visual dashboards (placeholder)."""
+def match_gstr2b(df, file):
+    """Matches the ledger's purchases against an uploaded GSTR-2B, or returns None on error."""
+    try:
+        return gstr2b.match_itc(df, gstr2b.load_gstr2b(file, file.name))
+    except Exception as e:
+        st.error(f"Error matching GSTR-2B: {e}")
+        return None
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def cached_chart_frames(file_hash, _df):
+    """Chart frames for one upload, keyed on the file's hash (the DataFrame itself is not hashed)."""
+    return dashboard_data.chart_frames(_df)
+
+def generate_visual_dashboards(df, file_hash=None):
+    """Draws the P&L, transaction-type and cash-flow charts from pre-aggregated frames."""
     if df is None:
         return "No data available for dashboard."
-    # Placeholder: Create a simple bar chart
     try:
-        income, expenses, profit, _ = analyze_financials(df)
-        chart_data = pd.DataFrame({
-            'Metric': ['Income', 'Expenses', 'Profit'],
-            'Amount': [income, expenses, profit]
-        })
-        st.bar_chart(chart_data.set_index('Metric'))
+        frames = cached_chart_frames(file_hash, df) if file_hash else dashboard_data.chart_frames(df)
+        st.bar_chart(frames['pnl'])
+        if frames['by_type'] is not None:
+            st.bar_chart(frames['by_type'])
+        if frames['cash_flow'] is not None:
+            st.line_chart(frames['cash_flow'])
+            return f"P&L, totals by transaction type and {frames['resolution'].lower()} cash flow ({len(frames['cash_flow'])} points) displayed above."
         return "Basic P&L Chart Displayed Above." # Return text confirmation
     except Exception as e:
         st.error(f"Could not generate dashboard chart: {e}")
         return "Error generating dashboard."
 
 
-def to_docx(text):
-    """Creates a .docx file in memory containing the response text."""
-    doc = Document()
-    doc.add_paragraph(text)
-    buf = BytesIO(); doc.save(buf); buf.seek(0)
-    return buf
+DOCX_MIME = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+def temporary_download(label, build, file_name, mime, key):
+    """
+    Writes a file with build(file object) to a temporary file on disk and offers its bytes for
+    download in this run only. Nothing is kept in session state, so the next click rebuilds it
+    from the current data instead of serving a stale copy. Returns build's result.
+    """
+    with tempfile.TemporaryFile() as f:
+        result = build(f)
+        f.seek(0)
+        data = f.read()  # download_button doesn't accept the temporary file object itself
+    st.download_button(label=label, data=data, file_name=file_name, mime=mime, key=key)
+    return result
+
+def lazy_docx_download(label, text, file_name, key, heading=None):
+    """
+    Shows a button that builds the .docx only when clicked, then offers the download.
+    The built file is cached per key until the text changes, so reruns don't rebuild it.
+    """
+    text_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    cached = st.session_state.docx_cache.get(key)
+    if cached is None or cached[0] != text_hash:
+        if not st.button(f"Prepare {label}", key=f"prepare_{key}"):
+            return
+        cached = (text_hash, build_docx(text, heading).getvalue())
+        st.session_state.docx_cache[key] = cached
+    st.download_button(label=f"Download {label}", data=cached[1], file_name=file_name, mime=DOCX_MIME, key=f"download_{key}")
+
+def retrieve_context(question):
+    """Top matching chunks from the firm's indexed documents, or [] if retrieval is unavailable."""
+    try:
+        return retrieval.retrieve(question)
+    except ImportError:
+        return [] # transformers/torch not installed: answer without document context
+    except Exception as e:
+        st.warning(f"Could not search the document index: {e}")
+        return []
 
 # --- Main Content Tabs ---
-tab_chat, tab_docs, tab_clients, tab_reminders, tab_balance_sheet = st.tabs(["Chat/Tasks", "Document Processing", "Client Management", "Reminders", "Balance Sheet Analyzer"])
+tab_chat, tab_docs, tab_clients, tab_reminders, tab_balance_sheet, tab_admin = st.tabs(["Chat/Tasks", "Document Processing", "Client Management", "Reminders", "Balance Sheet Analyzer", "Admin"])
 
 with tab_balance_sheet:
     st.markdown("### Balance Sheet Analyzer & Tax Estimator")
@@ -154,6 +214,7 @@ with tab_balance_sheet:
             # Perform calculations
             income, expenses, profit, margin = analyze_financials(df_financials)
             tax, tds = estimate_tax(df_financials)
+            slab_tax, _ = estimate_tax(df_financials, slabs=financials.NEW_REGIME_SLABS)
             input_gst, output_gst, net_gst = summarize_gst(df_financials)
 
             # Display results
@@ -165,51 +226,182 @@ with tab_balance_sheet:
             c4.metric("Margin", f"{margin:.1%}")
 
             st.subheader("Tax & GST Summary")
+            uploaded_2b = st.file_uploader("Upload GSTR-2B (JSON/Excel) to verify input tax credit", type=["json", "xlsx"], key="gstr2b_uploader")
+            itc_match = match_gstr2b(df_financials, uploaded_2b) if uploaded_2b is not None else None
+            if itc_match is not None:
+                # Only ITC reported by suppliers in GSTR-2B counts towards input GST
+                input_gst, output_gst, net_gst = summarize_gst(df_financials, eligible_itc=itc_match['summary']['eligible_itc'])
             st.markdown(f"*Estimated Tax Liability (25% on Income):* ₹{tax:,.2f}")
+            st.markdown(f"*Estimated Tax (new-regime slabs on Profit, incl. cess):* ₹{slab_tax:,.2f}")
             st.markdown(f"*TDS Deducted:* ₹{tds:,.2f}")
             st.markdown(f"*Total Output GST:* ₹{output_gst:,.2f}")
             st.markdown(f"*Total Input GST:* ₹{input_gst:,.2f}")
             st.markdown(f"*Net GST Payable:* ₹{net_gst:,.2f}")
+            if itc_match is not None:
+                itc_summary = itc_match['summary']
+                st.caption(f"Input GST is ITC verified against GSTR-2B: ₹{itc_summary['eligible_itc']:,.2f} eligible of ₹{itc_summary['claimed_itc']:,.2f} claimed.")
+                g1, g2, g3, g4 = st.columns(4)
+                g1.metric("Matched", itc_summary['matched'])
+                g2.metric("Amount mismatch", itc_summary['amount_mismatch'])
+                g3.metric("Ineligible", itc_summary['ineligible'])
+                g4.metric("Missing in 2B", itc_summary['missing_in_2b'])
+                flagged = itc_match['purchases'][itc_match['purchases']['status'] != 'matched']
+                if not flagged.empty:
+                    st.markdown("*Purchases needing attention*")
+                    st.dataframe(flagged)
+                if not itc_match['not_in_books'].empty:
+                    st.markdown("*In GSTR-2B but not in the books*")
+                    st.dataframe(itc_match['not_in_books'])
+
+            periods = compute_periods(df_financials)
+            if periods is not None:
+                st.subheader("Period Breakdown")
+                view = st.radio("Period", ["Monthly", "Quarterly", "Financial Year"], horizontal=True, key="period_breakdown_view")
+                table_key = {"Monthly": "monthly", "Quarterly": "quarterly", "Financial Year": "fiscal_year"}[view]
+                st.dataframe(periods[table_key], hide_index=True)
+                st.markdown("*Advance Tax Installments*")
+                st.dataframe(periods['advance_tax'], hide_index=True)
 
             st.subheader("Visual Dashboard")
-            dashboard_status = generate_visual_dashboards(df_financials) # Generate and display chart
+            dashboard_status = generate_visual_dashboards(df_financials, hashlib.sha256(uploaded_excel.getvalue()).hexdigest()) # Generate and display chart
             st.caption(dashboard_status) # Display status/confirmation
 
-            # Download Report Button
-            if st.button("Generate Executive Report (.docx)", key="download_report_button"):
-                summary_text = (
-                    f"Financial Report for: {uploaded_excel.name}\n\n"
-                    f"Income: ₹{income:,.2f}\n"
-                    f"Expenses: ₹{expenses:,.2f}\n"
-                    f"Profit: ₹{profit:,.2f} (Margin: {margin:.1%})\n\n"
-                    f"Estimated Tax Liability (25% on Income): ₹{tax:,.2f}\n"
-                    f"TDS Deducted: ₹{tds:,.2f}\n\n"
-                    f"Output GST: ₹{output_gst:,.2f}\n"
-                    f"Input GST: ₹{input_gst:,.2f}\n"
-                    f"Net GST Payable: ₹{net_gst:,.2f}\n"
-                )
-                report_buffer = to_docx(summary_text)
-                st.download_button(
-                    label="Download Report Now",
-                    data=report_buffer,
-                    file_name=f"FinIQ_Report_{uploaded_excel.name}.docx",
-                    mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-                )
+            # Download Report Button (built only when requested)
+            summary_text = (
+                f"Financial Report for: {uploaded_excel.name}\n\n"
+                f"Income: ₹{income:,.2f}\n"
+                f"Expenses: ₹{expenses:,.2f}\n"
+                f"Profit: ₹{profit:,.2f} (Margin: {margin:.1%})\n\n"
+                f"Estimated Tax Liability (25% on Income): ₹{tax:,.2f}\n"
+                f"TDS Deducted: ₹{tds:,.2f}\n\n"
+                f"Output GST: ₹{output_gst:,.2f}\n"
+                f"Input GST: ₹{input_gst:,.2f}\n"
+                f"Net GST Payable: ₹{net_gst:,.2f}\n"
+            )
+            lazy_docx_download("Executive Report (.docx)", summary_text, f"FinIQ_Report_{uploaded_excel.name}.docx", key="executive_report")
+
+            # Persist the ledger to the columnar history store for the selected client
+            if st.session_state.selected_client_id:
+                if st.button("Save ledger to client history", key="save_ledger_history"):
+                    try:
+                        # Only vouchers not ingested before are stored and added to the running totals
+                        delta = ledger_delta.ingest_delta(st.session_state.selected_client_id, df_financials, uploaded_excel.name)
+                        st.success(f"Stored {delta['new_count']} new rows; {delta['skipped_count']} were already in the client's history.")
+                    except Exception as e:
+                        st.error(f"Error storing ledger: {e}")
+            else:
+                st.caption("Select a client in Client Management to save this ledger to their history.")
+
+            # Reconcile the ledger against a bank statement
+            st.subheader("Bank Reconciliation")
+            uploaded_bank = st.file_uploader("Upload bank statement (CSV/Excel)", type=["csv", "xlsx", "xls"], key="bank_statement_uploader")
+            if uploaded_bank is not None:
+                try:
+                    bank_df = reconciliation.read_bank_statement(uploaded_bank, uploaded_bank.name)
+                    recon = reconciliation.reconcile(df_financials, bank_df)
+                    summary = recon['summary']
+                    r1, r2, r3, r4 = st.columns(4)
+                    r1.metric("Matched (exact)", summary['exact'])
+                    r2.metric(f"Matched (±{reconciliation.DATE_TOLERANCE_DAYS} days)", summary['window'])
+                    r3.metric("Matched (narration)", summary['fuzzy'])
+                    r4.metric("Unmatched", summary['unmatched_ledger'] + summary['unmatched_bank'])
+                    st.markdown("*Ledger entries not found in the bank statement*")
+                    st.dataframe(recon['unmatched_ledger'])
+                    st.markdown("*Bank entries not found in the ledger*")
+                    st.dataframe(recon['unmatched_bank'].assign(amount=recon['unmatched_bank']['amount_paise'] / 100).drop(columns=['amount_paise']))
+                except Exception as e:
+                    st.error(f"Error reconciling bank statement: {e}")
         else:
             st.error("Could not process the uploaded Excel file. Please check the file format and content.")
 
+    if st.session_state.selected_client_id:
+        st.markdown("---")
+        st.subheader("Client History")
+        running_totals = database.get_ledger_totals(st.session_state.selected_client_id)
+        if running_totals:
+            t1, t2, t3, t4 = st.columns(4)
+            t1.metric("Income (all ingested)", f"₹{running_totals['income']:,.2f}")
+            t2.metric("Expenses (all ingested)", f"₹{running_totals['expenses']:,.2f}")
+            t3.metric("TDS (all ingested)", f"₹{running_totals['tds']:,.2f}")
+            t4.metric("Net GST (all ingested)", f"₹{running_totals['output_gst'] - running_totals['input_gst']:,.2f}")
+        try:
+            history_income = ledger_store.yoy_income(st.session_state.selected_client_id)
+            if history_income.empty:
+                st.info("No stored ledgers for this client yet.")
+            else:
+                st.markdown("**Income by financial year**")
+                st.dataframe(history_income, use_container_width=True)
+                st.markdown("**GST liability by quarter**")
+                st.dataframe(ledger_store.gst_by_quarter(st.session_state.selected_client_id), use_container_width=True)
+        except Exception as e:
+            st.error(f"Could not load ledger history: {e}")
+
+    st.markdown("---")
+    st.subheader("Firm-wide Portfolio")
+    with st.expander("Run batch analysis across all clients"):
+        ledger_folder = st.text_input("Ledger folder (files named '<client id>_...' or after the client)", value="data/ledgers")
+        include_linked = st.checkbox("Include ledgers linked to clients as documents", value=True)
+        if st.button("Analyze all client ledgers", key="run_portfolio_analysis"):
+            with st.spinner("Analyzing client ledgers..."):
+                try:
+                    stored, failures, unmatched = portfolio.run_portfolio_analysis(
+                        ledger_folder if os.path.isdir(ledger_folder) else None, include_linked
+                    )
+                    st.success(f"Stored {stored} client/period summaries.")
+                    for failed_path, error in failures:
+                        st.error(f"{failed_path}: {error}")
+                    if unmatched:
+                        st.warning("No client matched: " + ", ".join(os.path.basename(p) for p in unmatched))
+                except Exception as e:
+                    st.error(f"Error running portfolio analysis: {e}")
+
+    summary_periods = database.get_financial_summary_periods()
+    if summary_periods:
+        selected_period = st.selectbox("Period", summary_periods, key="portfolio_period")
+        portfolio_df = pd.DataFrame(
+            database.get_financial_summaries(selected_period),
+            columns=["Client ID", "Client", "Period", "Income", "Expenses", "Profit", "Margin", "Tax", "TDS",
+                     "Input GST", "Output GST", "Net GST", "Rows", "Source", "Computed At"],
+        )
+        st.dataframe(portfolio_df.drop(columns=["Client ID", "Period"]), use_container_width=True)
+    else:
+        st.info("No portfolio summaries yet. Run the batch analysis above.")
+
 with tab_chat:
     st.header("Chat with Financial Expert")
-    
-    # Display chat messages
-    for message in st.session_state.messages:
-        with st.chat_message(message["role"]):
-            st.markdown(message["content"])
+
+    # Pick up an earlier conversation or start a new one
+    chat_sessions = {f"{title or 'Untitled'} ({updated_at[:16]})": session_id for session_id, title, updated_at in database.get_chat_sessions()}
+    session_labels = ["New conversation"] + list(chat_sessions)
+    current_label = next((label for label, session_id in chat_sessions.items() if session_id == st.session_state.chat_session_id), "New conversation")
+    selected_label = st.selectbox("Conversation", session_labels, index=session_labels.index(current_label))
+    if chat_sessions.get(selected_label) != st.session_state.chat_session_id:
+        st.session_state.chat_session_id = chat_sessions.get(selected_label)
+        st.session_state.chat_pages = 1
+        st.rerun()
+
+    # Display chat messages, newest page first loaded; older pages on request
+    chat_history, has_older = ([], False)
+    if st.session_state.chat_session_id:
+        chat_history, has_older = chat_memory.history_page(st.session_state.chat_session_id, st.session_state.chat_pages)
+    if has_older and st.button("Show earlier messages"):
+        st.session_state.chat_pages += 1
+        st.rerun()
+    if not chat_history:
+        with st.chat_message("assistant"):
+            st.markdown(chat_memory.GREETING)
+    for _, role, content in chat_history:
+        with st.chat_message(role):
+            st.markdown(content)
 
     # Chat input and processing
     if prompt := st.chat_input("Ask the financial expert..."):
+        # Earlier turns for the prompt: running summary plus the latest turns verbatim
+        conversation = chat_memory.context(st.session_state.chat_session_id)
+        if st.session_state.chat_session_id is None:
+            st.session_state.chat_session_id = chat_memory.new_session()
         # Add user message to chat history
-        st.session_state.messages.append({"role": "user", "content": prompt})
+        chat_memory.add_message(st.session_state.chat_session_id, "user", prompt)
 
         # Display user message
         with st.chat_message("user"):
@@ -219,25 +411,41 @@ with tab_chat:
         with st.chat_message("assistant"):
             with st.spinner("Analyzing your query..."):
                 try:
+                    # Ground the answer in the firm's own notices and past replies
+                    context_chunks = retrieve_context(prompt)
+                    context_block = ""
+                    if context_chunks:
+                        context_block = f"""
+                        Relevant excerpts from the firm's documents (cite them as [n] when you use them):
+                        {retrieval.format_context(context_chunks)}
+                        """
+
+                    conversation_block = ""
+                    if conversation:
+                        conversation_block = f"""
+                        Conversation so far (use it to resolve follow-up questions):
+                        {conversation}
+                        """
+
                     # Create system prompt for financial focus
                     system_prompt = f"""You are a financial expert assistant.
+                        {conversation_block}
                         Respond to the user's query about financial matters: {prompt}
+                        {context_block}
                         Provide clear, professional advice with explanations.
                         If discussing numbers, format them clearly."""
                     
                     # Get response from Mistral via Ollama
-                    result = subprocess.run(
-                        ['ollama', 'run', 'mistral', system_prompt],
-                        capture_output=True,
-                        text=True,
-                        check=True,
-                        encoding='utf-8'
-                    )
+                    # Queued ahead of bulk drafting and shared fairly with other sessions (tools/llm_scheduler.py)
+                    result = llm_scheduler.run("chat", system_prompt)
                     response = result.stdout.strip()
                     
                     # Display and store response
                     st.markdown(response)
-                    st.session_state.messages.append({"role": "assistant", "content": response})
+                    if context_chunks:
+                        st.caption("Sources: " + ", ".join(f"[{n}] {chunk['filename']}" for n, chunk in enumerate(context_chunks, start=1)))
+                    chat_memory.add_message(st.session_state.chat_session_id, "assistant", response)
+                    chat_memory.compact(st.session_state.chat_session_id)
 
                 except subprocess.CalledProcessError as e:
                     st.error(f"Error generating response: {e.stderr}")
@@ -248,95 +456,139 @@ with tab_chat:
 with tab_docs:
     st.header("Document Processing")
 
-    def extract_due_date(text):
+    def reuse_processed(file_name, file_path, duplicate):
         """
-        Extracts a potential due date from the text based on keywords.
-        Looks for the first date after "due date", "deadline", or "payment by".
+        Shows the stored text and response of the document an upload duplicates instead of
+        processing it again, and links the upload to the selected client if the original isn't.
         """
-        keywords = ["due date", "deadline", "payment by"]
-        # Regex to find common date formats (DD/MM/YYYY, MM/DD/YYYY, YYYY-MM-DD, Month Day, Year)
-        # This is a basic pattern and might need refinement for more complex cases
-        date_pattern = r'\d{1,2}[-/]\d{1,2}[-/]\d{2,4}|\d{4}[-/]\d{1,2}[-/]\d{1,2}|(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)\s+\d{1,2},\s+\d{4}'
-
-        text_lower = text.lower()
-
-        for keyword in keywords:
-            keyword_index = text_lower.find(keyword)
-            if keyword_index != -1:
-                # Search for a date pattern after the keyword
-                search_start_index = keyword_index + len(keyword)
-                match = re.search(date_pattern, text[search_start_index:])
-                if match:
-                    return match.group(0) # Return the first found date after the keyword
-
-        return None # Return None if no date is found after any keyword
-
+        _, original_client_id, original_document_id, original_name, original_path, stored_text, stored_response, stored_type = database.get_document_text(duplicate["text_id"])
+        due_date = extract_due_date(stored_text)
+        st.session_state.processed_docs[file_name] = {
+            "text": stored_text,
+            "response": stored_response or "",
+            "due_date": due_date,
+            "filepath": original_path,
+            "document_type": stored_type,
+            "classified_by": "duplicate",
+            "details": None,
+        }
+        match_kind = "an exact copy" if duplicate["kind"] == "exact" else "a re-scan"
+        linked = f" (document ID {original_document_id})" if original_document_id else ""
+        st.info(f"{file_name} is {match_kind} of {original_name}{linked}; reusing its text and response.")
+
+        client_id = st.session_state.selected_client_id
+        if client_id and client_id != original_client_id:
+            try:
+                database.add_document(client_id, file_name, file_path, stored_type)
+                st.info(f"Document linked to client ID: {client_id}")
+            except Exception as e:
+                st.error(f"Error linking document to client: {e}")
+            if due_date:
+                try:
+                    database.add_reminder(client_id, due_date.strftime("%Y-%m-%d"), None, "Once", f"Due date from {file_name}")
+                    st.success(f"Reminder added for {due_date}")
+                except Exception as e:
+                    st.error(f"Error adding reminder to database: {e}")
 
-    def process_document(uploaded_file):
+    def process_document(uploaded_file, check_duplicates=True):
         """
         Performs OCR on the uploaded document, extracts due date, and generates a response.
         """
         if uploaded_file is not None:
             with st.spinner("Processing document..."):
-                # Create temporary directory if it doesn't exist
-                UPLOAD_DIR = "data/uploads"
-                os.makedirs(UPLOAD_DIR, exist_ok=True)
-
-                # Save uploaded file temporarily
-                file_path = os.path.join(UPLOAD_DIR, uploaded_file.name)
-                with open(file_path, "wb") as f:
-                    f.write(uploaded_file.getvalue())
+                # Stream the upload into the content-addressed store (identical files share one blob)
+                sha256, file_path, _ = blob_store.put_stream(uploaded_file, os.path.splitext(uploaded_file.name)[1])
+                st.session_state.pending_duplicates.pop(uploaded_file.name, None)
+
+                # Recognise re-sent or re-scanned notices before any OCR or LLM work
+                fingerprint = dedup.fingerprint_file(file_path, uploaded_file.name, sha256)
+                duplicate = dedup.find_duplicate(fingerprint) if check_duplicates else None
+                if duplicate and not (duplicate["text_id"] and database.get_document_text(duplicate["text_id"])):
+                    duplicate = None
+                if duplicate and duplicate["kind"] == "near":
+                    # Same-template notices hash alike, so only confirmed matches are reused
+                    confirmed = dedup.confirm_near(duplicate, file_path)
+                    if confirmed is None:
+                        st.session_state.pending_duplicates[uploaded_file.name] = dict(duplicate, upload_path=file_path)
+                        return
+                    if not confirmed:
+                        duplicate = None
+                metrics.cache_lookup("ocr_dedup", hit=duplicate is not None)
+                if duplicate:
+                    reuse_processed(uploaded_file.name, file_path, duplicate)
+                    return
 
                 # Perform OCR
                 extracted_text = perform_ocr(file_path)
                 due_date = extract_due_date(extracted_text) # Extract due date
                 if extracted_text:
-                    # Generate response
-                    response_letter = auto_draft_response(extracted_text)
-
-                    # Display results
-                    with st.expander(f"Results for {uploaded_file.name}", expanded=True):
-                        col1, col2 = st.columns(2)
-                        with col1:
-                            st.subheader("Extracted Text")
-                            st.code(extracted_text, language="markdown")
-                        with col2:
-                            st.subheader("Generated Response")
-                            ocr_edited_response = st.text_area(f"Edit OCR Response ({uploaded_file.name}):", response_letter, height=150, key=f"ocr_edit_{uploaded_file.name}")
-                            ocr_docx_buffer = save_response_to_docx(ocr_edited_response)
-                            st.download_button(
-                                label=f"Download OCR Response (.docx)",
-                                data=ocr_docx_buffer,
-                                file_name=f"FinIQ_OCR_{uploaded_file.name}.docx",
-                                mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-                            )
+                    # Classify cheaply first; only notices get a drafted reply
+                    classification = document_classifier.classify(extracted_text)
+                    document_type = classification["document_type"]
+                    route = document_classifier.route(document_type)
+                    response_letter, details = "", None
+                    if route == "draft":
+                        response_letter = auto_draft_response(extracted_text, document_type)
+                    elif route == "metadata":
+                        details = extract_metadata(extracted_text)
+                    elif route == "identifiers":
+                        details = document_classifier.extract_identifiers(extracted_text)
+
+                    # Keep the results so they survive reruns; they are rendered by show_document_result
+                    st.session_state.processed_docs[uploaded_file.name] = {
+                        "text": extracted_text,
+                        "response": response_letter,
+                        "due_date": due_date,
+                        "filepath": file_path,
+                        "document_type": document_type,
+                        "classified_by": classification["method"],
+                        "details": details,
+                    }
+
+                    # Persist the text and response, linked to the selected client, and add them to the search index
+                    document_id, text_id = None, None
+                    if st.session_state.selected_client_id:
+                        try:
+                            document_id = database.add_document(st.session_state.selected_client_id, uploaded_file.name, file_path, document_type)
+                            st.info(f"Document linked to client ID: {st.session_state.selected_client_id}")
+                        except Exception as e:
+                            st.error(f"Error linking document to client: {e}")
+                    try:
+                        text_id = document_search.index_document(
+                            file_path, uploaded_file.name, extracted_text, response_letter or None,
+                            client_id=st.session_state.selected_client_id, document_id=document_id,
+                            document_type=document_type, classified_by=classification["method"],
+                        )
+                        dedup.register(fingerprint, file_path, text_id, document_id) # Later copies of this notice will reuse these results
+                        document_classifier.refresh_model() # Learn from the rule / LLM labels gathered so far
+                    except Exception as e:
+                        st.error(f"Error indexing document for search: {e}")
+                    try:
+                        if text_id is not None:
+                            retrieval.sync_documents(text_ids=[text_id]) # Embed the new text so chat answers can draw on it
+                    except ImportError:
+                        pass # transformers/torch not installed: chat runs without retrieval
+                    except Exception as e:
+                        st.warning(f"Could not update the chat document index: {e}")
 
                     # Add reminder if due date is found
                     if due_date:
-                        st.write("Extracted Due Date:", due_date) # Display due date
                         st.session_state.due_date = due_date # Store in session state
                         # Add reminder to database - associate with selected client if available
                         client_id_for_reminder = st.session_state.selected_client_id if st.session_state.selected_client_id else None
                         reminder_description = f"Due date from {uploaded_file.name}"
                         try:
-                            database.add_reminder(client_id_for_reminder, due_date, reminder_description)
+                            # Stored as YYYY-MM-DD so the Celery reminder sweep can parse it
+                            database.add_reminder(client_id_for_reminder, due_date.strftime("%Y-%m-%d"), None, "Once", reminder_description)
                             st.success(f"Reminder added for {due_date}")
                         except Exception as e:
                             st.error(f"Error adding reminder to database: {e}")
 
                     else:
-                        st.write("Due Date: Not found")
                         st.session_state.due_date = None
 
 
-                    st.success(f"Successfully processed {uploaded_file.name}")
-                    # Optionally add document to database here, linking to client if selected
-                    # if st.session_state.selected_client_id:
-                    #     try:
-                    #         database.add_document(st.session_state.selected_client_id, uploaded_file.name, file_path, "Unknown") # Document type could be extracted or selected
-                    #         st.info(f"Document linked to client ID: {st.session_state.selected_client_id}")
-                    #     except Exception as e:
-                    #         st.error(f"Error linking document to client: {e}")
+                    st.success(f"Successfully processed {uploaded_file.name} ({document_type})")
 
 
                 else:
@@ -344,6 +596,58 @@ with tab_docs:
         else:
             return "Please upload a document.", None
 
+    def show_document_result(file_name, result):
+        """Renders the stored OCR text, document type and editable response for a processed document."""
+        with st.expander(f"Results for {file_name}", expanded=True):
+            document_type = result.get("document_type") or "Other"
+            type_col, method_col = st.columns([2, 3])
+            corrected_type = type_col.selectbox(
+                "Document type", document_classifier.DOCUMENT_TYPES,
+                index=document_classifier.DOCUMENT_TYPES.index(document_type) if document_type in document_classifier.DOCUMENT_TYPES else len(document_classifier.DOCUMENT_TYPES) - 1,
+                key=f"doc_type_{file_name}",
+            )
+            method_col.caption(f"Classified by: {result.get('classified_by') or 'unknown'}")
+            if corrected_type != document_type:
+                # User corrections are training labels for the classifier's model stage
+                database.set_document_type(result["filepath"], corrected_type)
+                result["document_type"], result["classified_by"] = corrected_type, "user"
+                document_classifier.refresh_model()
+            col1, col2 = st.columns(2)
+            with col1:
+                st.subheader("Extracted Text")
+                st.code(result["text"], language="markdown")
+            with col2:
+                if result.get("details"):
+                    st.subheader("Extracted Details")
+                    st.json(result["details"])
+                st.subheader("Generated Response")
+                if not result["response"]:
+                    # Non-notices skip drafting; the letter can still be drafted on request
+                    st.caption("No reply is drafted for this document type.")
+                    if st.button("Draft a response anyway", key=f"draft_{file_name}"):
+                        with st.spinner("Drafting response..."):
+                            result["response"] = auto_draft_response(result["text"], result.get("document_type"))
+                        database.update_document_response(result["filepath"], result["response"])
+                        result["saved_response"] = result["response"]
+                        st.rerun()
+                else:
+                    ocr_edited_response = st.text_area(f"Edit OCR Response ({file_name}):", result["response"], height=150, key=f"ocr_edit_{file_name}")
+                    if ocr_edited_response != result.get("saved_response", result["response"]):
+                        # Keep the stored (and searchable) letter in step with the user's edits
+                        database.update_document_response(result["filepath"], ocr_edited_response)
+                        result["saved_response"] = ocr_edited_response
+                    # The .docx is only built when the user asks for it, not on every rerun
+                    lazy_docx_download("OCR Response (.docx)", ocr_edited_response, f"FinIQ_OCR_{file_name}.docx", key=f"ocr_{file_name}", heading="Response Letter")
+            st.write("Extracted Due Date:", result["due_date"] if result["due_date"] else "Not found")
+
+    def edited_responses():
+        """Yields (file name, text, heading) for every processed document, using the edited text."""
+        for file_name, result in st.session_state.processed_docs.items():
+            text = st.session_state.get(f"ocr_edit_{file_name}", result["response"])
+            if not text:
+                continue # Nothing was drafted for this document
+            yield f"FinIQ_OCR_{file_name}.docx", text, "Response Letter"
+
 
     # File upload section
     uploaded_files = st.file_uploader("Choose PDF files",
@@ -355,16 +659,62 @@ with tab_docs:
         process_btn = st.button("Process Documents")
 
         if process_btn:
-            # Clear previous uploads if desired
-            # shutil.rmtree(UPLOAD_DIR)
-            # os.makedirs(UPLOAD_DIR)
-
             for file in uploaded_files:
                 process_document(file) # Process each uploaded file
 
+    # Near duplicates of scanned notices have no text to confirm them with, so the user decides
+    for pending_name, duplicate in list(st.session_state.pending_duplicates.items()):
+        prompt = st.empty()
+        with prompt.container():
+            original = database.get_document_text(duplicate["text_id"])
+            st.warning(f"{pending_name} looks like a re-scan of {original[3] if original else 'an earlier document'}. "
+                       "Is it the same notice? Different notices on the same template can look alike.")
+            reuse_col, new_col = st.columns(2)
+            reuse = reuse_col.button("Same notice: reuse its results", key=f"duplicate_reuse_{pending_name}")
+            process_new = new_col.button("Different notice: process it", key=f"duplicate_process_{pending_name}")
+        if reuse or process_new:
+            prompt.empty()
+            del st.session_state.pending_duplicates[pending_name]
+            if reuse:
+                metrics.cache_lookup("ocr_dedup", hit=True)
+                reuse_processed(pending_name, duplicate["upload_path"], duplicate)
+            else:
+                upload = next((file for file in uploaded_files or [] if file.name == pending_name), None)
+                if upload is None:
+                    st.warning(f"Upload {pending_name} again to process it.")
+                else:
+                    metrics.cache_lookup("ocr_dedup", hit=False)
+                    process_document(upload, check_duplicates=False)
+
+    for processed_name, processed_result in st.session_state.processed_docs.items():
+        show_document_result(processed_name, processed_result)
+
+    if len(st.session_state.processed_docs) > 1:
+        if st.button("Prepare all responses (.zip)", key="export_all_responses"):
+            # Built from the current edits on each click; each .docx is written straight into the archive on disk
+            temporary_download("Download all responses (.zip)", lambda archive: export_reports_zip(edited_responses(), archive),
+                               "FinIQ_OCR_Responses.zip", "application/zip", "download_all_responses")
+
+    st.markdown("---")
+    st.subheader("Search Documents")
+    search_col1, search_col2 = st.columns([3, 1])
+    search_text = search_col1.text_input("Search all notices and responses", key="document_search_text", placeholder="e.g. scrutiny, ITBA/AST/..., ABCDE1234F, 143(2)")
+    search_field = search_col2.selectbox("Search in", ["Full text", "DIN", "PAN", "Section"], key="document_search_field")
+    if search_text.strip():
+        field_args = {"Full text": "text", "DIN": "din", "PAN": "pan", "Section": "section"}
+        try:
+            hits = document_search.search(**{field_args[search_field]: search_text.strip()})
+        except Exception as e:
+            st.error(f"Error searching documents: {e}")
+            hits = []
+        if not hits:
+            st.info("No matching documents.")
+        for hit in hits:
+            st.markdown(f"**{hit['filename']}** — {hit['client_name'] or 'No client'}")
+            st.caption(hit['snippet'])
 
     st.markdown("---")
-    st.caption("Note: Uploaded files are temporarily stored for processing.")
+    st.caption("Note: Uploaded files are stored for processing; files not linked to a client are removed by `python -m tools.blob_store gc`.")
 
 
 with tab_clients:
@@ -377,9 +727,8 @@ with tab_clients:
         client_email = st.text_input("Email (optional)")
         client_phone = st.text_input("Phone (optional)")
         
-        # Email validation using regex
-        email_regex = r"^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$"
-        if client_email and not re.match(email_regex, client_email):
+        # Email validation using regex (shared with bulk imports)
+        if client_email and not re.match(bulk_io.EMAIL_REGEX, client_email):
             st.error("Invalid email format.")
             submit_button = st.form_submit_button("Add Client", disabled=True) # Disable submit button if email is invalid
         else:
@@ -396,24 +745,54 @@ with tab_clients:
             else:
                 st.error("Client Name is required.")
 
+    with st.expander("Bulk import / export"):
+        st.caption("Upload a CSV/Excel sheet of clients (Name, Email, Phone) or reminders (Client Email or Client Name, Due Date, Time, Frequency, Description). Import clients before their reminders; rows with errors are skipped.")
+        import_table = st.radio("Import", ["Clients", "Reminders"], horizontal=True, key="bulk_import_table")
+        import_file = st.file_uploader("Upload sheet", type=["csv", "xlsx", "xls"], key="bulk_import_file")
+        if import_file:
+            importer = bulk_io.IMPORTERS[import_table.lower()]
+            try:
+                preview = importer(import_file, import_file.name, dry_run=True)
+            except Exception as e:
+                st.error(f"Error reading {import_file.name}: {e}")
+                preview = None
+            if preview:
+                st.write(f"{preview.valid} valid rows, {len(preview.errors)} with errors.")
+                if len(preview.errors):
+                    st.dataframe(preview.errors, hide_index=True)
+                if st.button(f"Import {preview.valid} {import_table.lower()}", disabled=not preview.valid, key="bulk_import_button"):
+                    try:
+                        import_file.seek(0)
+                        result = importer(import_file, import_file.name)
+                        st.success(f"Added {result.inserted} and updated {result.updated} {import_table.lower()}.")
+                    except Exception as e:
+                        st.error(f"Error importing {import_table.lower()}: {e}")
+
+        if st.button("Prepare backup (.zip)", key="bulk_export_button"):
+            # Built from the current clients and reminders on each click, streamed into a file on disk
+            counts = temporary_download("Download backup (.zip)", bulk_io.export_backup,
+                                        f"FinIQ_clients_{st.session_state.tenant}_{datetime.now():%Y%m%d}.zip",
+                                        "application/zip", "download_clients_backup")
+            st.caption(f"{counts['clients']} clients and {counts['reminders']} reminders exported.")
+
     st.markdown("---")
     st.subheader("Existing Clients")
 
     # Display Existing Clients
     clients = database.get_all_clients()
     if clients:
-        client_names = [client[1] for client in clients]
+        client_names = [client.name for client in clients]
         selected_client_name = st.selectbox("Select a Client", ["-- Select Client --"] + client_names)
 
         if selected_client_name != "-- Select Client --":
             # Find the selected client's ID
-            selected_client = next((client for client in clients if client[1] == selected_client_name), None)
+            selected_client = next((client for client in clients if client.name == selected_client_name), None)
             if selected_client:
-                st.session_state.selected_client_id = selected_client[0]
-                st.write(f"**Selected Client:** {selected_client[1]}")
-                st.write(f"Email: {selected_client[2]}")
-                st.write(f"Phone: {selected_client[3]}")
-                st.write(f"Added On: {selected_client[4]}")
+                st.session_state.selected_client_id = selected_client.id
+                st.write(f"**Selected Client:** {selected_client.name}")
+                st.write(f"Email: {selected_client.email}")
+                st.write(f"Phone: {selected_client.phone}")
+                st.write(f"Added On: {selected_client.created_at}")
 
                 # Display documents for the selected client (Optional)
                 # st.subheader("Documents")
@@ -429,7 +808,7 @@ with tab_clients:
                 client_reminders = database.get_reminders(st.session_state.selected_client_id)
                 if client_reminders:
                     for reminder in client_reminders:
-                        st.write(f"- **Due Date:** {reminder[2]}, **Description:** {reminder[3]}")
+                        st.write(f"- **Due Date:** {reminder.due_date}, **Description:** {reminder.description}")
                 else:
                     st.info("No reminders found for this client.")
 
@@ -449,13 +828,13 @@ with tab_reminders:
         st.subheader("Add New Reminder")
         # Optionally link to a client
         clients_for_reminder = database.get_all_clients()
-        client_options = {client[1]: client[0] for client in clients_for_reminder}
+        client_options = {client.name: client.id for client in clients_for_reminder}
         selected_client_name_reminder = st.selectbox("Link to Client (optional)", ["-- Select Client --"] + list(client_options.keys()))
         linked_client_id = client_options.get(selected_client_name_reminder) if selected_client_name_reminder != "-- Select Client --" else None
 
         reminder_date = st.date_input("Due Date")
         reminder_time = st.time_input("Reminder Time", value=datetime.now().time()) # Add time input with default value
-        reminder_frequency = st.selectbox("Frequency", ["Once", "Daily", "Weekly", "Monthly"], index=0) # Frequency dropdown
+        reminder_frequency = st.selectbox("Frequency", bulk_io.FREQUENCIES, index=0) # Frequency dropdown
         reminder_description = st.text_area("Description")
         add_reminder_button = st.form_submit_button("Add Reminder")
 
@@ -464,8 +843,7 @@ with tab_reminders:
                 # Check if a client is linked and if they have an email
                 if linked_client_id:
                     client = database.get_client_by_id(linked_client_id)
-                    # client[2] is the email field from the database query result
-                    if client and (client[2] is None or client[2].strip() == ""):
+                    if client and (client.email is None or client.email.strip() == ""):
                         st.error("Cannot add reminder: Selected client does not have an email address.")
                         # Stop here if client has no email
 
@@ -488,13 +866,73 @@ with tab_reminders:
     all_reminders = database.get_reminders()
     if all_reminders:
         # Sort reminders by due date
-        sorted_reminders = sorted(all_reminders, key=lambda x: x[2])
+        sorted_reminders = sorted(all_reminders, key=lambda x: x.due_date)
         for reminder in sorted_reminders:
             client_info = ""
-            if reminder[1]: # If client_id is not None
-                client = database.get_client_by_id(reminder[1])
+            if reminder.client_id: # If client_id is not None
+                client = database.get_client_by_id(reminder.client_id)
                 if client:
-                    client_info = f" (Client: {client[1]})"
-            st.write(f"- **Due Date:** {reminder[2]}, **Description:** {reminder[3]}{client_info}")
+                    client_info = f" (Client: {client.name})"
+            st.write(f"- **Due Date:** {reminder.due_date}, **Description:** {reminder.description}{client_info}")
     else:
         st.info("No reminders added yet.")
+
+with tab_admin:
+    st.header("Pipeline Metrics")
+    st.caption(f"Merged from every FinIQ process (Streamlit, Celery, completion server) via {metrics.METRICS_DB_PATH}. Also served to Prometheus at /metrics on the completion server.")
+    metrics.flush()  # Include this session's latest values
+    metric_data = metrics.snapshot()
+    if not metric_data:
+        st.info("No metrics recorded yet. Process a document or send a chat message first.")
+    else:
+        ocr_seconds = metrics.merge_series(metric_data, "finiq_ocr_seconds")
+        ocr_pages = metrics.merge_series(metric_data, "finiq_ocr_pages_total") or 0
+        llm_latency = metrics.merge_series(metric_data, "finiq_llm_seconds")
+        emails_sent = metrics.merge_series(metric_data, "finiq_emails_total", status="sent") or 0
+        emails_failed = metrics.merge_series(metric_data, "finiq_emails_total", status="failed") or 0
+        last_scan = metrics.merge_series(metric_data, "finiq_reminder_scan_seconds")
+
+        col_ocr, col_p50, col_p95, col_emails, col_scan = st.columns(5)
+        col_ocr.metric("OCR pages/sec", f"{ocr_pages / ocr_seconds['sum']:.2f}" if ocr_seconds and ocr_seconds["sum"] else "-")
+        p50, p95 = metrics.histogram_quantile(llm_latency, 0.5), metrics.histogram_quantile(llm_latency, 0.95)
+        col_p50.metric("LLM p50", f"{p50:.1f} s" if p50 is not None else "-")
+        col_p95.metric("LLM p95", f"{p95:.1f} s" if p95 is not None else "-")
+        col_emails.metric("Emails sent / failed", f"{int(emails_sent)} / {int(emails_failed)}")
+        col_scan.metric("Reminder scan (mean)", f"{last_scan['sum'] / last_scan['count']:.2f} s" if last_scan and last_scan["count"] else "-",
+                        help=f"Reminders currently scheduled: {int(metrics.merge_series(metric_data, 'finiq_reminders_scheduled') or 0)}")
+
+        st.subheader("LLM calls by task")
+        llm_rows = metrics.summarize(metric_data, "finiq_llm_seconds", "task")
+        for row in llm_rows:
+            row["prompt_tokens"] = int(metrics.merge_series(metric_data, "finiq_llm_tokens_total", task=row["task"], kind="prompt") or 0)
+            row["completion_tokens"] = int(metrics.merge_series(metric_data, "finiq_llm_tokens_total", task=row["task"], kind="completion") or 0)
+        if llm_rows:
+            st.dataframe(pd.DataFrame(llm_rows), hide_index=True, use_container_width=True)
+        else:
+            st.write("No LLM calls recorded.")
+
+        st.subheader("Cache hit rates")
+        cache_series = metric_data.get("finiq_cache_requests_total", {}).get("series", [])
+        cache_rows = []
+        for cache in sorted({labels.get("cache", "") for labels, _ in cache_series}):
+            hits = metrics.merge_series(metric_data, "finiq_cache_requests_total", cache=cache, result="hit") or 0
+            misses = metrics.merge_series(metric_data, "finiq_cache_requests_total", cache=cache, result="miss") or 0
+            cache_rows.append({"cache": cache, "hits": int(hits), "misses": int(misses), "hit_rate": f"{hits / (hits + misses):.1%}" if hits + misses else "-"})
+        if cache_rows:
+            st.dataframe(pd.DataFrame(cache_rows), hide_index=True, use_container_width=True)
+        else:
+            st.write("No cache lookups recorded.")
+
+        st.subheader("Database query time by function")
+        db_rows = metrics.summarize(metric_data, "finiq_db_query_seconds", "function")
+        if db_rows:
+            st.dataframe(pd.DataFrame(db_rows), hide_index=True, use_container_width=True)
+
+        with st.expander("Prometheus exposition"):
+            st.code(metrics.render_prometheus(metric_data), language="text")
+
+    if st.button("Reset metrics", help="Clears the recorded values of every process"):
+        metrics.reset()
+        st.rerun()
+
+profiling.stop(rerun_profile)
@@ -0,0 +1 @@
+# Benchmark scripts for FinIQ pipelines
@@ -0,0 +1,103 @@
+"""
+Benchmark for due-date extraction on large notices.
+
+Compares the previous keyword-then-regex implementations with the single-pass scanner in
+tools/date_extractor.py, on the whole text and fed page by page.
+
+Usage:
+    python -m benchmarks.due_dates [--pages 2000] [--repeat 3]
+"""
+import argparse
+import random
+import re
+import time
+
+from tools.date_extractor import extract_due_date, extract_due_date_pages
+
+FILLER = (
+    "The assessee has furnished the return of income declaring total income of Rs. {amount}. "
+    "Information received indicates transactions of Rs. {amount} on {day:02d}/{month:02d}/2024 "
+    "which require verification under the provisions of the Act. "
+)
+DEADLINE = "You are requested to submit your reply on or before {day:02d}-{month:02d}-2025.\n"
+
+
+def make_notice(pages, seed=0):
+    """Builds a synthetic multi-page notice. Returns a list of page texts."""
+    rng = random.Random(seed)
+    result = []
+    for page_no in range(pages):
+        lines = [
+            FILLER.format(amount=rng.randint(10_000, 9_000_000), day=rng.randint(1, 28), month=rng.randint(1, 12))
+            for _ in range(20)
+        ]
+        if page_no == pages - 1:
+            lines.append(DEADLINE.format(day=15, month=7))
+        result.append("".join(lines))
+    return result
+
+
+def legacy_app_extract(text):
+    """The previous app.py implementation (one find + regex per keyword)."""
+    keywords = ["due date", "deadline", "payment by"]
+    date_pattern = r'\d{1,2}[-/]\d{1,2}[-/]\d{2,4}|\d{4}[-/]\d{1,2}[-/]\d{1,2}|(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)\s+\d{1,2},\s+\d{4}'
+    text_lower = text.lower()
+    for keyword in keywords:
+        keyword_index = text_lower.find(keyword)
+        if keyword_index != -1:
+            match = re.search(date_pattern, text[keyword_index + len(keyword):])
+            if match:
+                return match.group(0)
+    return None
+
+
+def legacy_script_extract(markdown_text):
+    """The previous tools/ocr_script.py implementation (five separate searches)."""
+    date_patterns = [
+        r"Due Date:?\s*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})",
+        r"Payment Date:?\s*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})",
+        r"Date Due:?\s*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})",
+        r"Expiry Date:?\s*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})",
+        r"Last Date to Pay:?\s*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})",
+    ]
+    for pattern in date_patterns:
+        match = re.search(pattern, markdown_text, re.IGNORECASE)
+        if match:
+            return match.group(1)
+    return None
+
+
+def _time(func, repeat):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark due-date extraction on large notices.")
+    parser.add_argument("--pages", type=int, default=2000, help="Pages in the synthetic notice")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per implementation (best is reported)")
+    args = parser.parse_args()
+
+    pages = make_notice(args.pages)
+    text = "\n".join(pages)
+    size_mb = len(text) / 1e6
+    print(f"Notice: {args.pages} pages, {size_mb:.1f} MB")
+
+    runs = {
+        "legacy app.extract_due_date": lambda: legacy_app_extract(text),
+        "legacy ocr_script.extract_due_date": lambda: legacy_script_extract(text),
+        "date_extractor.extract_due_date": lambda: extract_due_date(text),
+        "date_extractor.extract_due_date_pages (streamed)": lambda: extract_due_date_pages(pages),
+    }
+    for label, func in runs.items():
+        seconds, result = _time(func, args.repeat)
+        print(f"{label:48s} {seconds * 1000:9.1f} ms  {size_mb / seconds:7.1f} MB/s  -> {result}")
+
+
+if __name__ == "__main__":
+    main()
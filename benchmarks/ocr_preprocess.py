@@ -0,0 +1,129 @@
+"""
+Benchmark for the image OCR path in tools/ocr_engine.py.
+
+Generates a small synthetic corpus of notice pages (clean scans, high-resolution phone
+photos, noisy and skewed captures) with known ground-truth text, then runs
+extract_text_from_image with the legacy settings and the tuned defaults and reports
+per-stage time and character accuracy.
+
+Usage:
+    python -m benchmarks.ocr_preprocess [--corpus data/bench/ocr] [--pages 2]
+"""
+import argparse
+import json
+import os
+import random
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import NOTICE_LINES, render_page
+from tools.ocr_engine import PIPELINE_STAGES, extract_text_from_image
+
+# Settings that reproduce the previous pipeline: full resolution, always denoise, no deskew,
+# a single full-page tesseract call with --psm 3
+LEGACY_OPTIONS = {
+    "target_dpi": None,
+    "denoise_threshold": 0,
+    "deskew": False,
+    "split_regions": False,
+}
+
+# name: (dpi, noise sigma, skew degrees)
+CORPUS_VARIANTS = {
+    "clean_300dpi": (300, 0, 0.0),
+    "phone_600dpi": (600, 4, 0.0),
+    "phone_noisy_600dpi": (600, 18, 0.0),
+    "skewed_300dpi": (300, 6, 3.5),
+}
+
+
+def build_corpus(corpus_dir, pages_per_variant=2):
+    """Writes the synthetic corpus to disk. Returns a list of (image_path, ground_truth)."""
+    os.makedirs(corpus_dir, exist_ok=True)
+    rng = random.Random(42)
+    corpus = []
+    for name, (dpi, noise, skew) in CORPUS_VARIANTS.items():
+        for page_no in range(pages_per_variant):
+            # Keep the header block fixed and shuffle the body so pages differ
+            body = NOTICE_LINES[6:]
+            rng.shuffle(body)
+            lines = NOTICE_LINES[:6] + body
+            path = os.path.join(corpus_dir, f"{name}_{page_no}.png")
+            if not os.path.exists(path):
+                render_page(lines, dpi, noise, skew, seed=page_no).save(path, dpi=(dpi, dpi))
+            corpus.append((path, "\n".join(lines)))
+    return corpus
+
+
+def levenshtein(a, b):
+    """Edit distance between two strings (two-row dynamic programming)."""
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+
+def character_accuracy(predicted, truth):
+    """1 - CER, computed on whitespace-normalised text."""
+    predicted = " ".join((predicted or "").split())
+    truth = " ".join(truth.split())
+    if not truth:
+        return 1.0
+    return max(0.0, 1.0 - levenshtein(predicted, truth) / len(truth))
+
+
+def run_benchmark(corpus, options):
+    """Runs the OCR path over the corpus. Returns per-image rows with stage timings and accuracy."""
+    rows = []
+    for path, truth in corpus:
+        timings = {}
+        start = time.perf_counter()
+        text = extract_text_from_image(path, options=options, timings=timings)
+        row = {stage: round(timings.get(stage, 0.0), 4) for stage in PIPELINE_STAGES}
+        row.update({
+            "image": os.path.basename(path),
+            "total": round(time.perf_counter() - start, 4),
+            "accuracy": round(character_accuracy(text, truth), 4),
+        })
+        rows.append(row)
+    return rows
+
+
+def _print_table(label, rows):
+    columns = ["image", *PIPELINE_STAGES, "total", "accuracy"]
+    print(f"\n== {label} ==")
+    print(" | ".join(columns))
+    for row in rows:
+        print(" | ".join(str(row[c]) for c in columns))
+    print(f"mean total: {np.mean([r['total'] for r in rows]):.3f}s, "
+          f"mean accuracy: {np.mean([r['accuracy'] for r in rows]):.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the image OCR preprocessing pipeline.")
+    parser.add_argument("--corpus", default="data/bench/ocr", help="Directory for the generated corpus")
+    parser.add_argument("--pages", type=int, default=2, help="Pages per corpus variant")
+    parser.add_argument("--json", help="Optional path to write the results as JSON")
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.corpus, args.pages)
+    results = {
+        "legacy": run_benchmark(corpus, LEGACY_OPTIONS),
+        "tuned": run_benchmark(corpus, None),
+    }
+    for label, rows in results.items():
+        _print_table(label, rows)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Benchmark for the local retrieval index (tools/retrieval.py).
+
+Builds an index of synthetic unit vectors with topic structure (100k chunks by default) and
+reports build time, query latency for IVF search at several nprobe values and for an exact
+scan, and recall@k of IVF against the exact result. With --model, it also times embedding a
+sample of synthetic notice chunks with the real sentence-transformer on CPU.
+
+Usage:
+    python -m benchmarks.retrieval [--chunks 100000] [--queries 200] [--model] [--json results.json]
+"""
+import argparse
+import json
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from tools import retrieval
+
+
+def make_vectors(count, dim, topics=500, spread=0.35, seed=0):
+    """Unit vectors drawn around random topic centres, like embeddings of related notices."""
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((topics, dim)).astype(np.float32)
+    vectors = centres[rng.integers(0, topics, count)] + spread * rng.standard_normal((count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _percentiles(samples):
+    return {"p50_ms": float(np.percentile(samples, 50) * 1000), "p95_ms": float(np.percentile(samples, 95) * 1000)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark retrieval index build and query latency.")
+    parser.add_argument("--chunks", type=int, default=100_000, help="Chunks in the synthetic index")
+    parser.add_argument("--dim", type=int, default=384, help="Embedding dimension (MiniLM-L6 is 384)")
+    parser.add_argument("--queries", type=int, default=200, help="Queries per configuration")
+    parser.add_argument("-k", type=int, default=10, help="Neighbours per query")
+    parser.add_argument("--model", action="store_true", help="Also time real CPU embedding of 256 chunks")
+    parser.add_argument("--json", help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    results = {"chunks": args.chunks, "dim": args.dim, "k": args.k}
+    vectors = make_vectors(args.chunks, args.dim)
+    queries = make_vectors(args.queries, args.dim, seed=1)
+    records = [{"source_key": f"{i // 20}:ocr", "filename": f"notice_{i // 20}.pdf", "kind": "ocr", "text": f"chunk {i}"} for i in range(args.chunks)]
+
+    root = tempfile.mkdtemp(prefix="finiq_retrieval_")
+    try:
+        index = retrieval.RetrievalIndex(root)
+        start = time.perf_counter()
+        index.add(records, vectors)  # The tail exceeds the rebuild ratio, so this also clusters
+        results["build_s"] = time.perf_counter() - start
+        print(f"Build: {args.chunks} chunks in {results['build_s']:.2f} s ({index.meta.get('ivf_rows', 0)} rows in IVF lists)")
+
+        exact_ids, timings = [], []
+        for query in queries:
+            start = time.perf_counter()
+            exact_ids.append(set(index.search_vector(query, args.k, exact=True)[1].tolist()))
+            timings.append(time.perf_counter() - start)
+        results["exact"] = _percentiles(timings)
+        print(f"{'exact scan':14s} p50 {results['exact']['p50_ms']:7.2f} ms  p95 {results['exact']['p95_ms']:7.2f} ms  recall@{args.k} 1.000")
+
+        for nprobe in (4, 8, 16, 32):
+            timings, hits = [], 0
+            for query, expected in zip(queries, exact_ids):
+                start = time.perf_counter()
+                _, ids = index.search_vector(query, args.k, nprobe=nprobe)
+                timings.append(time.perf_counter() - start)
+                hits += len(expected & set(ids.tolist()))
+            stats = dict(_percentiles(timings), recall=hits / (args.k * len(queries)))
+            results[f"ivf_nprobe_{nprobe}"] = stats
+            print(f"{'ivf nprobe=' + str(nprobe):14s} p50 {stats['p50_ms']:7.2f} ms  p95 {stats['p95_ms']:7.2f} ms  recall@{args.k} {stats['recall']:.3f}")
+        index.close()
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    if args.model:
+        words = "assessment notice reply income tax section return demand penalty scrutiny refund verification".split()
+        rng = np.random.default_rng(2)
+        texts = [" ".join(rng.choice(words, retrieval.CHUNK_WORDS)) for _ in range(256)]
+        embedder = retrieval.Embedder()
+        embedder.encode(texts[:8])  # Load the model outside the timing
+        start = time.perf_counter()
+        embedder.encode(texts)
+        seconds = time.perf_counter() - start
+        results["embed_chunks_per_s"] = len(texts) / seconds
+        print(f"Embedding: {results['embed_chunks_per_s']:.1f} chunks/s on CPU ({retrieval.MODEL_NAME})")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
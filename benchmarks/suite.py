@@ -0,0 +1,358 @@
+"""
+End-to-end benchmark suite.
+
+Generates synthetic ledgers and notice PDFs (benchmarks/synthetic.py) and times the stages the
+app runs on them:
+
+  ledger    read_ledger + normalize_ledger (what app.parse_excel_data does), analyze_financials,
+            summarize_gst, estimate_tax and compute_periods, at every --rows size
+  notices   perform_ocr on digital and scanned PDFs, then extract_due_date (checked against the
+            known due date) and classification, at every --pages / --scanned-pages size
+  database  client, document and reminder writes and reads, index_document and search, against
+            a temporary database so client_management.db is never touched
+  pipeline  a notice through classify -> draft -> index -> reminder, with a stub `ollama` on PATH
+            that answers after --llm-latency seconds, so no model is needed
+
+The Streamlit wrappers in app.py only add UI messages around the shared implementations in
+tools/, so those are timed directly. Stages whose optional dependencies are missing (docling for
+OCR) are recorded as skipped rather than failing the run.
+
+Results go to JSON as {"meta": ..., "results": {name: {"seconds": ..., ...}}}. With --baseline,
+every timing is compared with an earlier run and the exit code is 1 if any slowed down by more
+than --threshold, for regression tracking in CI.
+
+Usage:
+    python -m benchmarks.suite --json bench.json
+    python -m benchmarks.suite --rows 10000,100000,1000000,10000000 --pages 1,10,100 --scanned-pages 1,10,100
+    python -m benchmarks.suite --json new.json --baseline bench.json [--threshold 0.2]
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+
+import database
+from benchmarks import synthetic
+from tools import document_classifier, document_search, financials, tax_periods
+from tools import metrics as pipeline_metrics
+from tools.date_extractor import extract_due_date
+from tools.response_generator import auto_draft_response
+
+STUB_LETTER = "Dear Sir/Madam,\\n\\nWith reference to the above notice, we submit our reply.\\n\\nYours faithfully"
+MIN_COMPARABLE_SECONDS = 0.001  # Faster timings are mostly noise and are not compared
+
+
+def _int_list(value):
+    return [int(item) for item in value.split(",") if item.strip()]
+
+
+def measure(func, repeat=1):
+    """Runs func `repeat` times. Returns (best seconds, last result)."""
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def latencies(func, args_list):
+    """
+    Times func once per argument tuple. Returns {'seconds', 'p50_ms', 'p95_ms'}, where seconds is
+    the mean per call so runs with different counts stay comparable.
+    """
+    samples = []
+    for args in args_list:
+        start = time.perf_counter()
+        func(*args)
+        samples.append(time.perf_counter() - start)
+    return {
+        "seconds": float(np.mean(samples)),
+        "p50_ms": float(np.percentile(samples, 50) * 1000),
+        "p95_ms": float(np.percentile(samples, 95) * 1000),
+    }
+
+
+def record(results, name, seconds=None, **metrics):
+    entry = {"seconds": round(seconds, 6)} if seconds is not None else {}
+    entry.update({key: round(value, 4) if isinstance(value, float) else value for key, value in metrics.items()})
+    results[name] = entry
+    summary = ", ".join(f"{key} {value}" for key, value in entry.items())
+    print(f"  {name:44s} {summary}")
+
+
+@contextmanager
+def temporary_database():
+    """Points database.py at a fresh SQLite file for the duration of the block."""
+    directory = tempfile.mkdtemp(prefix="finiq_bench_db_")
+    previous = database.DATABASE_NAME
+    database.DATABASE_NAME = os.path.join(directory, "bench.db")
+    try:
+        database.create_database()
+        yield database.DATABASE_NAME
+    finally:
+        database.DATABASE_NAME = previous
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+@contextmanager
+def temporary_metrics():
+    """
+    Records pipeline metrics (OCR, LLM and database timings) in a throwaway file for the block,
+    so benchmark runs don't show up in data/metrics.db, the Admin tab or /metrics.
+    """
+    directory = tempfile.mkdtemp(prefix="finiq_bench_metrics_")
+    previous = pipeline_metrics.redirect(os.path.join(directory, "metrics.db"))
+    try:
+        yield
+    finally:
+        pipeline_metrics.redirect(previous)
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+@contextmanager
+def stub_llm(latency=0.0):
+    """
+    Puts a fake `ollama` first on PATH for the duration of the block. It answers classification
+    prompts with 'Other' and everything else with a short letter after `latency` seconds, so the
+    real subprocess round trip is measured without a model.
+    """
+    directory = tempfile.mkdtemp(prefix="finiq_llm_stub_")
+    script = os.path.join(directory, "ollama")
+    with open(script, "w", encoding="utf-8") as f:
+        f.write(
+            "#!/bin/sh\n"
+            f"sleep {latency}\n"
+            'case "$3" in\n'
+            '  *Category:*) echo "Other" ;;\n'
+            f'  *) printf "{STUB_LETTER}\\n" ;;\n'
+            "esac\n"
+        )
+    os.chmod(script, 0o755)
+    previous = os.environ.get("PATH", "")
+    os.environ["PATH"] = directory + os.pathsep + previous
+    try:
+        yield script
+    finally:
+        os.environ["PATH"] = previous
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+# --- Sections ---
+
+def bench_ledgers(results, rows_list, corpus_dir, repeat):
+    print("Ledgers")
+    for rows in rows_list:
+        start = time.perf_counter()
+        path = synthetic.write_ledger(os.path.join(corpus_dir, "ledgers"), rows)
+        print(f"  ({os.path.basename(path)} ready in {time.perf_counter() - start:.1f} s)")
+
+        seconds, raw = measure(lambda: financials.read_ledger(path))
+        record(results, f"ledger.read[{rows}]", seconds, rows_per_s=rows / seconds)
+        seconds, df = measure(lambda: financials.normalize_ledger(raw, arrow=True))
+        report = financials.memory_report(raw, df)
+        record(results, f"ledger.normalize[{rows}]", seconds, rows_per_s=rows / seconds, memory_mb=report["after_bytes"] / 1e6, memory_ratio=report["ratio"])
+        del raw
+
+        for name, func in (
+            ("analyze_financials", lambda: financials.analyze_financials(df)),
+            ("summarize_gst", lambda: financials.summarize_gst(df)),
+            ("estimate_tax", lambda: financials.estimate_tax(df)),
+            ("compute_periods", lambda: tax_periods.compute_periods(df)),
+        ):
+            seconds, _ = measure(func, repeat)
+            record(results, f"ledger.{name}[{rows}]", seconds, rows_per_s=rows / seconds)
+        del df
+
+
+def _load_ocr():
+    try:
+        from tools.ocr_script import perform_ocr
+        return perform_ocr, None
+    except ImportError as e:
+        return None, f"OCR unavailable: {e}"
+
+
+def bench_notices(results, page_counts, scanned_page_counts, corpus_dir, repeat):
+    print("Notices")
+    perform_ocr, ocr_skip = _load_ocr()
+    expected = datetime.strptime(synthetic.NOTICE_DUE_DATE, "%d/%m/%Y").date()
+    notice_dir = os.path.join(corpus_dir, "notices")
+    for scanned, counts in ((False, page_counts), (True, scanned_page_counts)):
+        kind = "scanned" if scanned else "digital"
+        for pages in counts:
+            path, truth, _ = synthetic.write_notice(notice_dir, pages, scanned=scanned)
+            if perform_ocr is None:
+                record(results, f"notice.ocr.{kind}[{pages}]", skipped=ocr_skip)
+            else:
+                seconds, text = measure(lambda: perform_ocr(path))
+                found = extract_due_date(text or "")
+                record(results, f"notice.ocr.{kind}[{pages}]", seconds, pages_per_s=pages / seconds, chars=len(text or ""), due_date_correct=found == expected)
+
+            # Due dates and classification on the ground-truth text run whether or not OCR is installed
+            if not scanned:
+                seconds, found = measure(lambda: extract_due_date(truth), repeat)
+                record(results, f"notice.extract_due_date[{pages}]", seconds, mb_per_s=len(truth) / 1e6 / seconds, correct=found == expected)
+                seconds, classification = measure(lambda: document_classifier.classify(truth, use_llm=False), repeat)
+                record(results, f"notice.classify[{pages}]", seconds, document_type=classification["document_type"], method=classification["method"])
+
+
+def _notice_text(number, truth):
+    """Ground-truth notice text with a distinct DIN and PAN, so index rows and searches differ."""
+    din = f"ITBA/AST/S/143(2)/2024-25/{1000000000 + number}(1)"
+    pan = "ABCDE" + f"{number % 10000:04d}" + "F"
+    return truth.replace("ITBA/AST/S/143(2)/2024-25/1061234567(1)", din).replace("ABCDE1234F", pan), din, pan
+
+
+def bench_database(results, documents, clients, queries):
+    print("Database")
+    truth = synthetic.notice_text(2)
+    with temporary_database():
+        stats = latencies(database.add_client, [(f"Client {i}", f"client{i}@example.com", f"98{i:08d}") for i in range(clients)])
+        record(results, "db.add_client", ops_per_s=1 / stats["seconds"], **stats)
+        client_ids = [row[0] for row in database.get_all_clients()]
+
+        document_args = [(client_ids[i % len(client_ids)], f"notice_{i}.pdf", f"data/blobs/bench/{i}.pdf", document_classifier.INCOME_TAX_NOTICE) for i in range(documents)]
+        stats = latencies(database.add_document, document_args)
+        record(results, "db.add_document", ops_per_s=1 / stats["seconds"], **stats)
+
+        texts = [_notice_text(i, truth) for i in range(documents)]
+        index_args = [(f"data/blobs/bench/{i}.pdf", f"notice_{i}.pdf", text) for i, (text, _, _) in enumerate(texts)]
+        stats = latencies(document_search.index_document, index_args)
+        record(results, "db.index_document", ops_per_s=1 / stats["seconds"], **stats)
+
+        picks = np.random.default_rng(0).integers(0, documents, queries)
+        stats = latencies(lambda din: document_search.search(din=din), [(texts[i][1],) for i in picks])
+        record(results, "db.search.din", **stats)
+        stats = latencies(lambda pan: document_search.search(pan=pan), [(texts[i][2],) for i in picks])
+        record(results, "db.search.pan", **stats)
+        stats = latencies(lambda text: document_search.search(text=text), [("scrutiny cash",)] * queries)
+        record(results, "db.search.text", **stats)
+
+        reminder_args = [(client_ids[i % len(client_ids)], f"2025-{i % 12 + 1:02d}-15", None, "Once", f"Reply to notice_{i}.pdf") for i in range(documents)]
+        stats = latencies(database.add_reminder, reminder_args)
+        record(results, "db.add_reminder", ops_per_s=1 / stats["seconds"], **stats)
+
+        for name, func in (
+            ("get_reminders", database.get_reminders),
+            ("get_all_clients", database.get_all_clients),
+            ("get_documents_by_client", lambda: database.get_documents_by_client(client_ids[0])),
+            ("get_document_texts", database.get_document_texts),
+        ):
+            seconds, rows = measure(func, 3)
+            record(results, f"db.{name}", seconds, rows=len(rows))
+
+
+def bench_pipeline(results, documents, llm_latency):
+    """One notice at a time through the app's post-OCR steps, with the LLM stubbed."""
+    print("Pipeline (stub LLM)")
+    truth = synthetic.notice_text(2)
+
+    def process(number):
+        text, _, _ = _notice_text(number, truth)
+        classification = document_classifier.classify(text)
+        response = ""
+        if document_classifier.route(classification["document_type"]) == "draft":
+            response = auto_draft_response(text, classification["document_type"])
+        text_id = document_search.index_document(f"data/blobs/pipeline/{number}.pdf", f"notice_{number}.pdf", text, response, document_type=classification["document_type"], classified_by=classification["method"])
+        due_date = extract_due_date(text)
+        if due_date:
+            database.add_reminder(None, due_date.strftime("%Y-%m-%d"), None, "Once", f"Due date from notice_{number}.pdf")
+        return text_id
+
+    with temporary_database(), stub_llm(llm_latency):
+        seconds, _ = measure(lambda: auto_draft_response(truth), 3)
+        record(results, "pipeline.llm_roundtrip", seconds, stub_latency_s=llm_latency)
+        stats = latencies(process, [(i,) for i in range(documents)])
+        record(results, "pipeline.notice", docs_per_s=1 / stats["seconds"], **stats)
+
+
+# --- Regression tracking ---
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline, results, threshold):
+    """Returns [(name, baseline seconds, current seconds, ratio)] for timings that regressed."""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get("results", {}).get(name, {})
+        if "seconds" not in current or "seconds" not in previous or previous["seconds"] < MIN_COMPARABLE_SECONDS:
+            continue
+        ratio = current["seconds"] / previous["seconds"]
+        if ratio > 1 + threshold:
+            regressions.append((name, previous["seconds"], current["seconds"], ratio))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark FinIQ's ledger, notice, database and drafting paths on synthetic data.")
+    parser.add_argument("--rows", type=_int_list, default=[10_000, 100_000], help="Comma-separated ledger sizes (up to 10,000,000)")
+    parser.add_argument("--pages", type=_int_list, default=[1, 10], help="Comma-separated page counts for digital notices")
+    parser.add_argument("--scanned-pages", type=_int_list, default=[1], help="Comma-separated page counts for scanned notices")
+    parser.add_argument("--documents", type=int, default=1000, help="Documents written in the database and pipeline sections")
+    parser.add_argument("--clients", type=int, default=100)
+    parser.add_argument("--queries", type=int, default=200, help="Searches per query type")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Seconds the stub LLM waits before answering")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per in-memory measurement (best is reported)")
+    parser.add_argument("--sections", default="ledger,notices,database,pipeline", help="Comma-separated sections to run")
+    parser.add_argument("--corpus", default="data/bench", help="Where generated ledgers and PDFs are kept between runs")
+    parser.add_argument("--json", help="Write results to this JSON file")
+    parser.add_argument("--baseline", help="Earlier results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Slowdown ratio over baseline counted as a regression")
+    args = parser.parse_args(argv)
+
+    sections = {section.strip() for section in args.sections.split(",")}
+    results = {}
+    with temporary_metrics():
+        if "ledger" in sections:
+            bench_ledgers(results, args.rows, args.corpus, args.repeat)
+        if "notices" in sections:
+            bench_notices(results, args.pages, args.scanned_pages, args.corpus, args.repeat)
+        if "database" in sections:
+            bench_database(results, args.documents, args.clients, args.queries)
+        if "pipeline" in sections:
+            bench_pipeline(results, min(args.documents, 200), args.llm_latency)
+
+    output = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "args": {key: value for key, value in vars(args).items() if key not in ("json", "baseline")},
+        },
+        "results": results,
+    }
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(output, f, indent=2, default=str)
+        print(f"Results written to {args.json}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, results, args.threshold)
+        for name, before, after, ratio in regressions:
+            print(f"REGRESSION {name}: {before * 1000:.2f} ms -> {after * 1000:.2f} ms ({ratio:.2f}x)")
+        print(f"{len(regressions)} regression(s) against {args.baseline} (commit {baseline.get('meta', {}).get('commit')}).")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
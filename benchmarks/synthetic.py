@@ -0,0 +1,236 @@
+"""
+Synthetic fixtures for the benchmark suite.
+
+  make_ledger / write_ledger   Tally-style ledgers shaped like Balance_Sheet_Data.xlsx (Date,
+                               Transaction Type, Description, Amount, GST Included, GST Breakdown,
+                               TDS Deducted, plus Party), generated with vectorized numpy so 10M
+                               rows take seconds. Excel is written up to XLSX_MAX_ROWS, CSV above.
+  make_notice_pages            Multi-page notice text with a known due date on the last page.
+  write_digital_pdf            A text-layer PDF of those pages.
+  write_scanned_pdf            The same pages rendered, noised and skewed, as a JPEG-per-page PDF.
+  NOTICE_LINES / render_page   Notice text and page rendering, shared with benchmarks/ocr_preprocess.py.
+
+Both PDF writers stream one page at a time through PdfWriter, a minimal PDF 1.4 writer, so a
+100-page scan never sits in memory and no PDF library is needed.
+"""
+import io
+import os
+import random
+import textwrap
+
+import numpy as np
+import pandas as pd
+from PIL import Image, ImageDraw, ImageFont
+
+from benchmarks.due_dates import FILLER
+
+TRANSACTION_TYPES = ["Income", "Expense", "Asset", "Liability", "GST Sale"]
+TRANSACTION_WEIGHTS = [0.35, 0.35, 0.1, 0.1, 0.1]
+PARTIES = 2000
+XLSX_MAX_ROWS = 100_000   # openpyxl writes ~10k rows/s and Excel stops at 1,048,576
+
+NOTICE_DUE_DATE = "15/07/2025"
+LINES_PER_PAGE = 34       # What render_page fits on A4 (0.8 in margin, 0.3 in lines)
+LINE_CHARS = 85
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842   # A4 in points
+SCAN_DPI = 150
+
+NOTICE_LINES = [
+    "INCOME TAX DEPARTMENT",
+    "GOVERNMENT OF INDIA",
+    "Notice under section 143(2) of the Income-tax Act, 1961",
+    "DIN: ITBA/AST/S/143(2)/2024-25/1061234567(1)",
+    "PAN: ABCDE1234F  Assessment Year: 2024-25",
+    "To, M/s Sharma Traders, 12 MG Road, Bengaluru 560001",
+    "Your return of income for the above assessment year has been selected for scrutiny.",
+    "You are requested to furnish the documents listed below on or before 15/07/2025.",
+    "1. Bank statements for all accounts for the period 01/04/2023 to 31/03/2024.",
+    "2. Details of cash deposits of Rs. 12,50,000 made during demonetisation.",
+    "3. Ledger copies of sundry creditors exceeding Rs. 1,00,000.",
+    "Failure to comply may attract penalty under section 272A(1)(d).",
+    "Due date for response: 15/07/2025",
+    "Assessing Officer, Ward 3(1), Bengaluru",
+]
+
+
+# --- Ledgers ---
+
+def make_ledger(rows, seed=0, start="2023-04-01", days=730):
+    """Returns a DataFrame of `rows` synthetic vouchers over two financial years, in date order."""
+    rng = np.random.default_rng(seed)
+    types = np.array(TRANSACTION_TYPES, dtype=object)[rng.choice(len(TRANSACTION_TYPES), rows, p=TRANSACTION_WEIGHTS)]
+    dates = np.sort(np.datetime64(start) + rng.integers(0, days, rows).astype("timedelta64[D]"))
+    amounts = np.maximum(rng.lognormal(9.0, 1.2, rows).round(), 1).astype(np.int64)
+    gst_included = rng.random(rows) < 0.6
+    is_income = types == "Income"
+    parties = np.array([f"Party {i:04d}" for i in range(PARTIES)], dtype=object)[rng.integers(0, PARTIES, rows)]
+    return pd.DataFrame({
+        "Date": dates,
+        "Transaction Type": types,
+        "Description": types + " - " + parties,
+        "Party": parties,
+        "Amount": amounts,
+        "GST Included": gst_included,
+        "GST Breakdown": np.where(gst_included & (types == "GST Sale"), "{'CGST': 9, 'SGST': 9}", None),
+        "TDS Deducted": np.where(is_income & (rng.random(rows) < 0.3), (amounts // 10), 0),
+    })
+
+
+def ledger_path(directory, rows, seed=0):
+    extension = ".xlsx" if rows <= XLSX_MAX_ROWS else ".csv"
+    return os.path.join(directory, f"ledger_{rows}_{seed}{extension}")
+
+
+def write_ledger(directory, rows, seed=0):
+    """Writes (or reuses) a synthetic ledger file. Returns its path."""
+    path = ledger_path(directory, rows, seed)
+    if not os.path.exists(path):
+        os.makedirs(directory, exist_ok=True)
+        df = make_ledger(rows, seed)
+        tmp_path = os.path.join(directory, "partial_" + os.path.basename(path))  # Keeps the extension for the writer
+        if path.endswith(".xlsx"):
+            df.to_excel(tmp_path, index=False, engine="openpyxl")
+        else:
+            df.to_csv(tmp_path, index=False)
+        os.replace(tmp_path, path)
+    return path
+
+
+# --- Notices ---
+
+def make_notice_pages(pages, seed=0):
+    """Returns (list of pages, each a list of lines, ground-truth due date as DD/MM/YYYY)."""
+    rng = random.Random(seed)
+    result = []
+    for page_no in range(pages):
+        lines = list(NOTICE_LINES[:6]) if page_no == 0 else [f"Page {page_no + 1} of {pages}"]
+        while len(lines) < LINES_PER_PAGE - 2:
+            paragraph = FILLER.format(amount=rng.randint(10_000, 9_000_000), day=rng.randint(1, 28), month=rng.randint(1, 12))
+            lines.extend(textwrap.wrap(paragraph, LINE_CHARS))
+        lines = lines[:LINES_PER_PAGE - 2]
+        if page_no == pages - 1:
+            lines += [f"Due date for response: {NOTICE_DUE_DATE}", "Assessing Officer, Ward 3(1), Bengaluru"]
+        result.append(lines)
+    return result, NOTICE_DUE_DATE
+
+
+def _font(size):
+    try:
+        return ImageFont.truetype("DejaVuSans.ttf", size)
+    except OSError:
+        return ImageFont.load_default(size=size)
+
+
+def render_page(lines, dpi, noise_sigma, skew, seed=0):
+    """Renders ground-truth lines onto an A4 page at the given DPI with optional noise and skew."""
+    width, height = int(8.27 * dpi), int(11.69 * dpi)
+    page = Image.new("L", (width, height), 255)
+    draw = ImageDraw.Draw(page)
+    font = _font(int(dpi * 0.14))  # ~10pt text
+    margin = int(dpi * 0.8)
+    line_height = int(dpi * 0.3)
+    for i, line in enumerate(lines):
+        draw.text((margin, margin + i * line_height), line, fill=0, font=font)
+    if skew:
+        page = page.rotate(skew, resample=Image.BILINEAR, fillcolor=255)
+    pixels = np.asarray(page, dtype=np.float32)
+    if noise_sigma:
+        rng = np.random.default_rng(seed)
+        pixels = pixels + rng.normal(0, noise_sigma, pixels.shape)
+    return Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+
+
+class PdfWriter:
+    """
+    Minimal streaming PDF writer: text pages in Helvetica and full-page JPEG images. Objects are
+    written as they are added and the page tree, cross-reference table and trailer at close().
+    """
+
+    def __init__(self, path):
+        self.file = open(path, "wb")
+        self.offsets = {}
+        self.page_ids = []
+        self.next_id = 4  # 1 catalog, 2 page tree, 3 font
+        self.file.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        self._write_object(3, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+
+    def _allocate(self):
+        self.next_id += 1
+        return self.next_id - 1
+
+    def _write_object(self, object_id, body):
+        self.offsets[object_id] = self.file.tell()
+        self.file.write(f"{object_id} 0 obj\n".encode() + body + b"\nendobj\n")
+
+    def _write_stream(self, object_id, data, dictionary=b""):
+        self._write_object(object_id, b"<< " + dictionary + f" /Length {len(data)} >>\nstream\n".encode() + data + b"\nendstream")
+
+    def _write_page(self, content_id, resources):
+        page_id = self._allocate()
+        self._write_object(page_id, f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] /Contents {content_id} 0 R /Resources {resources} >>".encode())
+        self.page_ids.append(page_id)
+
+    def add_text_page(self, lines, font_size=9, margin=50):
+        escaped = (line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") for line in lines)
+        body = "".join(f"({line}) Tj T*\n" for line in escaped)
+        content = f"BT /F1 {font_size} Tf {font_size + 6} TL {margin} {PAGE_HEIGHT - margin} Td\n{body}ET".encode("cp1252", "replace")
+        content_id = self._allocate()
+        self._write_stream(content_id, content)
+        self._write_page(content_id, "<< /Font << /F1 3 0 R >> >>")
+
+    def add_image_page(self, jpeg_bytes, width, height):
+        image_id, content_id = self._allocate(), self._allocate()
+        self._write_stream(image_id, jpeg_bytes, f"/Type /XObject /Subtype /Image /Width {width} /Height {height} /ColorSpace /DeviceGray /BitsPerComponent 8 /Filter /DCTDecode".encode())
+        self._write_stream(content_id, f"q {PAGE_WIDTH} 0 0 {PAGE_HEIGHT} 0 0 cm /Im0 Do Q".encode())
+        self._write_page(content_id, f"<< /XObject << /Im0 {image_id} 0 R >> >>")
+
+    def close(self):
+        kids = " ".join(f"{page_id} 0 R" for page_id in self.page_ids)
+        self._write_object(2, f"<< /Type /Pages /Kids [{kids}] /Count {len(self.page_ids)} >>".encode())
+        self._write_object(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+        xref = self.file.tell()
+        entries = "".join(f"{self.offsets[object_id]:010d} 00000 n \n" for object_id in range(1, self.next_id))
+        self.file.write(f"xref\n0 {self.next_id}\n0000000000 65535 f \n{entries}".encode())
+        self.file.write(f"trailer\n<< /Size {self.next_id} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode())
+        self.file.close()
+
+
+def write_digital_pdf(path, pages):
+    writer = PdfWriter(path)
+    for lines in pages:
+        writer.add_text_page(lines)
+    writer.close()
+
+
+def write_scanned_pdf(path, pages, dpi=SCAN_DPI, noise_sigma=8, max_skew=1.5, seed=0):
+    """Renders each page like a phone or flatbed scan (noise, slight skew) and stores it as JPEG."""
+    rng = random.Random(seed)
+    writer = PdfWriter(path)
+    for page_no, lines in enumerate(pages):
+        image = render_page(lines, dpi, noise_sigma, rng.uniform(-max_skew, max_skew), seed=seed + page_no)
+        buffer = io.BytesIO()
+        image.save(buffer, format="JPEG", quality=75)
+        writer.add_image_page(buffer.getvalue(), *image.size)
+    writer.close()
+
+
+def notice_text(pages, seed=0):
+    """Ground-truth text of a synthetic notice, pages separated by blank lines."""
+    notice_pages, _ = make_notice_pages(pages, seed)
+    return "\n\n".join("\n".join(lines) for lines in notice_pages)
+
+
+def write_notice(directory, pages, scanned=False, seed=0):
+    """Writes (or reuses) a synthetic notice PDF. Returns (path, ground-truth text, due date)."""
+    notice_pages, due_date = make_notice_pages(pages, seed)
+    kind = "scanned" if scanned else "digital"
+    path = os.path.join(directory, f"notice_{kind}_{pages}p_{seed}.pdf")
+    if not os.path.exists(path):
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = os.path.join(directory, "partial_" + os.path.basename(path))  # Keeps the extension for the writer
+        if scanned:
+            write_scanned_pdf(tmp_path, notice_pages, seed=seed)
+        else:
+            write_digital_pdf(tmp_path, notice_pages)
+        os.replace(tmp_path, path)
+    return path, notice_text(pages, seed), due_date
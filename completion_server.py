@@ -1,8 +1,10 @@
-from flask import Flask, request, render_template_string, abort
+from flask import Flask, Response, request, render_template_string, abort
 from itsdangerous import URLSafeTimedSerializer, SignatureExpired, BadSignature
 import database
 import config
 import logging
+import hmac
+from tools import metrics
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -66,6 +68,18 @@ def test_email():
     except Exception as e:
         return f'Error sending test email: {str(e)}', 500
 
+@app.route('/metrics')
+def metrics_endpoint():
+    """
+    Prometheus scrape target with every FinIQ process's metrics merged (see tools/metrics.py).
+    If METRICS_TOKEN is set, scrapers must send it as a bearer token.
+    """
+    if config.METRICS_TOKEN:
+        supplied = request.headers.get('Authorization', '').removeprefix('Bearer ').strip()
+        if not hmac.compare_digest(supplied, config.METRICS_TOKEN):
+            abort(401)
+    return Response(metrics.render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 @app.route('/complete/<token>')
 def complete_reminder(token):
     """
@@ -74,12 +88,17 @@ def complete_reminder(token):
     """
     try:
         # Unsign the token, max_age set to 7 days (adjust as needed)
-        reminder_id = serializer.loads(token, max_age=60*60*24*7) # 7 days expiry
-        logging.info(f"Received completion request for reminder ID: {reminder_id} with token: {token}")
+        payload = serializer.loads(token, max_age=60*60*24*7) # 7 days expiry
+        if isinstance(payload, dict):
+            reminder_id, tenant = payload['reminder_id'], payload.get('tenant', database.DEFAULT_TENANT)
+        else:
+            reminder_id, tenant = payload, database.DEFAULT_TENANT # Links sent before tenants existed
+        logging.info(f"Received completion request for reminder ID: {reminder_id} (tenant {tenant}) with token: {token}")
 
-        # Mark the reminder as completed in the database
+        # Mark the reminder as completed in the tenant's database
         try:
-            database.mark_reminder_completed(reminder_id)
+            with database.tenant_scope(tenant):
+                database.mark_reminder_completed(reminder_id)
             logging.info(f"Successfully marked reminder ID {reminder_id} as completed.")
             return render_template_string(SUCCESS_TEMPLATE)
         except Exception as db_err:
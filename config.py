@@ -23,4 +23,8 @@ CELERY_RESULT_BACKEND = f"redis://{REDIS_HOST}:{REDIS_PORT}/{REDIS_DB}"
 # Application Configuration
 APP_BASE_URL = os.getenv("APP_BASE_URL", "http://localhost:8501") # Base URL where the Streamlit app is accessible
 COMPLETION_SERVER_URL = os.getenv("COMPLETION_SERVER_URL", "http://localhost:5000") # URL for the Flask completion server
-FLASK_SECRET_KEY = os.getenv("FLASK_SECRET_KEY", "default-insecure-secret-key-please-change") # Secret key for signing tokens
\ No newline at end of file
+FLASK_SECRET_KEY = os.getenv("FLASK_SECRET_KEY", "default-insecure-secret-key-please-change") # Secret key for signing tokens
+METRICS_TOKEN = os.getenv("METRICS_TOKEN") # Optional bearer token required by the completion server's /metrics endpoint
+
+# Report Configuration
+LETTERHEAD_TEMPLATE_PATH = os.getenv("LETTERHEAD_TEMPLATE_PATH") # Optional .docx whose header/footer/styles are reused for every generated report
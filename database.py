@@ -1,10 +1,110 @@
 import sqlite3
 import os
+import re
+import inspect
+import importlib
+import contextvars
+from contextlib import contextmanager
+
+from sqlalchemy.exc import SQLAlchemyError
+
+import repository
+from tools import metrics
+
+# --- Tenant routing ---
+# Each firm/branch (tenant) has its own database. The current tenant is a context variable, so
+# a Streamlit session, a Celery task or a request handler sets it once and every helper below
+# follows it. The default tenant keeps the original DATABASE_NAME; others live under
+# TENANTS_DIR/<tenant>/, next to their own blob store, ledger store and retrieval index
+# (see tenant_path). FINIQ_DB_FACTORY ("module:function") swaps the per-tenant SQLite files
+# for another backend: function(tenant) must return a connection with sqlite3's interface and
+# SQL dialect (e.g. a libSQL/rqlite client).
 
 DATABASE_NAME = 'client_management.db'
+DEFAULT_TENANT = 'default'
+TENANTS_DIR = os.getenv('FINIQ_TENANTS_DIR', os.path.join('data', 'tenants'))
+TENANT_PATTERN = re.compile(r'^[a-z0-9][a-z0-9_-]{0,62}$')
+
+_tenant = contextvars.ContextVar('tenant', default=os.getenv('FINIQ_TENANT', DEFAULT_TENANT))
+_connection_factory = None
+if os.getenv('FINIQ_DB_FACTORY'):
+    _module, _, _function = os.getenv('FINIQ_DB_FACTORY').partition(':')
+    _connection_factory = getattr(importlib.import_module(_module), _function)
+
+def validate_tenant(tenant):
+    """Returns the tenant name, or raises ValueError for names that aren't safe as folder names."""
+    if not isinstance(tenant, str) or not TENANT_PATTERN.match(tenant):
+        raise ValueError(f"Invalid tenant name: {tenant!r} (use lowercase letters, digits, '-' and '_')")
+    return tenant
+
+def get_tenant():
+    return _tenant.get()
+
+def set_tenant(tenant):
+    """Routes this thread's/task's later database calls to `tenant`. Returns a token for reset_tenant."""
+    return _tenant.set(validate_tenant(tenant))
+
+def reset_tenant(token):
+    _tenant.reset(token)
+
+@contextmanager
+def tenant_scope(tenant):
+    token = set_tenant(tenant)
+    try:
+        yield tenant
+    finally:
+        _tenant.reset(token)
+
+def tenant_path(path, tenant=None):
+    """
+    Per-tenant location of a file or folder under data/: the path itself for the default
+    tenant, else the same relative path under TENANTS_DIR/<tenant>/.
+    """
+    tenant = tenant or get_tenant()
+    if tenant == DEFAULT_TENANT:
+        return path
+    return os.path.join(TENANTS_DIR, validate_tenant(tenant), os.path.relpath(path, 'data'))
+
+def database_path(tenant=None):
+    tenant = tenant or get_tenant()
+    if tenant == DEFAULT_TENANT:
+        return DATABASE_NAME
+    return os.path.join(TENANTS_DIR, validate_tenant(tenant), os.path.basename(DATABASE_NAME))
+
+def set_connection_factory(factory):
+    """Routes connections through factory(tenant) instead of the per-tenant SQLite files (None restores them)."""
+    global _connection_factory
+    _connection_factory = factory
+
+def get_connection(tenant=None):
+    """A new connection to the current (or given) tenant's database."""
+    tenant = tenant or get_tenant()
+    if _connection_factory is not None:
+        return _connection_factory(tenant)
+    path = database_path(tenant)
+    if tenant != DEFAULT_TENANT:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    return sqlite3.connect(path)
+
+def list_tenants():
+    """FINIQ_TENANTS (comma-separated) if set, else the default tenant plus every tenant folder under TENANTS_DIR."""
+    configured = os.getenv('FINIQ_TENANTS')
+    if configured:
+        return [validate_tenant(tenant.strip()) for tenant in configured.split(',') if tenant.strip()]
+    found = []
+    if os.path.isdir(TENANTS_DIR):
+        found = sorted(name for name in os.listdir(TENANTS_DIR) if TENANT_PATTERN.match(name) and name != DEFAULT_TENANT and os.path.isdir(os.path.join(TENANTS_DIR, name)))
+    return [DEFAULT_TENANT] + found
+
+# Errors either storage path can raise (clients and reminders go through repository.py)
+DB_ERRORS = (sqlite3.Error, SQLAlchemyError)
+
+ROUTING_FUNCTIONS = {'validate_tenant', 'get_tenant', 'set_tenant', 'reset_tenant', 'tenant_scope', 'tenant_path', 'database_path', 'set_connection_factory', 'get_connection', 'list_tenants'}
+
 
 def create_database():
-    conn = sqlite3.connect(DATABASE_NAME)
+    """Creates or migrates the current tenant's schema."""
+    conn = get_connection()
     cursor = conn.cursor()
 
     # Create clients table
@@ -47,48 +147,197 @@ def create_database():
     )
     """)
 
-    # Add columns if they don't exist (for schema evolution)
-    cursor.execute("PRAGMA table_info(reminders)")
-    columns = [col[1] for col in cursor.fetchall()]
-    if 'reminder_time' not in columns:
-        cursor.execute("ALTER TABLE reminders ADD COLUMN reminder_time TEXT")
-    if 'frequency' not in columns:
-        cursor.execute("ALTER TABLE reminders ADD COLUMN frequency TEXT")
-    if 'is_completed' not in columns:
-        cursor.execute("ALTER TABLE reminders ADD COLUMN is_completed BOOLEAN DEFAULT FALSE")
-    if 'last_sent_at' not in columns:
-        cursor.execute("ALTER TABLE reminders ADD COLUMN last_sent_at DATETIME")
+    # Create per-client financial summaries table (filled by the batch portfolio analysis)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS client_financial_summaries (
+        client_id INTEGER NOT NULL,
+        period TEXT NOT NULL,        -- Financial year label (e.g. FY2024-25) or ALL
+        income REAL,
+        expenses REAL,
+        profit REAL,
+        margin REAL,
+        tax REAL,
+        tds REAL,
+        input_gst REAL,
+        output_gst REAL,
+        net_gst REAL,
+        row_count INTEGER,
+        source TEXT,                 -- Ledger file the figures were computed from
+        computed_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (client_id, period),
+        FOREIGN KEY (client_id) REFERENCES clients(id)
+    )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_financial_summaries_period ON client_financial_summaries(period)")
+
+    # Create ledger voucher index (one row per ingested voucher, used to detect deltas)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS ledger_vouchers (
+        client_id INTEGER NOT NULL,
+        voucher_hash INTEGER NOT NULL,  -- 64-bit hash of date, voucher number and amount
+        voucher_date TEXT,
+        document_id INTEGER,            -- Ingest that first brought this voucher in
+        PRIMARY KEY (client_id, voucher_hash)
+    ) WITHOUT ROWID
+    """)
+
+    # Create running ledger totals per client (updated incrementally by each delta)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS ledger_running_totals (
+        client_id INTEGER PRIMARY KEY,
+        income REAL DEFAULT 0,
+        expenses REAL DEFAULT 0,
+        tds REAL DEFAULT 0,
+        input_gst REAL DEFAULT 0,
+        output_gst REAL DEFAULT 0,
+        row_count INTEGER DEFAULT 0,
+        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (client_id) REFERENCES clients(id)
+    )
+    """)
+
+    # Create document text table (OCR Markdown and drafted response per processed document)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS document_texts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        document_id INTEGER,           -- documents row, when the document is linked to a client
+        client_id INTEGER,
+        filename TEXT NOT NULL,
+        filepath TEXT NOT NULL UNIQUE, -- Re-processing the same file updates its row
+        ocr_text TEXT,
+        response_text TEXT,
+        din TEXT,                      -- Space-separated identifiers found in the text
+        pan TEXT,
+        sections TEXT,
+        document_type TEXT,            -- See tools/document_classifier.DOCUMENT_TYPES
+        classified_by TEXT,            -- rules, model, llm or user
+        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (document_id) REFERENCES documents(id),
+        FOREIGN KEY (client_id) REFERENCES clients(id)
+    )
+    """)
+    create_search_index(cursor)
+
+    # Create document fingerprints table (exact and perceptual hashes used to skip duplicate uploads)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS document_fingerprints (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        sha256 TEXT NOT NULL,
+        page_count INTEGER,
+        first_page_hash INTEGER,       -- Leading 64 bits of page 1's pHash (signed), screened first
+        page_hashes TEXT,              -- Comma-separated hex pHash per page
+        filepath TEXT,
+        text_id INTEGER,               -- document_texts row holding the OCR text and response
+        document_id INTEGER,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (text_id) REFERENCES document_texts(id),
+        FOREIGN KEY (document_id) REFERENCES documents(id)
+    )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_fingerprints_sha256 ON document_fingerprints(sha256)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_fingerprints_pages ON document_fingerprints(page_count)")
+
+    # Create blobs table (content-addressed upload store) with reference counts from documents
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS blobs (
+        sha256 TEXT PRIMARY KEY,
+        path TEXT NOT NULL UNIQUE,
+        size INTEGER,
+        ref_count INTEGER DEFAULT 0,   -- documents rows whose filepath is this blob
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    cursor.executescript("""
+    CREATE TRIGGER IF NOT EXISTS documents_blob_ref_ai AFTER INSERT ON documents BEGIN
+        UPDATE blobs SET ref_count = ref_count + 1 WHERE path = new.filepath;
+    END;
+    CREATE TRIGGER IF NOT EXISTS documents_blob_ref_ad AFTER DELETE ON documents BEGIN
+        UPDATE blobs SET ref_count = ref_count - 1 WHERE path = old.filepath;
+    END;
+    CREATE TRIGGER IF NOT EXISTS documents_blob_ref_au AFTER UPDATE OF filepath ON documents BEGIN
+        UPDATE blobs SET ref_count = ref_count - 1 WHERE path = old.filepath;
+        UPDATE blobs SET ref_count = ref_count + 1 WHERE path = new.filepath;
+    END;
+    """)
+
+    # Create chat tables (persisted conversations; see tools/chat_memory.py)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS chat_sessions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        title TEXT,                    -- Start of the first question
+        summary TEXT,                  -- Running summary of the turns folded out of the prompt window
+        summarized_through INTEGER DEFAULT 0, -- Last chat_messages id included in summary
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS chat_messages (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        session_id INTEGER NOT NULL,
+        role TEXT NOT NULL,            -- user or assistant
+        content TEXT NOT NULL,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (session_id) REFERENCES chat_sessions(id)
+    )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_chat_messages_session ON chat_messages(session_id, id)")
 
     conn.commit()
     conn.close()
 
+    # Column additions and indexes are numbered migrations (see repository.MIGRATIONS)
+    repository.migrate()
+
+SEARCH_COLUMNS = ['filename', 'ocr_text', 'response_text', 'din', 'pan', 'sections']
+# bm25 column weights, in SEARCH_COLUMNS order: identifier hits outrank body text
+SEARCH_WEIGHTS = [2.0, 1.0, 0.5, 10.0, 10.0, 5.0]
+
+def create_search_index(cursor):
+    """
+    Creates the FTS5 index over document_texts (external content, so text is stored once)
+    and the triggers that keep it in step with every insert, update and delete.
+    Returns False if this SQLite build has no FTS5; search then falls back to LIKE.
+    """
+    try:
+        cursor.execute(f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS document_search USING fts5(
+            {', '.join(SEARCH_COLUMNS)},
+            content='document_texts', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+        )
+        """)
+    except sqlite3.OperationalError:
+        return False
+    new_values = ', '.join(f'new.{col}' for col in SEARCH_COLUMNS)
+    old_values = ', '.join(f'old.{col}' for col in SEARCH_COLUMNS)
+    columns = ', '.join(SEARCH_COLUMNS)
+    cursor.executescript(f"""
+    CREATE TRIGGER IF NOT EXISTS document_texts_ai AFTER INSERT ON document_texts BEGIN
+        INSERT INTO document_search(rowid, {columns}) VALUES (new.id, {new_values});
+    END;
+    CREATE TRIGGER IF NOT EXISTS document_texts_ad AFTER DELETE ON document_texts BEGIN
+        INSERT INTO document_search(document_search, rowid, {columns}) VALUES ('delete', old.id, {old_values});
+    END;
+    CREATE TRIGGER IF NOT EXISTS document_texts_au AFTER UPDATE ON document_texts BEGIN
+        INSERT INTO document_search(document_search, rowid, {columns}) VALUES ('delete', old.id, {old_values});
+        INSERT INTO document_search(rowid, {columns}) VALUES (new.id, {new_values});
+    END;
+    """)
+    return True
+
 def get_all_clients():
-    conn = sqlite3.connect(DATABASE_NAME)
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, name, email, phone, created_at FROM clients")
-    clients = cursor.fetchall()
-    conn.close()
-    return clients
+    """Returns every client as repository.Client (id, name, email, phone, created_at)."""
+    return repository.get_clients()
 
 def get_client_by_id(client_id):
-    conn = sqlite3.connect(DATABASE_NAME)
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, name, email, phone, created_at FROM clients WHERE id = ?", (client_id,))
-    client = cursor.fetchone()
-    conn.close()
-    return client
+    """Returns a repository.Client or None."""
+    return repository.get_client(client_id)
 
 def add_client(name, email, phone):
-    conn = sqlite3.connect(DATABASE_NAME)
-    cursor = conn.cursor()
-    cursor.execute("INSERT INTO clients (name, email, phone) VALUES (?, ?, ?)", (name, email, phone))
-    client_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
-    return client_id
+    return repository.add_client(name, email, phone)
 
 def add_document(client_id, filename, filepath, document_type):
-    conn = sqlite3.connect(DATABASE_NAME)
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute("INSERT INTO documents (client_id, filename, filepath, document_type) VALUES (?, ?, ?, ?)", (client_id, filename, filepath, document_type))
     document_id = cursor.lastrowid
@@ -96,8 +345,14 @@ def add_document(client_id, filename, filepath, document_type):
     conn.close()
     return document_id
 
+def delete_document(document_id):
+    conn = get_connection()
+    conn.execute("DELETE FROM documents WHERE id = ?", (document_id,))
+    conn.commit()
+    conn.close()
+
 def get_documents_by_client(client_id):
-    conn = sqlite3.connect(DATABASE_NAME)
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute("SELECT id, client_id, filename, filepath, document_type, uploaded_at FROM documents WHERE client_id = ?", (client_id,))
     documents = cursor.fetchall()
@@ -105,58 +360,439 @@ def get_documents_by_client(client_id):
     return documents
 
 def add_reminder(client_id, due_date, reminder_time, frequency, description):
-    conn = sqlite3.connect(DATABASE_NAME)
-    cursor = conn.cursor()
-    cursor.execute(
-        "INSERT INTO reminders (client_id, due_date, reminder_time, frequency, description) VALUES (?, ?, ?, ?, ?)",
-        (client_id, due_date, reminder_time, frequency, description),
-    )
-    reminder_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
-    return reminder_id
+    return repository.add_reminder(client_id, due_date, reminder_time, frequency, description)
 
 def get_reminders(client_id=None):
-    conn = sqlite3.connect(DATABASE_NAME)
-    cursor = conn.cursor()
-    if client_id:
-        cursor.execute("SELECT id, client_id, due_date, description, created_at FROM reminders WHERE client_id = ? ORDER BY due_date", (client_id,))
-    else:
-        cursor.execute("SELECT id, client_id, due_date, description, created_at FROM reminders ORDER BY due_date")
-    reminders = cursor.fetchall()
-    conn.close()
-    return reminders
+    """Returns repository.Reminder rows ordered by due date, optionally for one client."""
+    return repository.get_reminders(client_id)
+
+def get_reminder_detail(reminder_id):
+    """Returns a repository.ReminderDetail (the reminder plus its client's name and email) or None."""
+    return repository.get_reminder_detail(reminder_id)
+
+def get_open_reminders():
+    """Returns repository.ReminderDetail rows for uncompleted reminders whose client has an email."""
+    return repository.get_open_reminders()
 
 def update_reminder_last_sent(reminder_id, sent_at_datetime):
     """Updates the last_sent_at timestamp for a reminder."""
-    conn = sqlite3.connect(DATABASE_NAME)
-    cursor = conn.cursor()
+    # Stored as an ISO 8601 string, which tasks.py parses back
+    repository.update_reminder(reminder_id, last_sent_at=sent_at_datetime.isoformat())
+
+def mark_reminder_completed(reminder_id):
+    """Marks a reminder as completed."""
+    repository.update_reminder(reminder_id, is_completed=True)
+
+def bulk_upsert_clients(rows):
+    """Imports client dicts in one transaction, matching existing clients by email. Returns (inserted, updated)."""
+    return repository.bulk_upsert_clients(rows)
+
+def bulk_upsert_reminders(rows):
+    """Imports reminder dicts in one transaction, matching on client, due date and description. Returns (inserted, updated)."""
+    return repository.bulk_upsert_reminders(rows)
+
+FINANCIAL_SUMMARY_FIELDS = ['income', 'expenses', 'profit', 'margin', 'tax', 'tds', 'input_gst', 'output_gst', 'net_gst']
+
+def replace_financial_summaries(summaries):
+    """
+    Replaces the stored summaries of every client in `summaries` in a single transaction, so
+    periods that no longer appear in a client's ledgers are removed. Each summary is a dict
+    with client_id, period, row_count, source and FINANCIAL_SUMMARY_FIELDS.
+    """
+    columns = ['client_id', 'period'] + FINANCIAL_SUMMARY_FIELDS + ['row_count', 'source']
+    rows = [tuple(summary.get(col) for col in columns) for summary in summaries]
+    client_ids = sorted({summary['client_id'] for summary in summaries})
+    conn = get_connection()
     try:
-        # Convert datetime object to ISO 8601 string format for storage
-        sent_at_str = sent_at_datetime.isoformat()
-        cursor.execute("UPDATE reminders SET last_sent_at = ? WHERE id = ?", (sent_at_str, reminder_id))
+        conn.executemany("DELETE FROM client_financial_summaries WHERE client_id = ?", [(client_id,) for client_id in client_ids])
+        conn.executemany(
+            f"INSERT OR REPLACE INTO client_financial_summaries ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+            rows,
+        )
         conn.commit()
-        # print(f"Updated last_sent_at for reminder {reminder_id}") # Use logging instead
-    except sqlite3.Error as e:
-        # print(f"Database error updating last_sent_at for reminder {reminder_id}: {e}") # Use logging instead
-        conn.rollback() # Rollback changes on error
-        raise # Re-raise the exception so the caller knows about the failure
+    except sqlite3.Error:
+        conn.rollback()
+        raise
     finally:
         conn.close()
+    return len(rows)
 
-def mark_reminder_completed(reminder_id):
-    """Marks a reminder as completed."""
-    conn = sqlite3.connect(DATABASE_NAME)
+def _with_client_names(rows, id_index, name_index):
+    """
+    Fills the client name column of rows from a query joined with the local clients table.
+    With FINIQ_DATABASE_URL set that table is empty, so names come from the repository instead.
+    """
+    if not repository.DATABASE_URL:
+        return rows
+    names = repository.get_client_names(row[id_index] for row in rows)
+    return [row[:name_index] + (names.get(row[id_index]),) + row[name_index + 1:] for row in rows]
+
+def get_financial_summaries(period=None):
+    """Returns stored summaries joined with client names, optionally for a single period."""
+    conn = get_connection()
     cursor = conn.cursor()
+    query = f"""
+        SELECT s.client_id, c.name, s.period, {', '.join('s.' + f for f in FINANCIAL_SUMMARY_FIELDS)}, s.row_count, s.source, s.computed_at
+        FROM client_financial_summaries s
+        LEFT JOIN clients c ON c.id = s.client_id
+    """
+    if period:
+        cursor.execute(query + " WHERE s.period = ? ORDER BY c.name", (period,))
+    else:
+        cursor.execute(query + " ORDER BY s.period DESC, c.name")
+    summaries = cursor.fetchall()
+    conn.close()
+    if repository.DATABASE_URL:
+        summaries = _with_client_names(summaries, 0, 1)
+        summaries.sort(key=lambda row: row[1] or '')
+        if not period:
+            summaries.sort(key=lambda row: row[2], reverse=True)  # Stable: by name within each period
+    return summaries
+
+def get_financial_summary_periods():
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT DISTINCT period FROM client_financial_summaries ORDER BY period DESC")
+    periods = [row[0] for row in cursor.fetchall()]
+    conn.close()
+    return periods
+
+LEDGER_TOTAL_FIELDS = ['income', 'expenses', 'tds', 'input_gst', 'output_gst', 'row_count']
+
+def get_voucher_hashes(client_id):
+    """Returns the hashes of every voucher already ingested for a client."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT voucher_hash FROM ledger_vouchers WHERE client_id = ?", (client_id,))
+    hashes = [row[0] for row in cursor.fetchall()]
+    conn.close()
+    return hashes
+
+def record_ledger_delta(client_id, vouchers, delta_totals):
+    """
+    Records newly ingested vouchers and adds their totals to the client's running totals,
+    in a single transaction. `vouchers` is a list of (voucher_hash, voucher_date, document_id).
+    """
+    conn = get_connection()
     try:
-        cursor.execute("UPDATE reminders SET is_completed = TRUE WHERE id = ?", (reminder_id,))
+        conn.executemany(
+            "INSERT OR IGNORE INTO ledger_vouchers (client_id, voucher_hash, voucher_date, document_id) VALUES (?, ?, ?, ?)",
+            [(client_id, voucher_hash, voucher_date, document_id) for voucher_hash, voucher_date, document_id in vouchers],
+        )
+        conn.execute("INSERT OR IGNORE INTO ledger_running_totals (client_id) VALUES (?)", (client_id,))
+        conn.execute(
+            f"UPDATE ledger_running_totals SET {', '.join(f'{f} = {f} + ?' for f in LEDGER_TOTAL_FIELDS)}, updated_at = CURRENT_TIMESTAMP WHERE client_id = ?",
+            tuple(delta_totals.get(f, 0) for f in LEDGER_TOTAL_FIELDS) + (client_id,),
+        )
         conn.commit()
-    except sqlite3.Error as e:
+    except sqlite3.Error:
         conn.rollback()
         raise
     finally:
         conn.close()
 
+def get_ledger_totals(client_id):
+    """Returns the running totals for a client as a dict, or None if nothing was ingested."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT {', '.join(LEDGER_TOTAL_FIELDS)}, updated_at FROM ledger_running_totals WHERE client_id = ?", (client_id,))
+    row = cursor.fetchone()
+    conn.close()
+    return dict(zip(LEDGER_TOTAL_FIELDS + ['updated_at'], row)) if row else None
+
+
+def save_document_text(filepath, filename, ocr_text, response_text=None, client_id=None, document_id=None, din=None, pan=None, sections=None, document_type=None, classified_by=None):
+    """Inserts or updates the stored text for a processed file; the search index follows via triggers."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        INSERT INTO document_texts (filepath, filename, ocr_text, response_text, client_id, document_id, din, pan, sections, document_type, classified_by)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(filepath) DO UPDATE SET
+            filename = excluded.filename, ocr_text = excluded.ocr_text,
+            response_text = COALESCE(excluded.response_text, document_texts.response_text),
+            client_id = COALESCE(excluded.client_id, document_texts.client_id),
+            document_id = COALESCE(excluded.document_id, document_texts.document_id),
+            din = excluded.din, pan = excluded.pan, sections = excluded.sections,
+            document_type = COALESCE(excluded.document_type, document_texts.document_type),
+            classified_by = COALESCE(excluded.classified_by, document_texts.classified_by),
+            updated_at = CURRENT_TIMESTAMP
+        """,
+        (filepath, filename, ocr_text, response_text, client_id, document_id, din, pan, sections, document_type, classified_by),
+    )
+    conn.commit()
+    cursor.execute("SELECT id FROM document_texts WHERE filepath = ?", (filepath,))
+    text_id = cursor.fetchone()[0]
+    conn.close()
+    return text_id
+
+def update_document_response(filepath, response_text):
+    """Stores an edited response letter for an already indexed file."""
+    conn = get_connection()
+    conn.execute("UPDATE document_texts SET response_text = ?, updated_at = CURRENT_TIMESTAMP WHERE filepath = ?", (response_text, filepath))
+    conn.commit()
+    conn.close()
+
+def get_document_text(text_id):
+    """Returns (id, client_id, document_id, filename, filepath, ocr_text, response_text, document_type) or None."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT id, client_id, document_id, filename, filepath, ocr_text, response_text, document_type FROM document_texts WHERE id = ?", (text_id,))
+    text = cursor.fetchone()
+    conn.close()
+    return text
+
+def set_document_type(filepath, document_type, classified_by='user'):
+    """Records a (corrected) document type on the stored text and on any documents row for the file."""
+    conn = get_connection()
+    conn.execute("UPDATE document_texts SET document_type = ?, classified_by = ?, updated_at = CURRENT_TIMESTAMP WHERE filepath = ?", (document_type, classified_by, filepath))
+    conn.execute("UPDATE documents SET document_type = ? WHERE filepath = ?", (document_type, filepath))
+    conn.commit()
+    conn.close()
+
+def count_labelled_texts(sources):
+    conn = get_connection()
+    placeholders = ', '.join('?' for _ in sources)
+    count = conn.execute(f"SELECT COUNT(*) FROM document_texts WHERE document_type IS NOT NULL AND classified_by IN ({placeholders})", tuple(sources)).fetchone()[0]
+    conn.close()
+    return count
+
+def get_labelled_texts(sources, limit=5000):
+    """Returns (ocr_text, document_type) for the most recent texts labelled by any of `sources`."""
+    conn = get_connection()
+    placeholders = ', '.join('?' for _ in sources)
+    rows = conn.execute(
+        f"""
+        SELECT ocr_text, document_type FROM document_texts
+        WHERE document_type IS NOT NULL AND ocr_text IS NOT NULL AND classified_by IN ({placeholders})
+        ORDER BY updated_at DESC LIMIT ?
+        """,
+        (*sources, limit),
+    ).fetchall()
+    conn.close()
+    return rows
+
+def add_fingerprint(sha256, page_count, first_page_hash, page_hashes, filepath, text_id=None, document_id=None):
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        "INSERT INTO document_fingerprints (sha256, page_count, first_page_hash, page_hashes, filepath, text_id, document_id) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (sha256, page_count, first_page_hash, page_hashes, filepath, text_id, document_id),
+    )
+    fingerprint_id = cursor.lastrowid
+    conn.commit()
+    conn.close()
+    return fingerprint_id
+
+def get_fingerprint_by_sha256(sha256):
+    """Returns (id, text_id, document_id, filepath) of the first document with these exact bytes, or None."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT id, text_id, document_id, filepath FROM document_fingerprints WHERE sha256 = ? ORDER BY id LIMIT 1", (sha256,))
+    row = cursor.fetchone()
+    conn.close()
+    return row
+
+def get_page_fingerprints(page_count):
+    """Returns (id, first_page_hash, page_hashes, text_id, document_id, filepath) for documents with this many pages."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT id, first_page_hash, page_hashes, text_id, document_id, filepath FROM document_fingerprints WHERE page_count = ? AND first_page_hash IS NOT NULL",
+        (page_count,),
+    )
+    rows = cursor.fetchall()
+    conn.close()
+    return rows
+
+def get_document_texts(text_ids=None):
+    """Returns (id, client_id, filename, ocr_text, response_text, updated_at) for every stored document text, or only text_ids."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    query = "SELECT id, client_id, filename, ocr_text, response_text, updated_at FROM document_texts"
+    if text_ids is None:
+        cursor.execute(query + " ORDER BY id")
+    else:
+        text_ids = list(text_ids)
+        cursor.execute(query + f" WHERE id IN ({', '.join('?' * len(text_ids))}) ORDER BY id", text_ids)
+    texts = cursor.fetchall()
+    conn.close()
+    return texts
+
+def search_documents(match_expression, client_id=None, limit=20, like_terms=None):
+    """
+    Runs an FTS5 MATCH query over stored document texts, best matches first.
+    Returns (id, client_id, client name, filename, filepath, snippet, score) rows; lower score
+    is better (bm25). Without FTS5, like_terms (plain strings) are matched with LIKE instead.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    client_filter, params = ("AND t.client_id = ?", [client_id]) if client_id is not None else ("", [])
+    try:
+        cursor.execute(
+            f"""
+            SELECT t.id, t.client_id, c.name, t.filename, t.filepath,
+                   snippet(document_search, -1, '[', ']', ' … ', 16),
+                   bm25(document_search, {', '.join(str(w) for w in SEARCH_WEIGHTS)}) AS score
+            FROM document_search
+            JOIN document_texts t ON t.id = document_search.rowid
+            LEFT JOIN clients c ON c.id = t.client_id
+            WHERE document_search MATCH ? {client_filter}
+            ORDER BY score
+            LIMIT ?
+            """,
+            [match_expression] + params + [limit],
+        )
+    except sqlite3.OperationalError as e:
+        if 'no such table: document_search' not in str(e) or not like_terms:
+            conn.close()
+            raise
+        conditions = ' AND '.join(f"({' OR '.join(f'{col} LIKE ?' for col in SEARCH_COLUMNS)})" for _ in like_terms)
+        cursor.execute(
+            f"""
+            SELECT t.id, t.client_id, c.name, t.filename, t.filepath, substr(t.ocr_text, 1, 200), 0
+            FROM document_texts t LEFT JOIN clients c ON c.id = t.client_id
+            WHERE {conditions} {client_filter}
+            ORDER BY t.updated_at DESC LIMIT ?
+            """,
+            [f'%{term}%' for term in like_terms for _ in SEARCH_COLUMNS] + params + [limit],
+        )
+    results = cursor.fetchall()
+    conn.close()
+    return _with_client_names(results, 1, 2)
+
+
+def register_blob(sha256, path, size):
+    """Records a stored blob (no-op if already known) with its current documents reference count."""
+    conn = get_connection()
+    conn.execute(
+        "INSERT OR IGNORE INTO blobs (sha256, path, size, ref_count) VALUES (?, ?, ?, (SELECT COUNT(*) FROM documents WHERE filepath = ?))",
+        (sha256, path, size, path),
+    )
+    conn.commit()
+    conn.close()
+
+def get_blob_path(sha256):
+    """Returns the path a blob with this hash is stored at, or None if it isn't known."""
+    conn = get_connection()
+    row = conn.execute("SELECT path FROM blobs WHERE sha256 = ?", (sha256,)).fetchone()
+    conn.close()
+    return row[0] if row else None
+
+def recount_blob_refs():
+    """Recomputes every blob's reference count from the documents table."""
+    conn = get_connection()
+    conn.execute("UPDATE blobs SET ref_count = (SELECT COUNT(*) FROM documents d WHERE d.filepath = blobs.path)")
+    conn.commit()
+    conn.close()
+
+def get_unreferenced_blobs(grace_hours):
+    """Returns (sha256, path, size) of blobs no document references, stored more than grace_hours ago."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT sha256, path, size FROM blobs WHERE ref_count <= 0 AND created_at < datetime('now', ?)",
+        (f"-{grace_hours} hours",),
+    )
+    blobs = cursor.fetchall()
+    conn.close()
+    return blobs
+
+def delete_blob_rows(sha256s):
+    conn = get_connection()
+    conn.executemany("DELETE FROM blobs WHERE sha256 = ?", [(sha,) for sha in sha256s])
+    conn.commit()
+    conn.close()
+
+def get_blob_paths():
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT path FROM blobs")
+    paths = [row[0] for row in cursor.fetchall()]
+    conn.close()
+    return paths
+
+def get_blob_stats():
+    """Returns (blob count, total bytes, blobs referenced by at least one document)."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*), SUM(size), SUM(ref_count > 0) FROM blobs")
+    stats = cursor.fetchone()
+    conn.close()
+    return stats
+
+def create_chat_session(title=None):
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO chat_sessions (title) VALUES (?)", (title,))
+    session_id = cursor.lastrowid
+    conn.commit()
+    conn.close()
+    return session_id
+
+def get_chat_sessions(limit=20):
+    """Returns (id, title, updated_at) for the most recently active chat sessions."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT id, title, updated_at FROM chat_sessions ORDER BY updated_at DESC, id DESC LIMIT ?", (limit,))
+    sessions = cursor.fetchall()
+    conn.close()
+    return sessions
+
+def get_chat_session(session_id):
+    """Returns (id, title, summary, summarized_through) or None."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT id, title, summary, summarized_through FROM chat_sessions WHERE id = ?", (session_id,))
+    session = cursor.fetchone()
+    conn.close()
+    return session
+
+def add_chat_message(session_id, role, content, title=None):
+    """Appends a message; `title` names the session if it has no title yet."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO chat_messages (session_id, role, content) VALUES (?, ?, ?)", (session_id, role, content))
+    message_id = cursor.lastrowid
+    cursor.execute("UPDATE chat_sessions SET title = COALESCE(title, ?), updated_at = CURRENT_TIMESTAMP WHERE id = ?", (title, session_id))
+    conn.commit()
+    conn.close()
+    return message_id
+
+def get_chat_messages(session_id, after_id=0, before_id=None, limit=None):
+    """
+    Returns (id, role, content) in order for messages after `after_id` (and before `before_id`).
+    With `limit`, only the newest `limit` of them.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    query = "SELECT id, role, content FROM chat_messages WHERE session_id = ? AND id > ?"
+    params = [session_id, after_id]
+    if before_id is not None:
+        query += " AND id < ?"
+        params.append(before_id)
+    query += " ORDER BY id DESC"
+    if limit is not None:
+        query += " LIMIT ?"
+        params.append(limit)
+    cursor.execute(query, params)
+    messages = cursor.fetchall()[::-1]
+    conn.close()
+    return messages
+
+def update_chat_summary(session_id, summary, summarized_through):
+    conn = get_connection()
+    conn.execute("UPDATE chat_sessions SET summary = ?, summarized_through = ? WHERE id = ?", (summary, summarized_through, session_id))
+    conn.commit()
+    conn.close()
+
+
+# Time every helper above into finiq_db_query_seconds{function=...} (see tools/metrics.py)
+for _name, _function in list(globals().items()):
+    if inspect.isfunction(_function) and _function.__module__ == __name__ and not _name.startswith('_') and _name not in ROUTING_FUNCTIONS:
+        globals()[_name] = metrics.timer('finiq_db_query_seconds', function=_name)(_function)
+
 
 if __name__ == '__main__':
     # This will ensure the table schema is up-to-date when run directly
@@ -164,4 +800,4 @@ if __name__ == '__main__':
     # For simplicity here, we assume create_database handles IF NOT EXISTS correctly.
     # In a production scenario, use migration tools (like Alembic for SQLAlchemy).
     create_database()
-    print(f"Database '{DATABASE_NAME}' schema checked/created.")
\ No newline at end of file
+    print(f"Database '{database_path()}' schema checked/created.")
@@ -31,8 +31,12 @@ def perform_ocr(image_path):
 
 def main():
     """
-    Main function to iterate through images in the data folder and perform OCR.
+    Main function to iterate through images in the data folder, perform OCR and
+    draft responses for PDFs. For large or nested folders use tools/batch_ingest.py,
+    which runs concurrently and can resume after a crash.
     """
+    from tools.response_generator import auto_draft_response
+
     data_folder = "data"
     image_files = [f for f in os.listdir(data_folder) if f.endswith(('.png', '.jpg', '.jpeg', '.pdf'))]
 
@@ -48,6 +52,11 @@ def main():
         if extracted_text:
             print("Extracted Text:")
             print(extracted_text)
+            # Draft the response from the text we already have instead of OCR'ing the PDF again
+            if image_file.endswith('.pdf'):
+                response_letter = auto_draft_response(extracted_text)
+                with open(f"{image_file.replace('.pdf', '')}_response.txt", "w") as f:
+                    f.write(response_letter)
         else:
             print("No text extracted or error occurred.")
         print("-" * 30)
@@ -55,25 +64,6 @@ def main():
 if __name__ == "__main__":
     main()
 
-    # Call response generator
-    from tools.response_generator import auto_draft_response
-    import glob
-    
-    # Get the list of pdf files
-    pdf_files = glob.glob("data/*.pdf")
-    
-    # Loop through each pdf file
-    for pdf_file in pdf_files:
-        # Extract the file name
-        file_name = os.path.basename(pdf_file)
-        # Perform OCR
-        extracted_text = perform_ocr(pdf_file)
-        # Generate the response letter
-        response_letter = auto_draft_response(extracted_text)
-        # Save the response letter to a file
-        with open(f"{file_name.replace('.pdf', '')}_response.txt", "w") as f:
-            f.write(response_letter)
-
 
 # import os
 # import re
@@ -0,0 +1,362 @@
+"""
+SQLAlchemy Core storage for clients and reminders.
+
+database.py's client and reminder helpers delegate here, so the app, the Celery tasks and the
+completion server all follow one backend:
+
+  FINIQ_DATABASE_URL unset   the tenant's SQLite database, opened through database.get_connection()
+                             (so FINIQ_DB_FACTORY and tenant routing still apply)
+  FINIQ_DATABASE_URL set     any SQLAlchemy URL; "{tenant}" is replaced by the tenant name, e.g.
+                             postgresql+psycopg://finiq@db-host/finiq_{tenant}
+
+Documents, OCR text, search, fingerprints and blobs rely on SQLite features (FTS5, triggers) and
+stay in the tenant's SQLite file either way. Their queries can't join an external clients table,
+so database.py looks client names up with get_client_names() when FINIQ_DATABASE_URL is set.
+
+Rows come back as NamedTuples (Client, Reminder, ReminderDetail), so callers can use
+client.email as well as client[2].
+
+Schema changes are numbered migrations applied once per database by migrate() and recorded in
+schema_migrations. "core" migrations target the repository backend above; "local" ones target
+the tenant's SQLite file (database.create_database() creates its baseline tables). Add new
+changes as new entries; never edit an applied one.
+
+bulk_upsert_clients() / bulk_upsert_reminders() import thousands of rows in one transaction:
+existing rows are matched on a natural key in chunks, then inserted and updated with
+executemany. iter_clients() / iter_reminder_details() stream rows in batches for exports.
+"""
+import os
+from typing import NamedTuple, Optional
+
+from sqlalchemy import (Boolean, Column, DateTime, Index, Integer, MetaData, Table, Text, bindparam,
+                        create_engine, false, func, inspect, select, text, tuple_)
+from sqlalchemy.pool import NullPool
+
+import database
+
+DATABASE_URL = os.getenv("FINIQ_DATABASE_URL")
+BULK_CHUNK_SIZE = 500
+
+metadata = MetaData()
+
+clients = Table(
+    "clients", metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("name", Text, nullable=False),
+    Column("email", Text),
+    Column("phone", Text),
+    Column("created_at", DateTime, server_default=func.current_timestamp()),
+)
+
+reminders = Table(
+    "reminders", metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("client_id", Integer),  # clients.id; not a foreign key so imports can load in any order
+    Column("due_date", Text, nullable=False),     # YYYY-MM-DD
+    Column("reminder_time", Text),                # HH:MM
+    Column("frequency", Text),                    # Once, Daily, Weekly, Monthly
+    Column("is_completed", Boolean, server_default=false()),
+    Column("last_sent_at", Text),                 # ISO 8601, as written by tasks.py
+    Column("description", Text, nullable=False),
+    Column("created_at", DateTime, server_default=func.current_timestamp()),
+)
+
+schema_migrations = Table(
+    "schema_migrations", MetaData(),
+    Column("scope", Text, primary_key=True),
+    Column("version", Integer, primary_key=True),
+    Column("name", Text),
+    Column("applied_at", DateTime, server_default=func.current_timestamp()),
+)
+
+
+class Client(NamedTuple):
+    id: int
+    name: str
+    email: Optional[str]
+    phone: Optional[str]
+    created_at: object
+
+
+class Reminder(NamedTuple):
+    id: int
+    client_id: Optional[int]
+    due_date: str
+    reminder_time: Optional[str]
+    frequency: Optional[str]
+    is_completed: bool
+    last_sent_at: Optional[str]
+    description: str
+    created_at: object
+
+
+class ReminderDetail(NamedTuple):
+    """A reminder with its client's name and email, as the email tasks need it."""
+    id: int
+    due_date: str
+    reminder_time: Optional[str]
+    frequency: Optional[str]
+    is_completed: bool
+    last_sent_at: Optional[str]
+    description: str
+    client_name: Optional[str]
+    client_email: Optional[str]
+
+
+# --- Engines ---
+
+_engines = {}
+_migrated = set()  # Databases already brought up to date by this process
+
+
+def get_engine(tenant=None):
+    """The repository engine for the current (or given) tenant, created once per process."""
+    tenant = tenant or database.get_tenant()
+    if DATABASE_URL:
+        url = DATABASE_URL.format(tenant=database.validate_tenant(tenant))
+        if url not in _engines:
+            _engines[url] = create_engine(url, pool_pre_ping=True)
+        return _engines[url]
+    return local_engine(tenant)
+
+
+def local_engine(tenant=None):
+    """An engine over the tenant's own SQLite database, whatever FINIQ_DATABASE_URL says."""
+    tenant = tenant or database.get_tenant()
+    key = ("local", tenant, database.database_path(tenant))  # A moved DATABASE_NAME gets its own engine
+    if key not in _engines:
+        # A new sqlite3 connection per checkout, exactly as the sqlite3 helpers open them
+        _engines[key] = create_engine("sqlite://", creator=lambda: database.get_connection(tenant), poolclass=NullPool)
+    return _engines[key]
+
+
+# --- Migrations ---
+
+def _core_baseline(conn):
+    metadata.create_all(conn, tables=[clients, reminders], checkfirst=True)
+
+
+def _reminder_schedule_columns(conn):
+    """Databases created before reminders had times, frequencies and completion tracking."""
+    existing = {column["name"] for column in inspect(conn).get_columns("reminders")}
+    for name, ddl in (("reminder_time", "TEXT"), ("frequency", "TEXT"), ("is_completed", "BOOLEAN DEFAULT FALSE"), ("last_sent_at", "TEXT")):
+        if name not in existing:
+            conn.execute(text(f"ALTER TABLE reminders ADD COLUMN {name} {ddl}"))
+
+
+def _bulk_lookup_indexes(conn):
+    Index("idx_clients_email", clients.c.email).create(conn, checkfirst=True)
+    Index("idx_reminders_client_due", reminders.c.client_id, reminders.c.due_date).create(conn, checkfirst=True)
+
+
+def _document_classification_columns(conn):
+    if not inspect(conn).has_table("document_texts"):
+        return
+    existing = {column["name"] for column in inspect(conn).get_columns("document_texts")}
+    for name in ("document_type", "classified_by"):
+        if name not in existing:
+            conn.execute(text(f"ALTER TABLE document_texts ADD COLUMN {name} TEXT"))
+
+
+MIGRATIONS = {
+    "core": [
+        (1, "clients and reminders", _core_baseline),
+        (2, "reminder schedule columns", _reminder_schedule_columns),
+        (3, "bulk lookup indexes", _bulk_lookup_indexes),
+    ],
+    "local": [
+        (1, "document classification columns", _document_classification_columns),
+    ],
+}
+
+
+def _apply(engine, scope):
+    with engine.begin() as conn:
+        schema_migrations.create(conn, checkfirst=True)
+        applied = set(conn.execute(select(schema_migrations.c.version).where(schema_migrations.c.scope == scope)).scalars())
+    done = []
+    for version, name, migration in MIGRATIONS[scope]:
+        if version in applied:
+            continue
+        with engine.begin() as conn:  # One transaction per migration
+            migration(conn)
+            conn.execute(schema_migrations.insert().values(scope=scope, version=version, name=name))
+        done.append(f"{scope} {version}: {name}")
+    return done
+
+
+def migrate(tenant=None):
+    """Brings the tenant's databases up to date (once per process). Returns the migrations applied."""
+    tenant = tenant or database.get_tenant()
+    key = (DATABASE_URL, tenant, database.database_path(tenant))
+    if key in _migrated:
+        return []
+    applied = _apply(get_engine(tenant), "core") + _apply(local_engine(tenant), "local")
+    _migrated.add(key)
+    return applied
+
+
+# --- Clients ---
+
+def get_clients():
+    with get_engine().connect() as conn:
+        return [Client(*row) for row in conn.execute(select(clients).order_by(clients.c.id))]
+
+
+def get_client(client_id):
+    with get_engine().connect() as conn:
+        row = conn.execute(select(clients).where(clients.c.id == client_id)).first()
+    return Client(*row) if row else None
+
+
+def get_client_names(client_ids):
+    """{id: name} for the given client ids (unknown ids are left out)."""
+    client_ids = sorted({client_id for client_id in client_ids if client_id is not None})
+    names = {}
+    with get_engine().connect() as conn:
+        for start in range(0, len(client_ids), BULK_CHUNK_SIZE):
+            chunk = client_ids[start:start + BULK_CHUNK_SIZE]
+            names.update(conn.execute(select(clients.c.id, clients.c.name).where(clients.c.id.in_(chunk))).all())
+    return names
+
+
+def add_client(name, email, phone):
+    with get_engine().begin() as conn:
+        return conn.execute(clients.insert().values(name=name, email=email, phone=phone)).inserted_primary_key[0]
+
+
+# --- Reminders ---
+
+def get_reminders(client_id=None):
+    query = select(reminders).order_by(reminders.c.due_date)
+    if client_id:
+        query = query.where(reminders.c.client_id == client_id)
+    with get_engine().connect() as conn:
+        return [Reminder(*row) for row in conn.execute(query)]
+
+
+def add_reminder(client_id, due_date, reminder_time, frequency, description):
+    with get_engine().begin() as conn:
+        return conn.execute(reminders.insert().values(
+            client_id=client_id, due_date=due_date, reminder_time=reminder_time, frequency=frequency, description=description,
+        )).inserted_primary_key[0]
+
+
+def update_reminder(reminder_id, **values):
+    with get_engine().begin() as conn:
+        conn.execute(reminders.update().where(reminders.c.id == reminder_id).values(**values))
+
+
+def _reminder_details():
+    return (
+        select(reminders.c.id, reminders.c.due_date, reminders.c.reminder_time, reminders.c.frequency, reminders.c.is_completed,
+               reminders.c.last_sent_at, reminders.c.description, clients.c.name, clients.c.email)
+        .select_from(reminders.outerjoin(clients, reminders.c.client_id == clients.c.id))
+    )
+
+
+def get_reminder_detail(reminder_id):
+    with get_engine().connect() as conn:
+        row = conn.execute(_reminder_details().where(reminders.c.id == reminder_id)).first()
+    return ReminderDetail(*row) if row else None
+
+
+def get_open_reminders():
+    """Reminders not yet completed whose client has an email address."""
+    query = _reminder_details().where(reminders.c.is_completed == false(), clients.c.email.is_not(None), clients.c.email != "")
+    with get_engine().connect() as conn:
+        return [ReminderDetail(*row) for row in conn.execute(query)]
+
+
+def _stream(query, row_type, batch_size):
+    with get_engine().connect() as conn:
+        result = conn.execution_options(yield_per=batch_size).execute(query)
+        for row in result:
+            yield row_type(*row)
+
+
+def iter_clients(batch_size=BULK_CHUNK_SIZE):
+    """Yields every client in id order, fetching `batch_size` rows at a time."""
+    return _stream(select(clients).order_by(clients.c.id), Client, batch_size)
+
+
+def iter_reminder_details(batch_size=BULK_CHUNK_SIZE):
+    """Yields every reminder with its client's name and email in id order, `batch_size` rows at a time."""
+    return _stream(_reminder_details().order_by(reminders.c.id), ReminderDetail, batch_size)
+
+
+# --- Bulk import ---
+
+def _bulk_upsert(table, rows, key, columns, optional=()):
+    """
+    Inserts `rows` (dicts) into `table`, updating the existing row instead where all `key`
+    columns match. Only the columns that appear in `rows` are written, so an import without
+    phone numbers keeps the stored ones. Key columns listed in `optional` may be empty and then
+    match stored NULLs; rows with any other empty key value are always inserted. Later
+    duplicates within `rows` win. Runs in one transaction. Returns (inserted, updated).
+    """
+    rows = list(rows)
+    columns = [column for column in columns if column in key or any(column in row for row in rows)]
+    keyed, unkeyed = {}, []
+    for row in rows:
+        values = {column: row.get(column) for column in columns}
+        for column in optional:
+            if values[column] == "":
+                values[column] = None
+        key_values = tuple(values[column] for column in key)
+        if any(value is None or value == "" for column, value in zip(key, key_values) if column not in optional):
+            unkeyed.append(values)
+        else:
+            keyed[key_values] = values
+    # Look rows up per pattern of empty optional key columns, matching those with IS NULL
+    patterns = {}
+    for key_values in keyed:
+        patterns.setdefault(tuple(value is None for value in key_values), []).append(key_values)
+    updates, inserts = [], list(unkeyed)
+    with get_engine().begin() as conn:
+        existing = {}
+        for pattern, pending in patterns.items():
+            key_columns = [table.c[column] for column, empty in zip(key, pattern) if not empty]
+            null_conditions = [table.c[column].is_(None) for column, empty in zip(key, pattern) if empty]
+            for start in range(0, len(pending), BULK_CHUNK_SIZE):
+                chunk = [tuple(value for value in key_values if value is not None)
+                         for key_values in pending[start:start + BULK_CHUNK_SIZE]]
+                if len(key_columns) == 1:
+                    condition = key_columns[0].in_([values[0] for values in chunk])
+                else:
+                    condition = tuple_(*key_columns).in_(chunk)
+                for row in conn.execute(select(table.c.id, *key_columns).where(condition, *null_conditions)):
+                    found = iter(row[1:])
+                    existing[tuple(None if empty else next(found) for empty in pattern)] = row[0]
+        for key_values, values in keyed.items():
+            if key_values in existing:
+                updates.append(dict(values, _id=existing[key_values]))
+            else:
+                inserts.append(values)
+        if inserts:
+            conn.execute(table.insert(), inserts)
+        if updates:
+            conn.execute(
+                table.update().where(table.c.id == bindparam("_id")).values({column: bindparam(column) for column in columns}),
+                updates,
+            )
+    return len(inserts), len(updates)
+
+
+def bulk_upsert_clients(rows, key=("email",)):
+    """Imports client dicts (name, email, phone), matching existing clients by email. Returns (inserted, updated)."""
+    return _bulk_upsert(clients, rows, key, ["name", "email", "phone"])
+
+
+def bulk_upsert_reminders(rows, key=("client_id", "due_date", "description")):
+    """
+    Imports reminder dicts (client_id, due_date, reminder_time, frequency, description and,
+    optionally, is_completed and last_sent_at), matching existing reminders by client, due date
+    and description; reminders without a client match on due date and description among the
+    other unlinked ones. Returns (inserted, updated).
+    """
+    return _bulk_upsert(
+        reminders, rows, key,
+        ["client_id", "due_date", "reminder_time", "frequency", "description", "is_completed", "last_sent_at"],
+        optional=("client_id",),
+    )
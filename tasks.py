@@ -4,9 +4,12 @@ from email.mime.multipart import MIMEMultipart
 import database
 import config
 from celery_app import celery
+from celery import group
 from datetime import datetime, timedelta
 import logging
+import time
 from itsdangerous import URLSafeTimedSerializer # Import serializer
+from tools import metrics, profiling
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -15,37 +18,33 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 serializer = URLSafeTimedSerializer(config.FLASK_SECRET_KEY, salt='reminder-completion-salt')
 
 @celery.task(name='tasks.send_reminder_email')
-def send_reminder_email(reminder_id):
+@profiling.profiled('send_reminder_email')
+def send_reminder_email(reminder_id, tenant=database.DEFAULT_TENANT):
     """
-    Fetches reminder details and sends an email notification.
+    Fetches reminder details from the tenant's database and sends an email notification.
     """
-    conn = None
+    tenant_token = database.set_tenant(tenant)
     try:
-        conn = database.sqlite3.connect(database.DATABASE_NAME)
-        cursor = conn.cursor()
         # Fetch reminder details including client email if available
-        cursor.execute("""
-            SELECT r.id, r.due_date, r.reminder_time, r.frequency, r.description, r.is_completed, c.name, c.email
-            FROM reminders r
-            LEFT JOIN clients c ON r.client_id = c.id
-            WHERE r.id = ?
-        """, (reminder_id,))
-        reminder = cursor.fetchone()
-        conn.close() # Close connection after fetching
+        reminder = database.get_reminder_detail(reminder_id)
 
         if not reminder:
             logging.error(f"Reminder with ID {reminder_id} not found.")
+            metrics.inc("finiq_emails_total", status="skipped")
             return f"Reminder {reminder_id} not found."
 
-        rem_id, due_date, reminder_time, frequency, description, is_completed, client_name, client_email = reminder
+        rem_id, due_date, reminder_time, description, is_completed = reminder.id, reminder.due_date, reminder.reminder_time, reminder.description, reminder.is_completed
+        client_name, client_email = reminder.client_name, reminder.client_email
 
         if is_completed:
             logging.info(f"Reminder ID {rem_id} is already marked as completed. Skipping email.")
+            metrics.inc("finiq_emails_total", status="skipped")
             return f"Reminder {rem_id} already completed."
 
         if not client_email:
             logging.warning(f"No email address found for client associated with reminder ID {rem_id}. Cannot send email.")
             # Optionally, update reminder status or log differently
+            metrics.inc("finiq_emails_total", status="skipped")
             return f"No client email for reminder {rem_id}."
 
         # --- Email Sending Logic ---
@@ -60,8 +59,8 @@ def send_reminder_email(reminder_id):
 
         # --- Generate Completion Link ---
         try:
-            # Create a signed token containing the reminder ID
-            completion_token = serializer.dumps(rem_id)
+            # Create a signed token containing the reminder ID and its tenant
+            completion_token = serializer.dumps({'reminder_id': rem_id, 'tenant': tenant})
             completion_link = f"{config.COMPLETION_SERVER_URL}/complete/{completion_token}"
             logging.info(f"Generated completion link for reminder {rem_id}: {completion_link}")
         except Exception as e:
@@ -132,6 +131,7 @@ def send_reminder_email(reminder_id):
                 server.login(sender_email, password)
                 server.sendmail(sender_email, receiver_email, message.as_string())
             logging.info(f"Successfully sent reminder email for reminder ID {rem_id} to {receiver_email}")
+            metrics.inc("finiq_emails_total", status="sent")
 
             # Update last_sent_at timestamp in the database
             try:
@@ -144,14 +144,16 @@ def send_reminder_email(reminder_id):
             return f"Email sent for reminder {rem_id}."
         except smtplib.SMTPAuthenticationError:
             logging.error(f"SMTP Authentication Error for reminder ID {rem_id}. Check email credentials in .env.")
+            metrics.inc("finiq_emails_total", status="failed")
             # Consider re-queueing or marking as failed
             raise # Re-raise to let Celery handle retry/failure
         except Exception as e:
             logging.error(f"Failed to send email for reminder ID {rem_id}: {e}")
+            metrics.inc("finiq_emails_total", status="failed")
             # Consider re-queueing or marking as failed
             raise # Re-raise to let Celery handle retry/failure
 
-    except sqlite3.Error as e:
+    except database.DB_ERRORS as e:
         logging.error(f"Database error processing reminder ID {reminder_id}: {e}")
         # Handle database errors appropriately
         return f"Database error for reminder {reminder_id}."
@@ -159,44 +161,44 @@ def send_reminder_email(reminder_id):
         logging.error(f"Unexpected error processing reminder ID {reminder_id}: {e}")
         raise # Re-raise for Celery
     finally:
-        if conn:
-            conn.close()
+        database.reset_tenant(tenant_token)
+        metrics.flush() # Workers sit idle between tasks, so publish now rather than on the next recording
 
 
 # --- Task to Periodically Check Reminders (Celery Beat) ---
 
 @celery.task(name='tasks.check_and_schedule_reminders')
-def check_and_schedule_reminders():
+@profiling.profiled('check_and_schedule_reminders')
+def check_and_schedule_reminders(tenant=None):
     """
-    Checks the database for reminders that are due and schedules email tasks.
-    This task will be run periodically by Celery Beat.
+    Checks a tenant's database for reminders that are due and schedules email tasks.
+    This task will be run periodically by Celery Beat without a tenant: it then fans out one
+    scan per tenant, which the workers run in parallel.
     """
-    conn = None
+    if tenant is None:
+        tenants = database.list_tenants()
+        if len(tenants) > 1:
+            group(check_and_schedule_reminders.s(name) for name in tenants).apply_async()
+            logging.info(f"Dispatched reminder scans for {len(tenants)} tenants.")
+            return f"Dispatched reminder scans for {len(tenants)} tenants."
+        tenant = tenants[0]
+
+    scan_started = time.perf_counter()
+    tenant_token = database.set_tenant(tenant)
     try:
-        conn = database.sqlite3.connect(database.DATABASE_NAME)
-        cursor = conn.cursor()
-
         # Get current date and time in the correct timezone
         now = datetime.now(celery.conf.timezone)
         current_date_str = now.strftime("%Y-%m-%d")
         current_time_str = now.strftime("%H:%M")
 
-        logging.info(f"Checking reminders for {current_date_str} {current_time_str}")
-
-        # Fetch reminders that are due, not completed, and have a client email
-        cursor.execute("""
-            SELECT r.id, r.due_date, r.reminder_time, r.frequency, r.last_sent_at
-            FROM reminders r
-            JOIN clients c ON r.client_id = c.id
-            WHERE r.is_completed = FALSE
-              AND c.email IS NOT NULL AND c.email != ''
-        """)
+        logging.info(f"Checking reminders for tenant {tenant} at {current_date_str} {current_time_str}")
 
-        reminders_to_process = cursor.fetchall()
-        conn.close() # Close connection after fetching
+        # Fetch reminders that are not completed and have a client email
+        reminders_to_process = database.get_open_reminders()
 
         scheduled_count = 0
-        for rem_id, due_date_str, reminder_time_str, frequency, last_sent_at_str in reminders_to_process:
+        for reminder in reminders_to_process:
+            rem_id, due_date_str, reminder_time_str, frequency, last_sent_at_str = reminder.id, reminder.due_date, reminder.reminder_time, reminder.frequency, reminder.last_sent_at
             try:
                 # Combine date and time, handle potential None for time
                 reminder_datetime_str = f"{due_date_str} {reminder_time_str or '00:00'}"
@@ -240,7 +242,7 @@ def check_and_schedule_reminders():
 
                 if should_send:
                     logging.info(f"Scheduling email for reminder ID {rem_id} (Due: {due_date_str} {reminder_time_str}, Freq: {frequency})")
-                    send_reminder_email.delay(rem_id) # Queue the email sending task
+                    send_reminder_email.delay(rem_id, tenant) # Queue the email sending task
                     scheduled_count += 1
                 # else:
                 #     logging.debug(f"Skipping reminder ID {rem_id} based on frequency '{frequency}' and last sent '{last_sent_at_str}'")
@@ -252,14 +254,16 @@ def check_and_schedule_reminders():
 
 
         logging.info(f"Finished checking reminders. Scheduled {scheduled_count} emails.")
+        metrics.set_gauge("finiq_reminders_scheduled", scheduled_count, tenant=tenant)
         return f"Checked reminders, scheduled {scheduled_count}."
 
-    except sqlite3.Error as e:
+    except database.DB_ERRORS as e:
         logging.error(f"Database error checking reminders: {e}")
         return "Database error during check."
     except Exception as e:
         logging.error(f"Unexpected error checking reminders: {e}")
         return "Unexpected error during check."
     finally:
-        if conn:
-            conn.close()
\ No newline at end of file
+        database.reset_tenant(tenant_token)
+        metrics.observe("finiq_reminder_scan_seconds", time.perf_counter() - scan_started, tenant=tenant)
+        metrics.flush()
\ No newline at end of file
@@ -0,0 +1,35 @@
+import io
+
+import pytest
+
+import database
+import repository
+from tools import bulk_io, metrics
+
+
+@pytest.fixture
+def tenant_db(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # Tenant files land under data/ relative to the working directory
+    monkeypatch.setattr(database, "DATABASE_NAME", str(tmp_path / "client_management.db"))
+    monkeypatch.setattr(repository, "DATABASE_URL", None)
+    previous = metrics.redirect(str(tmp_path / "metrics.db"))
+    database.create_database()
+    yield
+    metrics.redirect(previous)
+
+
+def test_reminders_do_not_resolve_to_a_client_without_email(tenant_db):
+    database.add_client("Acme", "acme@x.com", "")
+    database.add_client("Solo", "", "")  # The Add Client form stores '' for a blank email
+    ids = {client.name: client.id for client in database.get_all_clients()}
+    sheet = io.BytesIO(
+        b"Client Email,Client Name,Due Date,Description\n"
+        b",Acme,2024-07-31,ITR\n"
+        b",Nobody,2024-07-31,ITR\n"
+        b",,2024-08-15,Unlinked\n"
+    )
+
+    rows, errors = bulk_io.validate_reminders(bulk_io.read_table(sheet, "reminders.csv"))
+
+    assert [row["client_id"] for row in rows] == [ids["Acme"], None]
+    assert errors.to_dict("records") == [{"row": 3, "error": "Client not found (or name shared by several clients)"}]
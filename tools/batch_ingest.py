@@ -0,0 +1,219 @@
+"""
+Bulk folder ingestion.
+
+Walks a directory tree, OCRs every supported document once and writes the OCR Markdown next to
+what its type calls for (see tools/document_classifier.py): extracted metadata for invoices and
+identity documents, a drafted response (.docx) for notices. Output names keep the source file's
+extension (notice.pdf.md, notice.pdf_response.docx).
+Progress is recorded per file in a SQLite manifest (status + SHA-256 of the content), so an
+interrupted run can simply be restarted: files that are already done and unchanged are skipped.
+
+Usage:
+    python -m tools.batch_ingest data/ --out data/ingested --workers 4
+"""
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+SUPPORTED_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.pdf')
+MANIFEST_NAME = "manifest.db"
+
+
+# --- Manifest ---
+
+def open_manifest(out_dir):
+    """Opens (and creates if needed) the progress manifest inside the output folder."""
+    os.makedirs(out_dir, exist_ok=True)
+    conn = sqlite3.connect(os.path.join(out_dir, MANIFEST_NAME))
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS files (
+        path TEXT PRIMARY KEY,       -- Path relative to the input root
+        sha256 TEXT NOT NULL,
+        status TEXT NOT NULL,        -- pending, done, failed
+        error TEXT,
+        outputs TEXT,                -- JSON list of written files
+        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    conn.commit()
+    return conn
+
+
+def load_completed(conn):
+    """Returns {relative path: sha256} for every file that finished successfully."""
+    return dict(conn.execute("SELECT path, sha256 FROM files WHERE status = 'done'").fetchall())
+
+
+def record_status(conn, rel_path, sha256, status, error=None, outputs=None):
+    conn.execute(
+        "INSERT OR REPLACE INTO files (path, sha256, status, error, outputs, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+        (rel_path, sha256, status, error, json.dumps(outputs or []), datetime.now().isoformat()),
+    )
+    conn.commit()  # Commit per file so a crash loses at most the file in flight
+
+
+# --- Discovery ---
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def discover_files(root, exclude_dir=None):
+    """Yields paths (relative to root) of every supported document under root, in a stable order."""
+    exclude_dir = os.path.abspath(exclude_dir) if exclude_dir else None
+    for dirpath, dirnames, filenames in os.walk(root):
+        # Never descend into the output folder when it lives inside the input tree
+        dirnames[:] = sorted(d for d in dirnames if os.path.abspath(os.path.join(dirpath, d)) != exclude_dir)
+        for filename in sorted(filenames):
+            if filename.lower().endswith(SUPPORTED_EXTENSIONS):
+                yield os.path.relpath(os.path.join(dirpath, filename), root)
+
+
+# --- Worker ---
+
+def process_file(root, rel_path, out_dir, with_metadata=True, with_draft=True, tenant=None):
+    """
+    OCRs and classifies one file and writes the outputs its type calls for. Runs in a worker process.
+    Returns (written output paths, OCR text, drafted response or None, classification); raises on failure.
+    """
+    import database
+    if tenant:
+        database.set_tenant(tenant)  # Worker processes don't inherit the parent's context (classifier model path)
+    # Imported here so each worker process builds its own docling converter
+    from tools.ocr_script import perform_ocr
+    from tools import document_classifier
+    from tools.metadata_extractor import extract_metadata
+    from tools.response_generator import auto_draft_response, save_response_to_docx
+
+    source_path = os.path.join(root, rel_path)
+    target_dir = os.path.join(out_dir, os.path.dirname(rel_path))
+    os.makedirs(target_dir, exist_ok=True)
+    # Keep the extension so notice.pdf and notice.png in one folder don't overwrite each other's outputs
+    base = os.path.join(out_dir, rel_path)
+
+    # OCR exactly once; every downstream step reuses this text
+    extracted_text = perform_ocr(source_path)
+    if not extracted_text:
+        raise RuntimeError("No text extracted")
+
+    outputs = []
+    with open(f"{base}.md", "w", encoding="utf-8") as f:
+        f.write(extracted_text)
+    outputs.append(f"{base}.md")
+
+    # Cheap-first classification decides which of the expensive LLM steps are worth running
+    classification = document_classifier.classify(extracted_text)
+    route = document_classifier.route(classification["document_type"])
+
+    if with_metadata and route in ("metadata", "identifiers"):
+        if route == "metadata":
+            metadata = extract_metadata(extracted_text)
+        else:
+            metadata = document_classifier.extract_identifiers(extracted_text)
+        metadata["document_type"] = classification["document_type"]
+        with open(f"{base}.metadata.json", "w", encoding="utf-8") as f:
+            json.dump(metadata, f, indent=2)
+        outputs.append(f"{base}.metadata.json")
+
+    response_letter = None
+    if with_draft and route == "draft":
+        response_letter = auto_draft_response(extracted_text, classification["document_type"])
+        with open(f"{base}_response.docx", "wb") as f:
+            f.write(save_response_to_docx(response_letter).getvalue())
+        outputs.append(f"{base}_response.docx")
+
+    return outputs, extracted_text, response_letter, classification
+
+
+# --- Driver ---
+
+def ingest_folder(root, out_dir, workers=None, with_metadata=True, with_draft=True, force=False, index=True):
+    """
+    Processes every new or changed document under root concurrently.
+    With index=True each document's text is also added to the app's full-text search index.
+    Returns a dict with counts of processed, skipped and failed files.
+    Everything is stored for the current tenant (FINIQ_TENANT, see database.py).
+    """
+    import database
+    tenant = database.get_tenant()
+    if index:
+        from tools import document_classifier, document_search
+        database.create_database()
+    conn = open_manifest(out_dir)
+    completed = {} if force else load_completed(conn)
+    counts = {"processed": 0, "skipped": 0, "failed": 0}
+
+    # Only the parent process touches the manifest, so SQLite never sees concurrent writers
+    pending = {}
+    for rel_path in discover_files(root, exclude_dir=out_dir):
+        sha256 = file_sha256(os.path.join(root, rel_path))
+        if completed.get(rel_path) == sha256:
+            counts["skipped"] += 1
+            continue
+        pending[rel_path] = sha256
+        record_status(conn, rel_path, sha256, "pending")
+
+    print(f"{len(pending)} file(s) to process, {counts['skipped']} already done.")
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(process_file, root, rel_path, out_dir, with_metadata, with_draft, tenant): rel_path
+            for rel_path in pending
+        }
+        for future in as_completed(futures):
+            rel_path = futures[future]
+            try:
+                outputs, extracted_text, response_letter, classification = future.result()
+                if index:
+                    document_search.index_document(
+                        os.path.join(root, rel_path), os.path.basename(rel_path), extracted_text, response_letter,
+                        document_type=classification["document_type"], classified_by=classification["method"],
+                    )
+                record_status(conn, rel_path, pending[rel_path], "done", outputs=outputs)
+                counts["processed"] += 1
+                print(f"Done: {rel_path} ({classification['document_type']})")
+            except Exception as e:
+                record_status(conn, rel_path, pending[rel_path], "failed", error=str(e))
+                counts["failed"] += 1
+                print(f"Failed: {rel_path}: {e}")
+
+    conn.close()
+    if index and counts["processed"]:
+        document_classifier.refresh_model()
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="OCR a folder tree and draft responses, resumably.")
+    parser.add_argument("root", nargs="?", default="data", help="Folder to ingest (walked recursively)")
+    parser.add_argument("--out", default="data/ingested", help="Output folder (also holds the manifest)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--no-metadata", action="store_true", help="Skip LLM metadata extraction")
+    parser.add_argument("--no-draft", action="store_true", help="Skip drafting response letters")
+    parser.add_argument("--force", action="store_true", help="Reprocess files already marked done")
+    parser.add_argument("--no-index", action="store_true", help="Don't add documents to the search index")
+    args = parser.parse_args(argv)
+
+    counts = ingest_folder(
+        args.root,
+        args.out,
+        workers=args.workers,
+        with_metadata=not args.no_metadata,
+        with_draft=not args.no_draft,
+        force=args.force,
+        index=not args.no_index,
+    )
+    print(f"Processed {counts['processed']}, skipped {counts['skipped']}, failed {counts['failed']}.")
+    return 1 if counts["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
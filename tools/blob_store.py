@@ -0,0 +1,137 @@
+"""
+Content-addressed storage for uploaded documents.
+
+Each upload is streamed to disk in fixed-size chunks while its SHA-256 is computed, then moved
+to a path derived from that hash, sharded two levels deep so no directory grows unbounded:
+
+    data/blobs/ab/cd/abcdef....pdf
+
+Identical uploads share one file, kept under the extension it was first stored with (the same
+bytes uploaded later as .jpeg rather than .jpg reuse it). The `blobs` table tracks every stored file and how many
+`documents` rows point at it (kept current by triggers, see database.create_database).
+Blobs that no document references - e.g. notices processed without a client, once their text is
+in document_texts - are deleted by the garbage collector after a grace period.
+
+Usage:
+    python -m tools.blob_store gc [--grace-hours 24] [--dry-run]
+    python -m tools.blob_store stats
+"""
+import argparse
+import hashlib
+import os
+import sys
+import tempfile
+import time
+
+import database
+
+BLOB_ROOT = os.path.join("data", "blobs")
+CHUNK_SIZE = 1024 * 1024
+GC_GRACE_HOURS = 24
+
+
+def blob_path(sha256, extension="", root=None):
+    root = root or database.tenant_path(BLOB_ROOT)
+    return os.path.join(root, sha256[:2], sha256[2:4], sha256 + extension.lower())
+
+
+def put_stream(stream, extension="", root=None, chunk_size=CHUNK_SIZE):
+    """
+    Stores a readable binary stream (file object or Streamlit UploadedFile) without holding it
+    in memory. Returns (sha256, path, size); an existing identical blob is reused.
+    """
+    root = root or database.tenant_path(BLOB_ROOT)
+    tmp_dir = os.path.join(root, "tmp")
+    os.makedirs(tmp_dir, exist_ok=True)
+    if hasattr(stream, "seek"):
+        stream.seek(0)
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while chunk := stream.read(chunk_size):
+                digest.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+        sha256 = digest.hexdigest()
+        # The table is keyed on the hash, so a blob already recorded keeps its path whatever the extension
+        path = database.get_blob_path(sha256) or blob_path(sha256, extension, root)
+        if os.path.exists(path):
+            os.remove(tmp_path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    database.register_blob(sha256, path, size)
+    return sha256, path, size
+
+
+def put_file(source_path, root=None):
+    """Stores a file already on disk (e.g. from batch ingestion). Returns (sha256, path, size)."""
+    with open(source_path, "rb") as f:
+        return put_stream(f, os.path.splitext(source_path)[1], root)
+
+
+def collect_garbage(grace_hours=GC_GRACE_HOURS, root=None, dry_run=False):
+    """
+    Deletes blobs with no referencing documents row that are older than the grace period,
+    stray temp files from interrupted writes, and files under root the blobs table doesn't know.
+    Reference counts are recounted first, so rows added before the triggers existed are honoured.
+    Returns a dict with counts and bytes freed.
+    """
+    root = root or database.tenant_path(BLOB_ROOT)
+    cutoff = time.time() - grace_hours * 3600
+    database.recount_blob_refs()
+    result = {"deleted": 0, "bytes_freed": 0, "orphans": 0}
+
+    removed = []
+    for sha256, path, size in database.get_unreferenced_blobs(grace_hours):
+        if os.path.exists(path) and not dry_run:
+            os.remove(path)
+        removed.append(sha256)
+        result["deleted"] += 1
+        result["bytes_freed"] += size or 0
+    if removed and not dry_run:
+        database.delete_blob_rows(removed)
+
+    known = {os.path.normpath(path) for path in database.get_blob_paths()}
+    for dirpath, dirnames, filenames in os.walk(root):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            if os.path.normpath(path) in known or os.path.getmtime(path) > cutoff:
+                continue
+            result["orphans"] += 1
+            result["bytes_freed"] += os.path.getsize(path)
+            if not dry_run:
+                os.remove(path)
+        # Prune empty shard directories
+        if not dry_run and dirpath != root and not dirnames and not os.listdir(dirpath):
+            os.rmdir(dirpath)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage the content-addressed upload store.")
+    parser.add_argument("command", choices=["gc", "stats"])
+    parser.add_argument("--grace-hours", type=float, default=GC_GRACE_HOURS, help="Keep unreferenced blobs younger than this")
+    parser.add_argument("--dry-run", action="store_true", help="Report what gc would delete without deleting")
+    args = parser.parse_args(argv)
+
+    database.create_database()
+    if args.command == "gc":
+        result = collect_garbage(args.grace_hours, dry_run=args.dry_run)
+        verb = "Would delete" if args.dry_run else "Deleted"
+        print(f"{verb} {result['deleted']} unreferenced blobs and {result['orphans']} orphaned files, {result['bytes_freed'] / 1e6:,.1f} MB.")
+    else:
+        database.recount_blob_refs()
+        count, total_size, referenced = database.get_blob_stats()
+        print(f"{count} blobs, {(total_size or 0) / 1e6:,.1f} MB, {referenced} referenced by documents.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,322 @@
+"""
+Bulk import and export of clients and reminders.
+
+Imports read a CSV or Excel sheet, validate every row at once with vectorized pandas checks,
+and write the valid rows in a single transaction (database.bulk_upsert_clients /
+bulk_upsert_reminders), so onboarding 2,000 clients and 20,000 deadlines is one upload:
+
+  clients     Name (required), Email, Phone. An existing client with the same email is
+              updated; clients without an email are always added.
+  reminders   Client Email and/or Client Name (optional), Due Date (required), Time (HH:MM),
+              Frequency (Once, Daily, Weekly, Monthly; default Once), Description (required).
+              Completed (yes/no) and Last Sent are optional. An existing reminder with the
+              same client, due date and description is updated; a reminder without a client
+              updates an unlinked one with the same due date and description.
+
+Column names are matched case-insensitively against the aliases below. Rows that fail
+validation are reported with their sheet row number and are not written; dry_run=True only
+validates. Import clients before the reminders that refer to them (restore_backup does, and a
+dry-run restore resolves reminders against the clients in the backup as well).
+
+Exports stream rows from the database in batches straight into CSV, or into a .zip of both
+tables for backups, so memory stays flat however many rows there are. Exported files import
+back as they are.
+
+    python -m tools.bulk_io import clients clients.xlsx --dry-run
+    python -m tools.bulk_io import reminders deadlines.csv
+    python -m tools.bulk_io export backup.zip
+    python -m tools.bulk_io restore backup.zip
+"""
+import argparse
+import csv
+import io
+import sys
+import zipfile
+from typing import NamedTuple
+
+import pandas as pd
+
+import database
+import repository
+from tools import financials
+
+EMAIL_REGEX = r"^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$"
+TIME_REGEX = r"^([01]?\d|2[0-3]):([0-5]\d)(?::[0-5]\d)?$"
+FREQUENCIES = ["Once", "Daily", "Weekly", "Monthly"]
+
+CLIENT_COLUMNS = {
+    "name": ["Name", "Client Name", "Client"],
+    "email": ["Email", "Email ID", "E-mail", "Email Address"],
+    "phone": ["Phone", "Mobile", "Phone Number", "Mobile Number", "Contact"],
+}
+REMINDER_COLUMNS = {
+    "client_email": ["Client Email", "Email"],
+    "client_name": ["Client Name", "Client"],
+    "due_date": ["Due Date", "Due", "Date"],
+    "reminder_time": ["Time", "Reminder Time"],
+    "frequency": ["Frequency"],
+    "description": ["Description", "Task", "Compliance", "Particulars"],
+    "is_completed": ["Completed", "Is Completed", "Done"],
+    "last_sent_at": ["Last Sent", "Last Sent At"],
+}
+COMPLETED_VALUES = {"": False, "false": False, "no": False, "n": False, "0": False,
+                    "true": True, "yes": True, "y": True, "1": True}
+CLIENT_EXPORT_HEADER = ["Name", "Email", "Phone", "Added On"]
+REMINDER_EXPORT_HEADER = ["Client Name", "Client Email", "Due Date", "Time", "Frequency", "Description", "Completed", "Last Sent"]
+BACKUP_FILES = {"clients": "clients.csv", "reminders": "reminders.csv"}
+
+
+class ImportResult(NamedTuple):
+    valid: int             # Rows that passed validation
+    inserted: int
+    updated: int
+    errors: pd.DataFrame   # row (as numbered in the sheet), error
+
+
+def _first_column(df, candidates):
+    lookup = {str(column).strip().lower(): column for column in df.columns}
+    return next((lookup[c.lower()] for c in candidates if c.lower() in lookup), None)
+
+
+def _text(df, column):
+    """The column as stripped strings ("" for missing cells or a missing column)."""
+    if column is None:
+        return pd.Series("", index=df.index)
+    return df[column].fillna("").astype(str).str.strip()
+
+
+def read_table(file, file_name=None):
+    """Reads a CSV/Excel sheet (path or file-like object) with every cell as text, so phone numbers keep their leading zeros."""
+    name = file_name or getattr(file, "name", None) or (file if isinstance(file, str) else "")
+    if str(name).lower().endswith(".csv"):
+        return pd.read_csv(file, dtype=str, keep_default_na=False)
+    return pd.read_excel(file, dtype=str).fillna("")
+
+
+def _report(df, checks):
+    """Collects (message, mask) checks into per-row messages. Returns (rows that failed, errors frame)."""
+    messages = pd.Series("", index=df.index)
+    for message, mask in checks:
+        messages = messages.mask(mask, messages + message + "; ")
+    failed = messages != ""
+    errors = pd.DataFrame({"row": df.index[failed] + 2, "error": messages[failed].str.rstrip("; ")})  # Row 1 is the header
+    return failed, errors.reset_index(drop=True)
+
+
+def validate_clients(df):
+    """Returns (client dicts ready for bulk_upsert_clients, errors frame)."""
+    if _first_column(df, CLIENT_COLUMNS["name"]) is None:
+        raise ValueError(f"Client sheet needs a name column (one of: {', '.join(CLIENT_COLUMNS['name'])}).")
+    values = pd.DataFrame({field: _text(df, _first_column(df, aliases)) for field, aliases in CLIENT_COLUMNS.items()})
+    has_email = values["email"] != ""
+    failed, errors = _report(values, [
+        ("Name is required", values["name"] == ""),
+        ("Invalid email format", has_email & ~values["email"].str.match(EMAIL_REGEX)),
+        ("Email repeated further down the sheet", has_email & values["email"].duplicated(keep="last")),
+    ])
+    rows = values[~failed].replace("", None)
+    return rows.to_dict("records"), errors
+
+
+def _client_ids(new_clients=()):
+    """
+    Lookups from client email and from unambiguous client name to id. `new_clients` (client
+    dicts not written yet, as in a dry run) get placeholder negative ids unless their email is
+    already stored.
+    """
+    clients = pd.DataFrame(database.get_all_clients(), columns=repository.Client._fields)[["id", "name", "email"]]
+    clients["email"] = clients["email"].mask(clients["email"].fillna("") == "")  # The Add Client form stores '' for no email
+    if new_clients:
+        new = pd.DataFrame(list(new_clients), columns=["name", "email"])
+        new = new[~new["email"].isin(clients["email"].dropna())]
+        new.insert(0, "id", range(-1, -len(new) - 1, -1))
+        clients = pd.concat([clients, new], ignore_index=True).astype({"id": "int64"})
+    by_email = clients.dropna(subset=["email"]).drop_duplicates("email").set_index("email")["id"]
+    names = clients["name"].str.strip().str.casefold()
+    unique = ~names.duplicated(keep=False)
+    return by_email, pd.Series(clients["id"][unique].values, index=names[unique])
+
+
+def _nullable(values):
+    """Object Series with None for missing values, as the database driver expects."""
+    return values.astype(object).where(values.notna(), None)
+
+
+def validate_reminders(df, new_clients=()):
+    """
+    Returns (reminder dicts ready for bulk_upsert_reminders, errors frame). Clients are resolved
+    against the database and `new_clients` (see _client_ids).
+    """
+    for field in ("due_date", "description"):
+        if _first_column(df, REMINDER_COLUMNS[field]) is None:
+            raise ValueError(f"Reminder sheet needs a {field.replace('_', ' ')} column (one of: {', '.join(REMINDER_COLUMNS[field])}).")
+    values = pd.DataFrame({field: _text(df, _first_column(df, aliases)) for field, aliases in REMINDER_COLUMNS.items()})
+
+    by_email, by_name = _client_ids(new_clients)
+    emails = values["client_email"].mask(values["client_email"] == "")
+    names = values["client_name"].mask(values["client_name"] == "")
+    client_id = (emails.map(by_email)
+                 .fillna(names.map(by_email))  # A "Client" column holding emails
+                 .fillna(names.str.casefold().map(by_name)))
+    has_client = emails.notna() | names.notna()
+
+    due_dates = financials.parse_dates(values["due_date"].replace("", None))
+    times = values["reminder_time"].str.extract(TIME_REGEX)
+    frequencies = values["frequency"].str.lower().map({f.lower(): f for f in FREQUENCIES}).where(values["frequency"] != "", "Once")
+    completed = values["is_completed"].str.lower().map(COMPLETED_VALUES)
+
+    failed, errors = _report(values, [
+        ("Client not found (or name shared by several clients)", has_client & client_id.isna()),
+        ("Due date is missing or not a date", due_dates.isna()),
+        ("Time must be HH:MM", (values["reminder_time"] != "") & times[0].isna()),
+        (f"Frequency must be one of {', '.join(FREQUENCIES)}", frequencies.isna()),
+        ("Description is required", values["description"] == ""),
+        ("Completed must be yes or no", completed.isna()),
+    ])
+    valid = ~failed
+    rows = pd.DataFrame({
+        "client_id": _nullable(client_id[valid].astype("Int64")),
+        "due_date": due_dates[valid].dt.strftime("%Y-%m-%d"),
+        "reminder_time": _nullable((times[0].str.zfill(2) + ":" + times[1])[valid]),
+        "frequency": frequencies[valid],
+        "description": values["description"][valid],
+    })
+    # Only a sheet that has these columns overwrites the stored status
+    if _first_column(df, REMINDER_COLUMNS["is_completed"]) is not None:
+        rows["is_completed"] = completed[valid].astype(bool).astype(object)
+    if _first_column(df, REMINDER_COLUMNS["last_sent_at"]) is not None:
+        rows["last_sent_at"] = _nullable(values["last_sent_at"][valid].mask(values["last_sent_at"][valid] == ""))
+    return rows.to_dict("records"), errors
+
+
+def _write(rows, errors, upsert, dry_run):
+    inserted, updated = upsert(rows) if rows and not dry_run else (0, 0)
+    return ImportResult(len(rows), inserted, updated, errors)
+
+
+def import_clients(file, file_name=None, dry_run=False):
+    """Validates a client sheet and, unless dry_run, writes its valid rows in one transaction."""
+    rows, errors = validate_clients(read_table(file, file_name))
+    return _write(rows, errors, database.bulk_upsert_clients, dry_run)
+
+
+def import_reminders(file, file_name=None, dry_run=False, new_clients=()):
+    """
+    Validates a reminder sheet and, unless dry_run, writes its valid rows in one transaction.
+    `new_clients` are client dicts a dry run would have written first (see _client_ids).
+    """
+    rows, errors = validate_reminders(read_table(file, file_name), new_clients)
+    return _write(rows, errors, database.bulk_upsert_reminders, dry_run)
+
+
+IMPORTERS = {"clients": import_clients, "reminders": import_reminders}
+
+
+def _client_rows():
+    for client in repository.iter_clients():
+        yield client.name, client.email, client.phone, client.created_at
+
+
+def _reminder_rows():
+    for reminder in repository.iter_reminder_details():
+        yield (reminder.client_name, reminder.client_email, reminder.due_date, reminder.reminder_time, reminder.frequency,
+               reminder.description, bool(reminder.is_completed), reminder.last_sent_at)
+
+
+EXPORTS = {"clients": (CLIENT_EXPORT_HEADER, _client_rows), "reminders": (REMINDER_EXPORT_HEADER, _reminder_rows)}
+
+
+def _write_csv(stream, table):
+    header, rows = EXPORTS[table]
+    writer = csv.writer(stream)
+    writer.writerow(header)
+    count = 0
+    for row in rows():
+        writer.writerow(row)
+        count += 1
+    return count
+
+
+def export_csv(table, destination):
+    """Streams the clients or reminders table to CSV. `destination` is a path or a writable binary file object. Returns the row count."""
+    if isinstance(destination, str):
+        with open(destination, "w", newline="", encoding="utf-8") as f:
+            return _write_csv(f, table)
+    stream = io.TextIOWrapper(destination, encoding="utf-8", newline="")
+    try:
+        return _write_csv(stream, table)
+    finally:
+        stream.flush()
+        stream.detach()  # Leave the caller's file open
+
+
+def export_backup(destination):
+    """
+    Writes clients.csv and reminders.csv into one .zip, each streamed straight into its entry.
+    `destination` is a path or a writable binary file object. Returns {table: row count}.
+    """
+    with zipfile.ZipFile(destination, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        counts = {}
+        for table, name in BACKUP_FILES.items():
+            with archive.open(name, "w") as entry:
+                counts[table] = export_csv(table, entry)
+    return counts
+
+
+def restore_backup(source, dry_run=False):
+    """
+    Imports a backup from export_backup(), clients first. A dry run checks the reminders against
+    the backup's clients too, since none were written. Returns {table: ImportResult}.
+    """
+    with zipfile.ZipFile(source) as archive:
+        sheets = {table: (io.BytesIO(archive.read(name)), name) for table, name in BACKUP_FILES.items()}
+    client_rows, errors = validate_clients(read_table(*sheets["clients"]))
+    return {
+        "clients": _write(client_rows, errors, database.bulk_upsert_clients, dry_run),
+        "reminders": import_reminders(*sheets["reminders"], dry_run=dry_run, new_clients=client_rows if dry_run else ()),
+    }
+
+
+def _print_result(table, result):
+    for row, error in result.errors.itertuples(index=False):
+        print(f"Row {row}: {error}")
+    print(f"{table}: {result.valid} valid, {len(result.errors)} rejected, {result.inserted} added, {result.updated} updated.")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import and export of clients and reminders.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    import_parser = commands.add_parser("import", help="Import a CSV/Excel sheet")
+    import_parser.add_argument("table", choices=list(IMPORTERS))
+    import_parser.add_argument("path")
+    import_parser.add_argument("--dry-run", action="store_true", help="Validate only; write nothing")
+    export_parser = commands.add_parser("export", help="Export a table to .csv, or both tables to a .zip backup")
+    export_parser.add_argument("path")
+    export_parser.add_argument("--table", choices=list(EXPORTS), help="Table for a .csv export")
+    restore_parser = commands.add_parser("restore", help="Import a .zip backup")
+    restore_parser.add_argument("path")
+    restore_parser.add_argument("--dry-run", action="store_true", help="Validate only; write nothing")
+    args = parser.parse_args(argv)
+
+    database.create_database()
+    if args.command == "export":
+        if args.path.lower().endswith(".zip"):
+            counts = export_backup(args.path)
+        elif args.table:
+            counts = {args.table: export_csv(args.table, args.path)}
+        else:
+            parser.error("a .csv export needs --table")
+        print(", ".join(f"{count} {table}" for table, count in counts.items()) + f" written to {args.path}.")
+        return 0
+
+    if args.command == "import":
+        results = {args.table: IMPORTERS[args.table](args.path, dry_run=args.dry_run)}
+    else:
+        results = restore_backup(args.path, dry_run=args.dry_run)
+    for table, result in results.items():
+        _print_result(table, result)
+    return 1 if any(len(result.errors) for result in results.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,129 @@
+"""
+Conversation memory for the chat tab.
+
+Sessions and messages are stored in SQLite (chat_sessions, chat_messages), so a conversation
+survives reruns and restarts and can be reopened later. Each prompt gets a bounded history
+window instead of the whole transcript:
+
+  summary   a running summary of the older turns, at most SUMMARY_TOKENS
+  recent    the newest RECENT_TURNS question/answer pairs verbatim, as far as TOKEN_BUDGET
+            (minus the summary) allows
+  pending   turns that have left the window but aren't summarized yet, clipped to a line each
+
+compact() folds pending turns into the summary with the LLM once COMPACT_BATCH of them have
+built up, so most exchanges cost a single generation. Token counts are estimated at four
+characters per token, the same estimate tools/metrics.py uses.
+
+The UI renders history a page at a time with history_page(); only the rows shown are read.
+"""
+import subprocess
+
+import database
+from tools import llm_scheduler
+
+RECENT_TURNS = 4         # Question/answer pairs kept verbatim
+TOKEN_BUDGET = 1500      # Summary + recent + pending turns in the prompt
+SUMMARY_TOKENS = 300
+PENDING_TOKENS = 40      # Per pending message, until it is summarized
+COMPACT_BATCH = 4        # Messages outside the window before they are summarized
+PAGE_SIZE = 20           # Messages per rendered history page
+TITLE_CHARS = 60
+GREETING = "How can I assist you with financial matters today?"
+
+
+def estimate_tokens(text):
+    return len(text) // 4 + 1
+
+
+def _clip(text, tokens):
+    limit = tokens * 4
+    return text if len(text) <= limit else text[:limit].rstrip() + "..."
+
+
+def new_session():
+    return database.create_chat_session()
+
+
+def add_message(session_id, role, content):
+    title = _clip(content.strip(), TITLE_CHARS // 4) if role == "user" else None
+    return database.add_chat_message(session_id, role, content, title=title)
+
+
+def history_page(session_id, pages=1):
+    """Returns (newest pages * PAGE_SIZE messages as (id, role, content), whether older ones exist)."""
+    limit = pages * PAGE_SIZE
+    messages = database.get_chat_messages(session_id, limit=limit + 1)
+    return messages[-limit:], len(messages) > limit
+
+
+def window(session_id):
+    """Splits the session into (summary, pending messages, recent messages) for the next prompt."""
+    session = database.get_chat_session(session_id)
+    if session is None:
+        return "", [], []
+    summary, summarized_through = session[2] or "", session[3] or 0
+    unsummarized = database.get_chat_messages(session_id, after_id=summarized_through)
+    budget = TOKEN_BUDGET - estimate_tokens(summary)
+    recent = []
+    for message in reversed(unsummarized):
+        cost = estimate_tokens(message[2])
+        if len(recent) >= RECENT_TURNS * 2 or cost > budget:
+            break
+        recent.append(message)
+        budget -= cost
+    recent.reverse()
+    return summary, unsummarized[:len(unsummarized) - len(recent)], recent
+
+
+def _transcript(messages, tokens=None):
+    return "\n".join(f"{role.capitalize()}: {_clip(content, tokens) if tokens else content}" for _, role, content in messages)
+
+
+def context(session_id):
+    """The conversation so far as a prompt block ("" for a new conversation)."""
+    if session_id is None:
+        return ""
+    summary, pending, recent = window(session_id)
+    parts = []
+    if summary:
+        parts.append(f"Summary of the earlier conversation:\n{summary}")
+    if pending:
+        parts.append(_transcript(pending, PENDING_TOKENS))
+    if recent:
+        parts.append(_transcript(recent))
+    return "\n\n".join(parts)
+
+
+def summarize(summary, messages):
+    """Returns `summary` updated with `messages`, within SUMMARY_TOKENS."""
+    words = SUMMARY_TOKENS * 3 // 4
+    prompt = f"""Update the running summary of a conversation between an accounting firm's staff member and a financial assistant.
+Keep client names, amounts, dates, sections, decisions and open questions; drop pleasantries. Use at most {words} words.
+
+Current summary:
+{summary or "(none)"}
+
+New turns:
+{_transcript(messages)}
+
+Updated summary:"""
+    try:
+        updated = llm_scheduler.run("summarize", prompt).stdout.strip()
+    except (subprocess.CalledProcessError, OSError) as e:
+        print(f"Error running Ollama: {e}")
+        updated = ""
+    if updated:
+        return _clip(updated, SUMMARY_TOKENS)
+    # Without the model, keep the clipped turns themselves, dropping the oldest text first
+    fallback = "\n".join(part for part in (summary, _transcript(messages, PENDING_TOKENS)) if part)
+    limit = SUMMARY_TOKENS * 4
+    return fallback if len(fallback) <= limit else "..." + fallback[-limit:]
+
+
+def compact(session_id, force=False):
+    """Folds pending turns into the running summary once COMPACT_BATCH have built up. Returns True if it did."""
+    summary, pending, _ = window(session_id)
+    if not pending or (len(pending) < COMPACT_BATCH and not force):
+        return False
+    database.update_chat_summary(session_id, summarize(summary, pending), pending[-1][0])
+    return True
@@ -0,0 +1,114 @@
+"""
+Chart-ready frames for the Balance Sheet dashboard.
+
+Streamlit serialises every row handed to st.line_chart / st.bar_chart and ships it to the
+browser, so raw ledger rows are never charted directly. Series are first aggregated to the
+finest display resolution (day, week, month or FY quarter) with at most LTTB_FACTOR times the
+chart's point budget, then reduced to the budget with Largest-Triangle-Three-Buckets (LTTB),
+which keeps the peaks and troughs that coarser buckets would average away. So a few years of
+daily entries stay daily, with their spikes, rather than becoming weekly or monthly sums.
+"""
+import numpy as np
+import pandas as pd
+
+from tools import financials
+
+MAX_POINTS = 500
+LTTB_FACTOR = 20  # Buckets beyond MAX_POINTS that LTTB may reduce (daily up to ~27 years)
+# Candidate display resolutions as pandas period frequencies, finest first (Q-MAR = Apr-Mar FY quarters)
+RESOLUTIONS = [('D', 'Daily'), ('W', 'Weekly'), ('M', 'Monthly'), ('Q-MAR', 'Quarterly')]
+
+
+def lttb(x, y, threshold):
+    """
+    Largest-Triangle-Three-Buckets downsampling. x and y are 1-D numeric arrays of equal
+    length with x sorted; returns the indices of the points to keep (first and last always kept).
+    """
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    # Bucket edges over the interior points; bucket i spans [edges[i], edges[i + 1])
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    keep = np.empty(threshold, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    previous = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], max(edges[i + 1], edges[i] + 1)
+        # Average of the next bucket (the last point for the final bucket)
+        if i + 2 < len(edges):
+            next_start, next_end = edges[i + 1], max(edges[i + 2], edges[i + 1] + 1)
+            avg_x, avg_y = x[next_start:next_end].mean(), y[next_start:next_end].mean()
+        else:
+            avg_x, avg_y = x[-1], y[-1]
+        bucket_x, bucket_y = x[start:end], y[start:end]
+        areas = np.abs((x[previous] - avg_x) * (bucket_y - y[previous]) - (x[previous] - bucket_x) * (avg_y - y[previous]))
+        previous = start + int(areas.argmax())
+        keep[i + 1] = previous
+    return keep
+
+
+def downsample(frame, max_points=MAX_POINTS):
+    """
+    LTTB-reduces a DatetimeIndex frame to at most max_points rows. Points are picked per
+    column and the union kept, so every series retains its own extremes.
+    """
+    if len(frame) <= max_points:
+        return frame
+    x = frame.index.asi8 if isinstance(frame.index, pd.DatetimeIndex) else np.arange(len(frame))
+    per_column = max(3, max_points // max(len(frame.columns), 1))
+    keep = np.unique(np.concatenate([lttb(x, frame[column].to_numpy(), per_column) for column in frame.columns]))
+    return frame.iloc[keep]
+
+
+def display_resolution(start, end, max_points=MAX_POINTS):
+    """Finest (frequency, label) whose bucket count for [start, end] LTTB can bring down to max_points."""
+    for freq, label in RESOLUTIONS:
+        if len(pd.period_range(start, end, freq=freq)) <= max_points * LTTB_FACTOR:
+            return freq, label
+    return RESOLUTIONS[-1]
+
+
+def cash_flow_series(df, max_points=MAX_POINTS):
+    """
+    Income, expenses and net per display bucket, downsampled to at most max_points rows.
+    Returns (frame indexed by bucket start, resolution label), or (None, None) without dates.
+    """
+    if 'Date' not in df.columns or financials.missing_columns(df):
+        return None, None
+    dates = financials.parse_dates(df['Date'])
+    valid = dates.notna()
+    if not valid.any():
+        return None, None
+    amounts = financials.paise_values(df, 'Amount')[valid]
+    types = df['Transaction Type'][valid]
+    values = pd.DataFrame({
+        'Income': amounts.where(types.isin(financials.INCOME_TYPES), 0),
+        'Expenses': amounts.where(types == 'Expense', 0),
+    })
+    freq, label = display_resolution(dates[valid].min(), dates[valid].max(), max_points)
+    series = values.groupby(dates[valid].dt.to_period(freq).dt.start_time).sum().sort_index() / 100
+    series['Net'] = series['Income'] - series['Expenses']
+    series.index.name = 'Period'
+    return downsample(series, max_points), label
+
+
+def chart_frames(df, max_points=MAX_POINTS):
+    """
+    Every frame the dashboard draws, already aggregated: the P&L bars, totals by
+    transaction type, and the cash-flow time series with its resolution label.
+    Each frame is at most a few hundred rows regardless of ledger size.
+    """
+    income, expenses, profit, _ = financials.analyze_financials(df)
+    frames = {
+        'pnl': pd.DataFrame({'Amount': [income, expenses, profit]}, index=pd.Index(['Income', 'Expenses', 'Profit'], name='Metric')),
+        'by_type': None,
+        'cash_flow': None,
+        'resolution': None,
+    }
+    if not financials.missing_columns(df):
+        amounts = financials.paise_values(df, 'Amount')
+        frames['by_type'] = (amounts.groupby(df['Transaction Type'], observed=True).sum() / 100).rename('Amount').to_frame()
+    frames['cash_flow'], frames['resolution'] = cash_flow_series(df, max_points)
+    return frames
@@ -0,0 +1,235 @@
+"""
+Due-date extraction for notices and invoices.
+
+All keywords and date formats are combined into one precompiled pattern, so a document is
+scanned in a single linear pass. Dates are parsed into `datetime.date` objects (Indian
+day-first order) and scored by how close they follow a deadline keyword. The scanner can be
+fed page by page, so large OCR output never has to be joined or lower-cased in memory.
+"""
+import re
+from bisect import bisect_right
+from collections import namedtuple
+from datetime import date
+
+# Keyword -> weight. Negative weights mark dates that are explicitly *not* deadlines.
+KEYWORD_WEIGHTS = {
+    "due date": 1.0,
+    "date due": 1.0,
+    "deadline": 1.0,
+    "last date to pay": 1.0,
+    "last date": 0.9,
+    "on or before": 0.9,
+    "not later than": 0.9,
+    "payment by": 0.9,
+    "payment date": 0.8,
+    "reply by": 0.8,
+    "respond by": 0.8,
+    "compliance date": 0.8,
+    "date of hearing": 0.7,
+    "expiry date": 0.6,
+    "dated": -0.5,
+    "date of issue": -0.5,
+    "issue date": -0.5,
+}
+# Dates further than this many characters after a keyword are not attributed to it
+KEYWORD_WINDOW = 150
+
+MONTHS = {
+    "jan": 1, "feb": 2, "mar": 3, "apr": 4, "may": 5, "jun": 6,
+    "jul": 7, "aug": 8, "sep": 9, "oct": 10, "nov": 11, "dec": 12,
+}
+_MONTH_NAME = r"(?:jan(?:uary)?|feb(?:ruary)?|ma(?:r(?:ch)?|y)|a(?:pr(?:il)?|ug(?:ust)?)|ju(?:ne?|ly?)|sep(?:t(?:ember)?)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)"
+
+
+def _trie_pattern(phrases):
+    """
+    Builds a regex alternation factored on common prefixes ("d(?:eadline|ue\\s+date)").
+    Python's re tries alternatives one by one, so sharing prefixes keeps the scan fast.
+    """
+    trie = {}
+    for phrase in phrases:
+        node = trie
+        for ch in phrase:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node):
+        optional = "" in node
+        branches = [
+            (r"\s+" if ch == " " else re.escape(ch)) + build(child)
+            for ch, child in sorted(node.items()) if ch
+        ]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if optional:
+            body = "(?:" + body + ")?"
+        return body
+
+    return build(trie)
+
+
+_KEYWORDS = _trie_pattern(KEYWORD_WEIGHTS)
+# Every match starts at a word boundary with a digit or the first letter of a keyword / month
+# name. Checking that first lets the engine skip most positions cheaply. Input is lower-cased
+# per chunk by the scanner, which is much faster than matching with re.IGNORECASE.
+_FIRST_CHARS = "".join(sorted({k[0] for k in KEYWORD_WEIGHTS} | {m[0] for m in MONTHS}))
+
+SCANNER_PATTERN = re.compile(
+    rf"""
+    \b(?=[\d{_FIRST_CHARS}])
+    (?:
+    (?P<kw>\b{_KEYWORDS}\b)
+    # 15/07/2025, 15-07-25, 15.07.2025 (day first)
+    | (?<![\d/.-])(?P<d1>\d{{1,2}})(?P<sep1>[/.-])(?P<m1>\d{{1,2}})(?P=sep1)(?P<y1>\d{{4}}|\d{{2}})(?![\d/.-]?\d)
+    # 2025-07-15
+    | (?<![\d/.-])(?P<y2>\d{{4}})(?P<sep2>[/.-])(?P<m2>\d{{1,2}})(?P=sep2)(?P<d2>\d{{1,2}})(?!\d)
+    # 15th July 2025, 15 Jul, 2025, 15-Jul-2025
+    | (?<!\d)(?P<d3>\d{{1,2}})(?:st|nd|rd|th)?[\s.-]*(?:of\s+)?(?P<mon3>{_MONTH_NAME})\.?[\s.,-]*(?P<y3>\d{{4}})(?!\d)
+    # July 15, 2025
+    | \b(?P<mon4>{_MONTH_NAME})\.?\s+(?P<d4>\d{{1,2}})(?:st|nd|rd|th)?,?\s+(?P<y4>\d{{4}})(?!\d)
+    )
+    """,
+    re.VERBOSE,
+)
+
+# Longest text a single match can span; the streaming scanner holds this much back per chunk
+_MAX_MATCH_LEN = 64
+# Characters kept before the scan position so lookbehinds still see the previous chunk
+_CONTEXT_LEN = 8
+
+# `text` is the matched date as it appeared, lower-cased
+DateCandidate = namedtuple("DateCandidate", ["date", "text", "start", "keyword", "score"])
+
+
+def _to_year(raw):
+    year = int(raw)
+    return year + 2000 if len(raw) == 2 else year
+
+
+def parse_date_match(match):
+    """Converts a date match from SCANNER_PATTERN into a `date`, or None if it is not a valid date."""
+    groups = match.groupdict()
+    try:
+        if groups["d1"]:
+            day, month, year = int(groups["d1"]), int(groups["m1"]), _to_year(groups["y1"])
+            if month > 12 and day <= 12:
+                day, month = month, day  # Clearly month-first (US style)
+        elif groups["y2"]:
+            day, month, year = int(groups["d2"]), int(groups["m2"]), int(groups["y2"])
+        elif groups["d3"]:
+            day, month, year = int(groups["d3"]), MONTHS[groups["mon3"][:3]], int(groups["y3"])
+        else:
+            day, month, year = int(groups["d4"]), MONTHS[groups["mon4"][:3]], int(groups["y4"])
+        return date(year, month, day)
+    except ValueError:
+        return None
+
+
+class DueDateScanner:
+    """
+    Incremental scanner. Call feed() with successive chunks of text (e.g. OCR pages),
+    then candidates() or best(). Matches spanning chunk boundaries are handled.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._buffer_offset = 0   # Absolute position of self._buffer[0] in the full document
+        self._scan_from = 0       # Index in self._buffer where the next scan starts
+        self._keyword_positions = []  # Absolute end offsets, ascending
+        self._keyword_names = []
+        self._dates = []          # (absolute start, date, text)
+
+    def feed(self, text):
+        lowered = text.lower()
+        if len(lowered) != len(text):
+            # A few non-ASCII characters expand when lower-cased; keep them as-is so offsets stay aligned
+            lowered = "".join(c.lower() if len(c.lower()) == 1 else c for c in text)
+        self._buffer += lowered
+        self._scan(final=False)
+        return self
+
+    def close(self):
+        self._scan(final=True)
+        return self
+
+    def _scan(self, final):
+        buffer = self._buffer
+        limit = len(buffer) if final else max(len(buffer) - _MAX_MATCH_LEN, self._scan_from)
+        cut = limit
+        for match in SCANNER_PATTERN.finditer(buffer, self._scan_from):
+            if match.end() > limit:
+                # Might still grow with the next chunk; rescan it then
+                cut = match.start()
+                break
+            start = self._buffer_offset + match.start()
+            if match.group("kw"):
+                self._keyword_positions.append(self._buffer_offset + match.end())
+                self._keyword_names.append(" ".join(match.group("kw").split()))
+            else:
+                parsed = parse_date_match(match)
+                if parsed:
+                    self._dates.append((start, parsed, match.group(0)))
+        # Drop consumed text but keep a little context for lookbehinds
+        keep_from = max(cut - _CONTEXT_LEN, 0)
+        self._buffer = buffer[keep_from:]
+        self._buffer_offset += keep_from
+        self._scan_from = cut - keep_from
+
+    def candidates(self):
+        """Returns every date found so far as DateCandidate tuples, in document order."""
+        results = []
+        for start, parsed, text in self._dates:
+            keyword, score = None, 0.0
+            # Nearest keyword ending before this date
+            index = bisect_right(self._keyword_positions, start) - 1
+            if index >= 0:
+                distance = start - self._keyword_positions[index]
+                if distance <= KEYWORD_WINDOW:
+                    keyword = self._keyword_names[index]
+                    score = KEYWORD_WEIGHTS[keyword] * (1 - distance / KEYWORD_WINDOW)
+            results.append(DateCandidate(parsed, text, start, keyword, round(score, 4)))
+        return results
+
+    def best(self):
+        """Returns the highest-scoring deadline candidate (earliest on ties), or None."""
+        best = None
+        for candidate in self.candidates():
+            if candidate.score > 0 and (best is None or candidate.score > best.score):
+                best = candidate
+        return best
+
+
+def scan_dates(text):
+    """Returns all date candidates in `text` in a single pass."""
+    return DueDateScanner().feed(text).close().candidates()
+
+
+def _scan_pages(pages):
+    scanner = DueDateScanner()
+    for index, page in enumerate(pages):
+        # Same offsets as "\n".join(pages); keeps a token at the end of one page from running into the next
+        scanner.feed(page if index == 0 else "\n" + page)
+    return scanner.close()
+
+
+def scan_pages(pages):
+    """Like scan_dates, but consumes an iterable of page texts without joining them."""
+    return _scan_pages(pages).candidates()
+
+
+def extract_due_date_pages(pages):
+    """Like extract_due_date, but consumes an iterable of page texts without joining them."""
+    candidate = _scan_pages(pages).best()
+    return candidate.date if candidate else None
+
+
+def extract_due_date(text):
+    """
+    Extracts the most likely due date from the text.
+    Returns a `datetime.date`, or None if no date follows a deadline keyword.
+    """
+    if not text:
+        return None
+    candidate = DueDateScanner().feed(text).close().best()
+    return candidate.date if candidate else None
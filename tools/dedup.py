@@ -0,0 +1,179 @@
+"""
+Upload-time duplicate detection.
+
+Every processed upload is fingerprinted twice:
+
+  sha256       of the raw bytes - catches the same file re-sent under another name
+  page hashes  a 256-bit DCT perceptual hash per rendered page - finds re-scans, re-saves and
+               forwarded copies of the same notice, whose bytes differ. A thumbnail hash
+               can't tell apart different notices printed on the same department template
+               (a changed PAN, AY, amount or due date moves it by a couple of bits, less than
+               a noisy re-scan does), so a page match is only a candidate.
+
+A new upload is checked before any OCR or LLM work. An exact duplicate reuses the stored text
+and response of the document it duplicates (see document_texts). A near duplicate (same page
+count, every page within PAGE_DISTANCE bits) is reused only once confirm_near() finds the same
+first-page text or DIN in both PDFs; scans without a text layer are left to the user to confirm.
+"""
+import hashlib
+
+import cv2
+import numpy as np
+
+try:
+    import pypdfium2 as pdfium
+except ImportError:  # pragma: no cover - optional dependency
+    pdfium = None
+
+import database
+from tools import document_search
+
+HASH_SIZE = 16         # 16x16 low-frequency DCT coefficients -> 256-bit hash
+HASH_BITS = HASH_SIZE * HASH_SIZE
+RENDER_SIZE = 64       # Pages are reduced to 64x64 greyscale before the DCT
+RENDER_SCALE = 0.5     # 36 dpi is plenty for a 64x64 thumbnail
+MAX_PAGES = 50
+PAGE_DISTANCE = 24     # Max differing bits per page; re-scans measure 4-12, but same-template notices can be closer
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.tif', '.tiff', '.bmp')
+
+
+def sha256_bytes(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def perceptual_hash(gray):
+    """256-bit pHash of a greyscale image: signs of the low DCT frequencies vs their median."""
+    small = cv2.resize(gray, (RENDER_SIZE, RENDER_SIZE), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:HASH_SIZE, :HASH_SIZE].ravel()
+    # The DC term only reflects overall brightness, so it is left out of the median
+    bits = low > np.median(low[1:])
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+def _pdf_pages(source, max_pages):
+    pdf = pdfium.PdfDocument(source)
+    try:
+        for index in range(min(len(pdf), max_pages)):
+            page = pdf[index]
+            bitmap = page.render(scale=RENDER_SCALE, grayscale=True)
+            yield np.asarray(bitmap.to_pil().convert('L'))
+            page.close()
+    finally:
+        pdf.close()
+
+
+def page_hashes(source, file_name, max_pages=MAX_PAGES):
+    """
+    Perceptual hashes of a document's pages (PDF via pypdfium2, or a single image), from its
+    bytes or a file path. Returns [] when the pages can't be rendered, so only the exact hash is used.
+    """
+    name = file_name.lower()
+    if name.endswith('.pdf'):
+        if pdfium is None:
+            return []
+        try:
+            return [perceptual_hash(page) for page in _pdf_pages(source, max_pages)]
+        except Exception:
+            return []
+    if name.endswith(IMAGE_EXTENSIONS):
+        if isinstance(source, str):
+            image = cv2.imread(source, cv2.IMREAD_GRAYSCALE)
+        else:
+            image = cv2.imdecode(np.frombuffer(source, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+        return [perceptual_hash(image)] if image is not None else []
+    return []
+
+
+def fingerprint(data, file_name):
+    """Returns {'sha256': ..., 'page_hashes': [...]} for an upload's bytes."""
+    return {'sha256': sha256_bytes(data), 'page_hashes': page_hashes(data, file_name)}
+
+
+def fingerprint_file(path, file_name, sha256):
+    """Fingerprint of a stored file whose SHA-256 is already known (e.g. from blob_store.put_stream)."""
+    return {'sha256': sha256, 'page_hashes': page_hashes(path, file_name)}
+
+
+def _screen_bits(value):
+    """
+    Leading 64 bits of a page hash as a signed SQLite integer. Their distance can only be
+    smaller than the full hash's, so screening on them never drops a true match.
+    """
+    top = value >> (HASH_BITS - 64)
+    return top - (1 << 64) if top >= 1 << 63 else top
+
+
+def _hamming(a, b):
+    return bin(a ^ b).count('1')
+
+
+def find_duplicate(fp):
+    """
+    Looks for an already processed document with the same bytes or the same pages.
+    Returns None or a dict with kind ('exact' / 'near'), distance (max differing bits per
+    page) and the stored fingerprint row (id, text_id, document_id, filepath).
+    """
+    exact = database.get_fingerprint_by_sha256(fp['sha256'])
+    if exact:
+        return {'kind': 'exact', 'distance': 0, 'id': exact[0], 'text_id': exact[1], 'document_id': exact[2], 'filepath': exact[3]}
+    hashes = fp['page_hashes']
+    if not hashes:
+        return None
+    candidates = database.get_page_fingerprints(len(hashes))
+    if not candidates:
+        return None
+    # Screen every candidate on the first page at once, then compare the full hashes
+    first_pages = np.array([row[1] for row in candidates], dtype=np.int64)
+    query = np.int64(_screen_bits(hashes[0]))
+    differing = np.unpackbits((first_pages ^ query).view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+    best = None
+    for position in np.flatnonzero(differing <= PAGE_DISTANCE):
+        row = candidates[position]
+        stored = [int(h, 16) for h in row[2].split(',')]
+        distance = max(_hamming(a, b) for a, b in zip(hashes, stored))
+        if distance <= PAGE_DISTANCE and (best is None or distance < best['distance']):
+            best = {'kind': 'near', 'distance': distance, 'id': row[0], 'text_id': row[3], 'document_id': row[4], 'filepath': row[5]}
+    return best
+
+
+def _first_page_text(path):
+    """Whitespace-normalised text layer of a PDF's first page ('' for scans, other files or without pypdfium2)."""
+    if pdfium is None or not path.lower().endswith('.pdf'):
+        return ''
+    try:
+        pdf = pdfium.PdfDocument(path)
+        try:
+            page = pdf[0]
+            textpage = page.get_textpage()
+            text = textpage.get_text_range()
+            textpage.close()
+            page.close()
+        finally:
+            pdf.close()
+    except Exception:
+        return ''
+    return ' '.join(text.split())
+
+
+def confirm_near(duplicate, path):
+    """
+    Checks a near duplicate from find_duplicate() against the stored document it matched, using
+    the first pages' text layers: True for the same text or the same DIN, False when the text
+    differs, None when either file has no text layer (scans), so the user has to decide.
+    """
+    text, stored_text = _first_page_text(path), _first_page_text(duplicate['filepath'] or '')
+    if not text or not stored_text:
+        return None
+    if text == stored_text:
+        return True
+    din = document_search.extract_identifiers(text)['din']
+    return din is not None and din == document_search.extract_identifiers(stored_text)['din']
+
+
+def register(fp, filepath, text_id=None, document_id=None):
+    """Stores a processed document's fingerprint so later uploads can be matched against it."""
+    hashes = fp['page_hashes']
+    return database.add_fingerprint(
+        fp['sha256'], len(hashes), _screen_bits(hashes[0]) if hashes else None,
+        ','.join(f'{h:0{HASH_BITS // 4}x}' for h in hashes), filepath, text_id, document_id,
+    )
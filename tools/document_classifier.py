@@ -0,0 +1,328 @@
+"""
+Cheap-first document classification and routing.
+
+Uploads are not all notices: clients also send invoices, PAN cards, GST registration
+certificates, bank statements and ITR acknowledgements. Each processed document is classified
+by a cascade that stops at the first confident stage:
+
+  1. rules  weighted keyword and layout patterns on the first page (microseconds)
+  2. model  multinomial naive Bayes over hashed word counts, trained on the documents the rules,
+            the LLM and users have already labelled (document_texts.document_type), on CPU
+  3. llm    a short constrained prompt to the local Ollama model, only for what stays ambiguous
+
+The type then picks the route (ROUTES): notices get a drafted reply, invoices the LLM metadata
+extractor, identity and registration documents a regex extractor, and everything else nothing.
+
+Usage:
+    python -m tools.document_classifier train
+    python -m tools.document_classifier classify notice.md [--no-llm]
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+import zlib
+
+import numpy as np
+
+import database
+from tools import llm_scheduler
+from tools.document_search import PAN_PATTERN
+
+INCOME_TAX_NOTICE = "Income Tax Notice"
+GST_NOTICE = "GST Notice"
+DOCUMENT_TYPES = (
+    INCOME_TAX_NOTICE, GST_NOTICE, "Invoice", "PAN Card", "GST Certificate",
+    "Bank Statement", "ITR Acknowledgement", "Other",
+)
+NOTICE_TYPES = (INCOME_TAX_NOTICE, GST_NOTICE)
+
+# What happens after classification: 'draft' a reply, run the LLM 'metadata' extractor,
+# pull 'identifiers' with regexes, or nothing (None)
+ROUTES = {
+    INCOME_TAX_NOTICE: "draft",
+    GST_NOTICE: "draft",
+    "Invoice": "metadata",
+    "PAN Card": "identifiers",
+    "GST Certificate": "identifiers",
+    "ITR Acknowledgement": "identifiers",
+    "Bank Statement": None,
+    "Other": None,
+}
+
+FIRST_PAGE_CHARS = 4000   # The OCR Markdown has no page breaks; this covers a dense first page
+RULE_MIN_SCORE = 5.0
+RULE_MARGIN = 3.0         # Over the runner-up, so a notice quoting an invoice isn't called an invoice
+TABLE_LINE_RATIO = 0.3    # Share of Markdown table lines above which a page counts as tabular
+SHORT_PAGE_CHARS = 800    # Identity cards OCR to a few lines
+
+MODEL_PATH = os.path.join("data", "document_classifier.npz")
+N_FEATURES = 2 ** 14      # Hashed vocabulary; crc32 keeps the hashing stable across processes
+MODEL_MIN_EXAMPLES = 30
+MODEL_MIN_PROBABILITY = 0.9
+RETRAIN_EVERY = 10        # New labelled documents before refresh_model retrains
+MAX_TRAINING_EXAMPLES = 5000
+TRAINING_SOURCES = ("rules", "llm", "user")  # The model never trains on its own guesses
+
+LLM_PROMPT_CHARS = 2000
+
+
+def _p(pattern):
+    return re.compile(pattern, re.I)
+
+
+RULES = {
+    INCOME_TAX_NOTICE: [
+        (_p(r"notice\s+under\s+section"), 3),
+        (_p(r"\bu/s\.?\s*(?:131|133|139|142|143|144|147|148|154|156|245|263|270|271|274)"), 3),
+        (_p(r"\bITBA/"), 3),
+        (_p(r"assessing\s+officer|\bNaFAC\b|faceless\s+assessment"), 2),
+        (_p(r"income[\s-]*tax\s+act"), 2),
+        (_p(r"show[\s-]*cause"), 1),
+        (_p(r"e-?proceedings?"), 2),
+        (_p(r"assessment\s+year"), 1),
+    ],
+    GST_NOTICE: [
+        (_p(r"\b(?:DRC|ASMT|ADT)\s*-?\s*\d{2}\b|\bREG\s*-?\s*(?:03|17|23)\b"), 4),
+        (_p(r"(?:CGST|SGST|IGST)\s+Act|central\s+goods\s+and\s+services\s+tax\s+act"), 2),
+        (_p(r"proper\s+officer"), 2),
+        (_p(r"section\s+(?:61|65|73|74|76|122|125)\b"), 2),
+        (_p(r"show[\s-]*cause"), 1),
+        (_p(r"intimation\s+of\s+(?:tax|discrepanc)"), 2),
+    ],
+    "Invoice": [
+        (_p(r"\btax\s+invoice\b|\binvoice\s+(?:no|number|date)\b"), 3),
+        (_p(r"\bHSN\b|\bSAC\b"), 2),
+        (_p(r"taxable\s+value"), 2),
+        (_p(r"bill\s+to|ship\s+to|place\s+of\s+supply"), 2),
+        (_p(r"\b(?:qty|quantity)\b"), 1),
+        (_p(r"grand\s+total|amount\s+in\s+words"), 1),
+    ],
+    "PAN Card": [
+        (_p(r"permanent\s+account\s+number"), 3),
+        (_p(r"father'?s\s+name"), 2),
+        (_p(r"govt\.?\s+of\s+india|government\s+of\s+india"), 1),
+        (_p(r"date\s+of\s+birth"), 1),
+        (_p(r"income\s+tax\s+department"), 1),
+    ],
+    "GST Certificate": [
+        (_p(r"\bREG\s*-?\s*06\b"), 4),
+        (_p(r"registration\s+certificate"), 3),
+        (_p(r"date\s+of\s+liability"), 2),
+        (_p(r"constitution\s+of\s+business|type\s+of\s+registration"), 2),
+        (_p(r"legal\s+name|trade\s+name"), 1),
+    ],
+    "Bank Statement": [
+        (_p(r"statement\s+of\s+account|account\s+statement"), 3),
+        (_p(r"opening\s+balance|closing\s+balance"), 3),
+        (_p(r"value\s+date|txn\s+date|transaction\s+date"), 2),
+        (_p(r"\bwithdrawals?\b"), 1),
+        (_p(r"\bIFSC\b"), 1),
+    ],
+    "ITR Acknowledgement": [
+        (_p(r"\bITR-?V\b|income\s+tax\s+return\s+acknowledgement"), 4),
+        (_p(r"acknowledgement\s+(?:number|no)"), 2),
+        (_p(r"\bITR-?[1-7]\b"), 2),
+        (_p(r"e-?filing|efiled|e-?verif"), 1),
+        (_p(r"total\s+income"), 1),
+    ],
+}
+
+TOKEN_PATTERN = re.compile(r"[a-z][a-z0-9]+")
+GSTIN_PATTERN = re.compile(r"\b(\d{2}[A-Z]{5}\d{4}[A-Z][1-9A-Z]Z[0-9A-Z])\b")
+ACKNOWLEDGEMENT_PATTERN = re.compile(r"acknowledgement\s+(?:number|no\.?)\s*[:\-]?\s*(\d{12,15})", re.I)
+ASSESSMENT_YEAR_PATTERN = re.compile(r"assessment\s+year\s*[:\-]?\s*(\d{4}\s*-\s*\d{2,4})", re.I)
+
+
+def first_page(text):
+    return (text or "")[:FIRST_PAGE_CHARS]
+
+
+# --- Stage 1: rules ---
+
+def rule_scores(text):
+    """Returns {document type: score} from the keyword and layout rules on the first page."""
+    page = first_page(text)
+    scores = {label: float(sum(weight for pattern, weight in rules if pattern.search(page))) for label, rules in RULES.items()}
+    lines = [line for line in page.splitlines() if line.strip()]
+    if lines and sum(line.lstrip().startswith("|") for line in lines) / len(lines) > TABLE_LINE_RATIO:
+        scores["Invoice"] += 1
+        scores["Bank Statement"] += 1
+    if len(page.strip()) < SHORT_PAGE_CHARS and PAN_PATTERN.search(page):
+        scores["PAN Card"] += 2
+    return scores
+
+
+def classify_by_rules(text):
+    """Returns (document type, score, margin over the runner-up) for the best rule match."""
+    ranked = sorted(rule_scores(text).items(), key=lambda item: item[1], reverse=True)
+    (label, score), (_, runner_up) = ranked[0], ranked[1]
+    return label, score, score - runner_up
+
+
+# --- Stage 2: naive Bayes ---
+
+def features(text):
+    """Sublinear hashed word counts of the first page."""
+    tokens = TOKEN_PATTERN.findall(first_page(text).lower())
+    buckets = np.fromiter((zlib.crc32(token.encode()) & (N_FEATURES - 1) for token in tokens), dtype=np.int64, count=len(tokens))
+    return np.log1p(np.bincount(buckets, minlength=N_FEATURES).astype(np.float32))
+
+
+def train_model(path=None, limit=MAX_TRAINING_EXAMPLES):
+    """
+    Fits the naive Bayes model on labelled document_texts rows and saves it.
+    Returns the number of examples used, or 0 when there are too few (or only one class).
+    """
+    path = path or database.tenant_path(MODEL_PATH)
+    rows = database.get_labelled_texts(TRAINING_SOURCES, limit)
+    labels = sorted({label for _, label in rows if label in DOCUMENT_TYPES})
+    if len(rows) < MODEL_MIN_EXAMPLES or len(labels) < 2:
+        return 0
+    class_index = {label: i for i, label in enumerate(labels)}
+    counts = np.zeros((len(labels), N_FEATURES), dtype=np.float64)
+    documents = np.zeros(len(labels), dtype=np.float64)
+    for text, label in rows:
+        if label in class_index:
+            counts[class_index[label]] += features(text)
+            documents[class_index[label]] += 1
+    # Laplace smoothing; priors are flattened a little so a dominant class doesn't swamp the rest
+    log_prob = np.log((counts + 1.0) / (counts.sum(axis=1, keepdims=True) + N_FEATURES))
+    log_prior = np.log(np.sqrt(documents) / np.sqrt(documents).sum())
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    np.savez_compressed(path, classes=np.array(labels), log_prob=log_prob.astype(np.float32), log_prior=log_prior, examples=int(documents.sum()))
+    _model_cache.clear()
+    return int(documents.sum())
+
+
+_model_cache = {}
+
+
+def load_model(path=None):
+    """Returns the saved model as a dict (cached until the file changes), or None."""
+    path = path or database.tenant_path(MODEL_PATH)
+    if not os.path.exists(path):
+        return None
+    mtime = os.path.getmtime(path)
+    cached = _model_cache.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    with np.load(path) as data:
+        model = {key: data[key] for key in data.files}
+    _model_cache[path] = (mtime, model)
+    return model
+
+
+def classify_by_model(text, path=None):
+    """Returns (document type, probability) from the naive Bayes model, or None if untrained."""
+    model = load_model(path)
+    if model is None:
+        return None
+    scores = model["log_prob"] @ features(text) + model["log_prior"]
+    probabilities = np.exp(scores - scores.max())
+    probabilities /= probabilities.sum()
+    best = int(probabilities.argmax())
+    return str(model["classes"][best]), float(probabilities[best])
+
+
+def refresh_model(path=None):
+    """Retrains once RETRAIN_EVERY new labelled documents have arrived. Returns examples used or 0."""
+    model = load_model(path)
+    trained_on = int(model["examples"]) if model is not None else 0
+    available = database.count_labelled_texts(TRAINING_SOURCES)
+    if available < MODEL_MIN_EXAMPLES or (model is not None and available - trained_on < RETRAIN_EVERY):
+        return 0
+    return train_model(path)
+
+
+# --- Stage 3: LLM ---
+
+def classify_by_llm(text):
+    """Asks the local Ollama model to pick one of DOCUMENT_TYPES. Returns the type or None."""
+    prompt = f"""Classify this document, extracted by OCR from an Indian taxpayer's upload, as exactly one of:
+{', '.join(DOCUMENT_TYPES)}.
+Answer with the category name only.
+---
+{first_page(text)[:LLM_PROMPT_CHARS]}
+---
+Category:"""
+    try:
+        result = llm_scheduler.run("classify", prompt)
+    except (subprocess.CalledProcessError, OSError) as e:
+        print(f"Error running Ollama: {e}")
+        return None
+    answer = result.stdout.lower()
+    found = [(answer.find(label.lower()), label) for label in DOCUMENT_TYPES if label.lower() in answer]
+    return min(found)[1] if found else None
+
+
+# --- Cascade ---
+
+def classify(text, use_llm=True, model_path=None):
+    """
+    Classifies OCR text, cheapest stage first. Returns a dict with document_type, method
+    ('rules', 'model', 'llm', or 'fallback' when no stage was confident) and confidence.
+    """
+    label, score, margin = classify_by_rules(text)
+    if score >= RULE_MIN_SCORE and margin >= RULE_MARGIN:
+        return {"document_type": label, "method": "rules", "confidence": min(1.0, margin / score)}
+
+    predicted = classify_by_model(text, model_path)
+    if predicted and predicted[1] >= MODEL_MIN_PROBABILITY:
+        return {"document_type": predicted[0], "method": "model", "confidence": predicted[1]}
+
+    if use_llm:
+        answer = classify_by_llm(text)
+        if answer:
+            return {"document_type": answer, "method": "llm", "confidence": None}
+
+    # Best unconfident guess: the model if it has one, else any rule evidence, else Other
+    if predicted:
+        return {"document_type": predicted[0], "method": "fallback", "confidence": predicted[1]}
+    return {"document_type": label if score > 0 else "Other", "method": "fallback", "confidence": None}
+
+
+def is_notice(document_type):
+    return document_type in NOTICE_TYPES
+
+
+def route(document_type):
+    """Returns 'draft', 'metadata', 'identifiers' or None for a document type."""
+    return ROUTES.get(document_type)
+
+
+def extract_identifiers(text):
+    """Regex extraction for identity, registration and return documents - no LLM call."""
+    text = text or ""
+    found = {
+        "pan": PAN_PATTERN.findall(text),
+        "gstin": GSTIN_PATTERN.findall(text),
+        "acknowledgement_number": ACKNOWLEDGEMENT_PATTERN.findall(text),
+        "assessment_year": [re.sub(r"\s+", "", year) for year in ASSESSMENT_YEAR_PATTERN.findall(text)],
+    }
+    return {key: ", ".join(dict.fromkeys(values)) or "Not Found" for key, values in found.items()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train or try the document classifier.")
+    parser.add_argument("command", choices=["train", "classify"])
+    parser.add_argument("path", nargs="?", help="OCR text / Markdown file to classify")
+    parser.add_argument("--no-llm", action="store_true", help="Stop after the rules and the model")
+    args = parser.parse_args(argv)
+
+    database.create_database()
+    if args.command == "train":
+        examples = train_model()
+        print(f"Trained on {examples} documents." if examples else f"Need at least {MODEL_MIN_EXAMPLES} labelled documents of two or more types.")
+        return 0
+    if not args.path:
+        parser.error("classify needs a path")
+    with open(args.path, encoding="utf-8") as f:
+        result = classify(f.read(), use_llm=not args.no_llm)
+    print(f"{result['document_type']} ({result['method']}) -> {route(result['document_type']) or 'no further processing'}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
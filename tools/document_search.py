@@ -0,0 +1,88 @@
+"""
+Full-text search over processed notices and drafted responses.
+
+OCR Markdown and response letters are stored in document_texts and indexed by SQLite FTS5
+(see database.create_search_index); triggers keep the index current, so indexing a document is
+a single upsert. The identifiers practitioners search by - DIN, PAN and the sections a notice
+cites - are pulled out at index time into their own columns, which are weighted above body
+text when ranking with bm25.
+"""
+import re
+
+import database
+
+# Income-tax DIN (ITBA/AST/S/143(2)/2024-25/1054321234(1)) and CBIC DIN (CBIC-DIN-2024 03 DSN0 ...)
+DIN_PATTERN = re.compile(
+    r'\b(ITBA/[A-Z]{2,5}/[A-Z]/[\w().]+/\d{4}-\d{2}/\d{10}\(\d+\))'
+    r'|\b(CBIC[- ]DIN[- ]?\d{8}[A-Z0-9]{8,12})\b'
+    r'|\bDIN\s*(?:No\.?|Number)?\s*[:\-]?\s*([A-Z0-9][A-Z0-9/().\-]{9,})',
+    re.I,
+)
+PAN_PATTERN = re.compile(r'\b([A-Z]{5}[0-9]{4}[A-Z])\b')
+SECTION_PATTERN = re.compile(
+    r'\b(?:u/s\.?|under\s+section|sections?|sec\.?)\s*'
+    r'(\d{1,3}[A-Z]{0,3}(?:\(\w{1,4}\))*(?:\s*(?:,|and|&|/|r\.?w\.?)\s*\d{1,3}[A-Z]{0,3}(?:\(\w{1,4}\))*)*)',
+    re.I,
+)
+_SECTION_ITEM = re.compile(r'\d{1,3}[A-Z]{0,3}(?:\(\w{1,4}\))*', re.I)
+
+
+def _unique(values):
+    return ' '.join(dict.fromkeys(values))
+
+
+def extract_identifiers(text):
+    """Returns {'din': ..., 'pan': ..., 'sections': ...}, each a space-separated string (or None)."""
+    text = text or ''
+    dins = [next(group for group in match.groups() if group).upper().rstrip('.') for match in DIN_PATTERN.finditer(text)]
+    pans = PAN_PATTERN.findall(text)
+    sections = [item.upper() for match in SECTION_PATTERN.finditer(text) for item in _SECTION_ITEM.findall(match.group(1))]
+    return {
+        'din': _unique(dins) or None,
+        'pan': _unique(pans) or None,
+        'sections': _unique(sections) or None,
+    }
+
+
+def index_document(filepath, filename, ocr_text, response_text=None, client_id=None, document_id=None, document_type=None, classified_by=None):
+    """Stores (or refreshes) a processed document's text and identifiers. Returns its text ID."""
+    identifiers = extract_identifiers(ocr_text)
+    return database.save_document_text(
+        filepath, filename, ocr_text, response_text, client_id=client_id, document_id=document_id,
+        document_type=document_type, classified_by=classified_by, **identifiers,
+    )
+
+
+def _phrase(value):
+    """Quotes a value as an FTS5 phrase, so punctuation in DINs and sections is not query syntax."""
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+def build_query(text=None, din=None, pan=None, section=None):
+    """
+    Builds an FTS5 MATCH expression. Free-text words must all appear (the last one as a
+    prefix, for search-as-you-type); din / pan / section are matched in their own columns.
+    """
+    clauses = []
+    words = re.findall(r'[\w()/.\-]+', text or '')
+    for i, word in enumerate(words):
+        phrase = _phrase(word)
+        clauses.append(phrase + ('*' if i == len(words) - 1 and word.isalnum() else ''))
+    for column, value in (('din', din), ('pan', pan), ('sections', section)):
+        if value:
+            clauses.append(f'{column} : {_phrase(value.upper())}')
+    return ' AND '.join(clauses)
+
+
+def search(text=None, din=None, pan=None, section=None, client_id=None, limit=20):
+    """
+    Searches every client's documents. Returns ranked dicts with id, client_id, client_name,
+    filename, filepath, snippet (matches in [brackets]) and score (lower is better).
+    """
+    expression = build_query(text, din, pan, section)
+    if not expression:
+        return []
+    like_terms = [term for term in re.findall(r'[\w()/.\-]+', text or '') + [din, pan, section] if term]
+    rows = database.search_documents(expression, client_id=client_id, limit=limit, like_terms=like_terms)
+    keys = ['id', 'client_id', 'client_name', 'filename', 'filepath', 'snippet', 'score']
+    return [dict(zip(keys, row)) for row in rows]
@@ -0,0 +1,282 @@
+"""
+Ledger parsing and financial calculations shared by the Streamlit app and batch jobs.
+
+These functions have no Streamlit dependency so they can run in worker processes.
+The app wraps them to surface warnings and errors in the UI.
+"""
+import os
+import numpy as np
+import pandas as pd
+
+REQUIRED_COLUMNS = ['Transaction Type', 'Amount']
+GST_COLUMNS = ['Transaction Type', 'Amount', 'GST Included']
+INCOME_TYPES = ['Income']
+OUTPUT_GST_TYPES = ['Income', 'GST Sale']
+INPUT_GST_TYPES = ['Expense', 'Asset']  # Assuming Assets also have input GST
+LEDGER_EXTENSIONS = ('.xlsx', '.xls', '.csv')
+
+# Money columns normalize_ledger() also stores as exact int64 paise; totals are summed from these
+PAISE_COLUMNS = {'Amount': 'Amount Paise', 'TDS Deducted': 'TDS Paise'}
+# Known Tally columns with few distinct values, stored as pandas categoricals
+CATEGORICAL_COLUMNS = ['Transaction Type', 'Voucher Type', 'Party', 'Party Name', 'Ledger', 'Ledger Name', 'Account', 'Group', 'GSTIN', 'State', 'Place of Supply']
+BOOL_COLUMNS = ['GST Included']
+# Text columns with at most this share of distinct values become categoricals too
+CATEGORY_MAX_UNIQUE_RATIO = 0.5
+
+# Income-tax slabs as (lower, upper, rate), new regime from FY2025-26 (section 115BAC)
+NEW_REGIME_SLABS = [
+    (0, 400_000, 0.0),
+    (400_000, 800_000, 0.05),
+    (800_000, 1_200_000, 0.10),
+    (1_200_000, 1_600_000, 0.15),
+    (1_600_000, 2_000_000, 0.20),
+    (2_000_000, 2_400_000, 0.25),
+    (2_400_000, float('inf'), 0.30),
+]
+HEALTH_EDUCATION_CESS = 0.04
+
+
+def read_ledger(file, file_name=None):
+    """Reads an Excel or CSV ledger (path or file-like object) into a DataFrame."""
+    name = file_name or getattr(file, 'name', None) or (file if isinstance(file, str) else '')
+    if str(name).lower().endswith('.csv'):
+        return pd.read_csv(file)
+    return pd.read_excel(file)
+
+
+def missing_columns(df, required=REQUIRED_COLUMNS):
+    """Returns the required columns that are absent from df (all of them if df is None)."""
+    if df is None:
+        return list(required)
+    return [col for col in required if col not in df.columns]
+
+
+def gst_included_mask(df):
+    """Boolean Series: True where 'GST Included' is a boolean True or the string 'TRUE'."""
+    flags = df['GST Included']
+    if flags.dtype == bool:
+        return flags
+    return flags.astype(str).str.strip().str.upper().eq('TRUE')
+
+
+def to_paise(values):
+    """
+    Converts rupee amounts to exact int64 paise (missing or unparseable -> 0).
+    Text such as '1,23,456.785' is parsed digit by digit and rounded half-up, so no float
+    rounding creeps in; numeric columns are scaled and rounded once.
+    """
+    if pd.api.types.is_bool_dtype(values):
+        values = values.astype(int)
+    if pd.api.types.is_numeric_dtype(values):
+        return (pd.to_numeric(values, errors='coerce').fillna(0) * 100).round().astype('int64')
+    parts = values.astype('string').str.replace(r'[,\s₹]', '', regex=True).str.extract(r'^(-?)(\d*)(?:\.(\d*))?$')
+    rupees = pd.to_numeric(parts[1].replace('', '0'), errors='coerce').fillna(0).astype('int64')
+    fraction = parts[2].fillna('').str.ljust(3, '0').str[:3]
+    thousandths = pd.to_numeric(fraction, errors='coerce').fillna(0).astype('int64')
+    paise = rupees * 100 + (thousandths + 5) // 10
+    return paise.where(parts[0] != '-', -paise).where(parts[1].notna(), 0).astype('int64')
+
+
+def paise_values(df, column='Amount'):
+    """int64 paise for a money column: the normalize_ledger() twin if present, else converted now."""
+    paise_column = PAISE_COLUMNS.get(column)
+    if paise_column in df.columns:
+        return df[paise_column]
+    if column not in df.columns:
+        return pd.Series(0, index=df.index, dtype='int64')
+    return to_paise(df[column])
+
+
+def column_total(df, column='Amount', mask=None):
+    """
+    Sum of a money column in rupees, optionally over rows where mask is True.
+    Sums the exact paise column when normalize_ledger() has added one.
+    """
+    paise_column = PAISE_COLUMNS.get(column)
+    if paise_column in df.columns:
+        values = df[paise_column] if mask is None else df.loc[mask, paise_column]
+        return int(values.sum()) / 100
+    if column not in df.columns:
+        return 0.0
+    values = df[column] if mask is None else df.loc[mask, column]
+    return pd.to_numeric(values, errors='coerce').fillna(0).sum()
+
+
+def _downcast_integers(series):
+    """int32 (or nullable Int32 with gaps) when every value is a whole number in range, else unchanged."""
+    values = series.dropna()
+    info = np.iinfo(np.int32)
+    if values.empty or not np.array_equal(values, values.round()) or values.min() < info.min or values.max() > info.max:
+        return series
+    return series.astype('int32' if len(values) == len(series) else 'Int32')
+
+
+def _arrow_string_dtype():
+    try:
+        import pyarrow  # noqa: F401 - only checks availability
+    except ImportError:
+        return 'string'
+    return 'string[pyarrow]'
+
+
+def normalize_ledger(df, arrow=False):
+    """
+    Returns a compact copy of a parsed ledger: known Tally columns as categoricals and bools,
+    'Date' as datetime, money columns as rupees read from an exact int64 paise twin (see PAISE_COLUMNS),
+    whole-number columns as int32 and low-cardinality text as categoricals. With arrow=True
+    (and pyarrow installed) the remaining free text is stored as pyarrow strings.
+    """
+    frame = df.copy()
+    for column in frame.columns:
+        series = frame[column]
+        if column == 'Date':
+            frame[column] = parse_dates(series)
+        elif column in BOOL_COLUMNS:
+            frame[column] = gst_included_mask(frame) if column == 'GST Included' else series.astype(bool)
+        elif column in PAISE_COLUMNS:
+            continue  # Derived from the paise twin below, so text amounts such as '1,20,000.50' parse the same way
+        elif column in CATEGORICAL_COLUMNS:
+            frame[column] = series.astype('category')
+        elif pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+            frame[column] = _downcast_integers(series)
+        elif series.dtype == object:
+            if series.nunique(dropna=True) <= CATEGORY_MAX_UNIQUE_RATIO * len(series):
+                frame[column] = series.astype('string').astype('category')
+            elif arrow:
+                frame[column] = series.astype(_arrow_string_dtype())
+    for column, paise_column in PAISE_COLUMNS.items():
+        if column in df.columns:
+            frame[paise_column] = to_paise(df[column])
+            blank = df[column].isna() | (df[column].astype('string').str.strip() == '')
+            frame[column] = (frame[paise_column] / 100).mask(blank)
+    return frame
+
+
+def memory_report(before, after):
+    """Deep memory usage of two versions of a ledger, in bytes, with the reduction ratio."""
+    before_bytes = int(before.memory_usage(deep=True).sum())
+    after_bytes = int(after.memory_usage(deep=True).sum())
+    return {'before_bytes': before_bytes, 'after_bytes': after_bytes, 'ratio': before_bytes / after_bytes if after_bytes else 0.0}
+
+
+def analyze_financials(df):
+    """Calculates income, expenses, profit, and margin from the DataFrame."""
+    if missing_columns(df):
+        return 0, 0, 0, 0
+    income = column_total(df, 'Amount', df['Transaction Type'] == 'Income')
+    expenses = column_total(df, 'Amount', df['Transaction Type'] == 'Expense')
+    profit = income - expenses
+    margin = profit / income if income else 0
+    return income, expenses, profit, margin
+
+
+def slab_tax(taxable_income, slabs=NEW_REGIME_SLABS, cess=HEALTH_EDUCATION_CESS):
+    """
+    Income tax on taxable income using progressive slabs, plus cess.
+    Accepts a scalar or an array (vectorised over periods). Rebates and surcharge are not applied.
+    """
+    taxable = np.maximum(np.asarray(taxable_income, dtype=float), 0)
+    tax = np.zeros_like(taxable)
+    for lower, upper, slab_rate in slabs:
+        tax += np.clip(taxable - lower, 0, upper - lower) * slab_rate
+    tax = tax * (1 + cess)
+    return float(tax) if tax.ndim == 0 else tax
+
+
+def estimate_tax(df, rate=0.25, slabs=None):
+    """
+    Estimates tax liability and sums TDS. By default a flat `rate` on income; with `slabs`,
+    slab_tax on profit (income - expenses).
+    """
+    if missing_columns(df):
+        return 0, 0
+    income_total = column_total(df, 'Amount', df['Transaction Type'] == 'Income')
+    if slabs:
+        expenses_total = column_total(df, 'Amount', df['Transaction Type'] == 'Expense')
+        tax = slab_tax(income_total - expenses_total, slabs)
+    else:
+        tax = income_total * rate
+    # Sum only numeric TDS values, default to 0 if the column is missing
+    tds = column_total(df, 'TDS Deducted')
+    return tax, tds
+
+
+def gst_components(df, gst_rate=0.18):
+    """
+    Per-row GST split for rows where GST is included in the amount.
+    Returns (input_gst, output_gst) Series aligned with df; rows without GST are 0.
+    """
+    amounts = pd.to_numeric(df['Amount'], errors='coerce')
+    # GST portion of a GST-inclusive amount: amount - amount / (1 + rate)
+    gst_amounts = (amounts / (1 + gst_rate) * gst_rate).where(gst_included_mask(df) & amounts.notna(), 0.0)
+    output_gst = gst_amounts.where(df['Transaction Type'].isin(OUTPUT_GST_TYPES), 0.0)
+    input_gst = gst_amounts.where(df['Transaction Type'].isin(INPUT_GST_TYPES), 0.0)
+    return input_gst, output_gst
+
+
+def summarize_gst(df, gst_rate=0.18, eligible_itc=None):
+    """
+    Summarizes Input and Output GST for rows where GST is included in the amount.
+    eligible_itc (e.g. from gstr2b.match_itc) replaces the ledger-derived input GST with the
+    credit verified against GSTR-2B.
+    """
+    if missing_columns(df, GST_COLUMNS):
+        return 0, 0, 0
+    input_series, output_series = gst_components(df, gst_rate)
+    input_gst, output_gst = input_series.sum(), output_series.sum()
+    if eligible_itc is not None:
+        input_gst = eligible_itc
+    net_gst = output_gst - input_gst
+    return input_gst, output_gst, net_gst
+
+
+def financial_summary(df):
+    """Returns every headline figure for a ledger as a dict of plain floats."""
+    income, expenses, profit, margin = analyze_financials(df)
+    tax, tds = estimate_tax(df)
+    input_gst, output_gst, net_gst = summarize_gst(df)
+    figures = {
+        'income': income, 'expenses': expenses, 'profit': profit, 'margin': margin,
+        'tax': tax, 'tds': tds,
+        'input_gst': input_gst, 'output_gst': output_gst, 'net_gst': net_gst,
+    }
+    return {key: float(value) for key, value in figures.items()}
+
+
+def parse_dates(values):
+    """
+    Parses a ledger date column. ISO dates (2025-04-01) are read as-is; anything else is
+    read day-first (01/04/2025), as Tally exports use Indian date order. Unparseable -> NaT.
+    """
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values
+    dates = pd.to_datetime(values, errors='coerce', format='ISO8601')
+    remaining = dates.isna() & values.notna()
+    if remaining.any():
+        dates[remaining] = pd.to_datetime(values[remaining], errors='coerce', dayfirst=True, format='mixed')
+    return dates
+
+
+def fiscal_year_label(dates):
+    """
+    Maps a datetime Series to Indian financial-year labels (April-March), e.g. 'FY2024-25'.
+    Missing dates map to None.
+    """
+    labels = pd.Series(None, index=dates.index, dtype=object)
+    valid = dates.dropna()
+    start_year = valid.dt.year - (valid.dt.month < 4).astype(int)
+    labels[valid.index] = 'FY' + start_year.astype(str) + '-' + ((start_year + 1) % 100).astype(str).str.zfill(2)
+    return labels
+
+
+def fiscal_quarter_label(dates):
+    """Maps a datetime Series to financial-year quarters, e.g. 'FY2024-25 Q1' for April-June 2024."""
+    labels = fiscal_year_label(dates)
+    valid = dates.dropna()
+    quarter = ((valid.dt.month - 4) % 12) // 3 + 1
+    labels[valid.index] = labels[valid.index] + ' Q' + quarter.astype(str)
+    return labels
+
+
+def is_ledger_file(path):
+    return os.path.basename(path).lower().endswith(LEDGER_EXTENSIONS) and not os.path.basename(path).startswith('~$')
@@ -0,0 +1,204 @@
+"""
+GSTR-2B vs purchase register matching.
+
+Input tax credit is only claimable for invoices the supplier has reported, i.e. those that
+appear in the recipient's GSTR-2B. This module loads a 2B export (the portal JSON or the
+Excel download), normalizes supplier GSTIN and invoice number with vectorized string ops,
+and indexes the 2B invoices in a hash index keyed on 'GSTIN|INVOICE'. Each purchase row is
+then looked up with a single get_indexer call and flagged:
+
+  matched          - in 2B, ITC available, tax agrees within TAX_TOLERANCE_PAISE
+  amount_mismatch  - in 2B, but tax differs; the lower of the two is treated as eligible
+  ineligible       - in 2B with ITC availability 'N' (e.g. section 17(5) or place-of-supply)
+  missing_in_2b    - not reported by the supplier; no ITC until it appears
+and 2B invoices with no purchase row are returned as not_in_books.
+"""
+import json
+
+import numpy as np
+import pandas as pd
+
+from tools import financials
+
+TAX_TOLERANCE_PAISE = 100  # Rs 1, rounding differences between books and the portal
+TAX_FIELDS = ['igst', 'cgst', 'sgst', 'cess']
+
+# Purchase register column names as exported from Tally / typed by hand
+GSTIN_COLUMNS = ['Supplier GSTIN', 'GSTIN', 'GSTIN/UIN', 'Party GSTIN', 'GSTIN of Supplier']
+INVOICE_COLUMNS = ['Supplier Invoice No', 'Supplier Invoice No.', 'Invoice No', 'Invoice No.', 'Invoice Number', 'Bill No', 'Bill No.', 'Reference', 'Ref No']
+LEDGER_TAX_COLUMNS = {'igst': ['IGST', 'Integrated Tax'], 'cgst': ['CGST', 'Central Tax'], 'sgst': ['SGST', 'SGST/UTGST', 'State/UT Tax'], 'cess': ['Cess']}
+
+# GSTR-2B Excel (B2B sheet) headers; the sheet has a few title rows above them
+EXCEL_COLUMNS = {
+    'gstin': ['GSTIN of supplier'],
+    'supplier_name': ['Trade/Legal name'],
+    'invoice_no': ['Invoice number', 'Note number'],
+    'invoice_date': ['Invoice Date', 'Note date'],
+    'igst': ['Integrated Tax(₹)', 'Integrated Tax'],
+    'cgst': ['Central Tax(₹)', 'Central Tax'],
+    'sgst': ['State/UT Tax(₹)', 'State/UT Tax'],
+    'cess': ['Cess(₹)', 'Cess'],
+    'itc_available': ['ITC Availability'],
+    'reason': ['Reason'],
+}
+
+
+def normalize_gstin(values):
+    return values.astype('string').str.upper().str.replace(r'\s+', '', regex=True)
+
+
+def normalize_invoice(values):
+    """
+    Upper-cases, drops separators and leading zeros, so 'inv/0042', 'INV-42' and 'INV 042'
+    share a key. Suppliers and buyers rarely type invoice numbers identically.
+    """
+    cleaned = values.astype('string').str.upper().str.replace(r'[^A-Z0-9]', '', regex=True)
+    return cleaned.str.replace(r'(?<![0-9])0+(?=[0-9])', '', regex=True)
+
+
+def match_keys(gstins, invoices):
+    return normalize_gstin(gstins).fillna('') + '|' + normalize_invoice(invoices).fillna('')
+
+
+def _from_json(payload):
+    """Flattens B2B invoices (and CDNR notes, credit notes negative) from the portal JSON."""
+    docdata = payload.get('data', payload).get('docdata', {})
+    rows = []
+    for supplier in docdata.get('b2b', []):
+        for invoice in supplier.get('inv', []):
+            rows.append({
+                'gstin': supplier.get('ctin'), 'supplier_name': supplier.get('trdnm'),
+                'invoice_no': invoice.get('inum'), 'invoice_date': invoice.get('dt'),
+                **{field: invoice.get(field, 0) for field in TAX_FIELDS},
+                'itc_available': invoice.get('itcavl', 'Y'), 'reason': invoice.get('rsn'),
+            })
+    for supplier in docdata.get('cdnr', []):
+        for note in supplier.get('nt', []):
+            sign = -1 if note.get('typ') == 'C' else 1
+            rows.append({
+                'gstin': supplier.get('ctin'), 'supplier_name': supplier.get('trdnm'),
+                'invoice_no': note.get('ntnum'), 'invoice_date': note.get('dt'),
+                **{field: sign * note.get(field, 0) for field in TAX_FIELDS},
+                'itc_available': note.get('itcavl', 'Y'), 'reason': note.get('rsn'),
+            })
+    return pd.DataFrame(rows, columns=list(EXCEL_COLUMNS))
+
+
+def _from_excel(file):
+    """Reads the B2B sheet of the 2B Excel download, locating the header row."""
+    raw = pd.read_excel(file, sheet_name='B2B', header=None)
+    header_row = next((i for i, row in raw.head(15).iterrows()
+                       if row.astype(str).str.strip().str.lower().eq('gstin of supplier').any()), None)
+    if header_row is None:
+        raise ValueError("Could not find the 'GSTIN of supplier' header in the B2B sheet.")
+    # Header cells can be split across two rows (e.g. 'Tax Amount' over 'Integrated Tax(₹)')
+    headers = raw.iloc[header_row].astype(str).str.strip()
+    sub_headers = raw.iloc[header_row + 1].astype(str).str.strip()
+    headers = headers.where(~sub_headers.isin(sum(EXCEL_COLUMNS.values(), [])), sub_headers)
+    body = raw.iloc[header_row + 1:].set_axis(headers, axis=1)
+    frame = pd.DataFrame(index=body.index)
+    for field, candidates in EXCEL_COLUMNS.items():
+        column = next((c for c in candidates if c in body.columns), None)
+        frame[field] = body[column] if column is not None else None
+    return frame[frame['gstin'].astype(str).str.len() == 15].reset_index(drop=True)
+
+
+def load_gstr2b(file, file_name=None):
+    """
+    Loads a GSTR-2B export (portal JSON or Excel; path or file-like object) into one row per
+    document with gstin, supplier_name, invoice_no, invoice_date, tax_paise, itc_available, reason.
+    """
+    name = str(file_name or getattr(file, 'name', None) or (file if isinstance(file, str) else '')).lower()
+    if name.endswith('.json'):
+        if isinstance(file, str):
+            with open(file, 'r', encoding='utf-8') as f:
+                payload = json.load(f)
+        else:
+            payload = json.load(file)
+        frame = _from_json(payload)
+    else:
+        frame = _from_excel(file)
+    frame['tax_paise'] = sum(financials.to_paise(pd.to_numeric(frame[field], errors='coerce').fillna(0)) for field in TAX_FIELDS)
+    # A blank or missing availability (e.g. no 'ITC Availability' column) means available; only 'N'/'No' is not
+    frame['itc_available'] = frame['itc_available'].fillna('Y').astype(str).str.strip().str.upper().str[:1].ne('N')
+    return frame.drop(columns=TAX_FIELDS)
+
+
+def build_index(gstr2b):
+    """
+    Collapses 2B documents to one row per match key (amendments and split lines share a key)
+    and returns (rows, pd.Index of keys) - the Index is the hash lookup used for matching.
+    """
+    keyed = gstr2b.assign(key=match_keys(gstr2b['gstin'], gstr2b['invoice_no']))
+    rows = keyed.groupby('key', sort=False).agg(
+        gstin=('gstin', 'first'), supplier_name=('supplier_name', 'first'), invoice_no=('invoice_no', 'first'),
+        invoice_date=('invoice_date', 'first'), tax_paise=('tax_paise', 'sum'),
+        itc_available=('itc_available', 'all'), reason=('reason', 'first'),
+    )
+    return rows.reset_index(drop=True), rows.index
+
+
+def _first_column(df, candidates):
+    return next((c for c in candidates if c in df.columns), None)
+
+
+def purchase_register(df, gst_rate=0.18):
+    """
+    Purchase rows (financials.INPUT_GST_TYPES) with their GSTIN, invoice number and claimed
+    ITC in paise. Claimed ITC comes from IGST/CGST/SGST/Cess columns when the ledger has them,
+    otherwise from the GST-inclusive amount at gst_rate.
+    """
+    gstin_col, invoice_col = _first_column(df, GSTIN_COLUMNS), _first_column(df, INVOICE_COLUMNS)
+    if gstin_col is None or invoice_col is None:
+        raise ValueError(f"GSTR-2B matching needs supplier GSTIN and invoice number columns (e.g. '{GSTIN_COLUMNS[0]}', '{INVOICE_COLUMNS[0]}').")
+    purchases = df['Transaction Type'].isin(financials.INPUT_GST_TYPES)
+    tax_columns = [col for names in LEDGER_TAX_COLUMNS.values() if (col := _first_column(df, names))]
+    if tax_columns:
+        claimed = sum(financials.to_paise(df[col]) for col in tax_columns)
+    else:
+        input_gst, _ = financials.gst_components(df, gst_rate)
+        claimed = financials.to_paise(input_gst)
+    return pd.DataFrame({
+        'gstin': df[gstin_col], 'invoice_no': df[invoice_col], 'claimed_paise': claimed,
+    }, index=df.index)[purchases]
+
+
+def match_itc(ledger_df, gstr2b, gst_rate=0.18):
+    """
+    Matches purchase rows against a loaded GSTR-2B. Returns a dict with:
+      purchases    - one row per purchase with status, claimed / 2B / eligible ITC (rupees)
+      not_in_books - 2B documents with no matching purchase row
+      summary      - counts per status and claimed vs eligible ITC totals
+    """
+    rows, index = build_index(gstr2b)
+    register = purchase_register(ledger_df, gst_rate)
+    keys = match_keys(register['gstin'], register['invoice_no'])
+    position = index.get_indexer(keys)
+    found = position >= 0
+    safe = np.where(found, position, 0)
+
+    portal_tax = np.where(found, rows['tax_paise'].to_numpy()[safe], 0)
+    available = found & rows['itc_available'].to_numpy()[safe]
+    claimed = register['claimed_paise'].to_numpy()
+    within = np.abs(claimed - portal_tax) <= TAX_TOLERANCE_PAISE
+
+    status = np.select([~found, ~available, within], ['missing_in_2b', 'ineligible', 'matched'], 'amount_mismatch')
+    eligible = np.where(available, np.minimum(claimed, portal_tax), 0)
+    purchases = register.assign(
+        status=status,
+        claimed_itc=claimed / 100, gstr2b_itc=portal_tax / 100, eligible_itc=eligible / 100,
+        supplier_name=np.where(found, rows['supplier_name'].to_numpy()[safe], None),
+        reason=np.where(found, rows['reason'].to_numpy()[safe], None),
+    ).drop(columns=['claimed_paise'])
+
+    used = np.zeros(len(rows), dtype=bool)
+    used[position[found]] = True
+    not_in_books = rows[~used].assign(itc=lambda t: t['tax_paise'] / 100).drop(columns=['tax_paise'])
+
+    summary = pd.Series(status).value_counts().reindex(['matched', 'amount_mismatch', 'ineligible', 'missing_in_2b'], fill_value=0).to_dict()
+    summary.update({
+        'not_in_books': len(not_in_books),
+        'claimed_itc': int(claimed.sum()) / 100,
+        'eligible_itc': int(eligible.sum()) / 100,
+    })
+    return {'purchases': purchases, 'not_in_books': not_in_books, 'summary': summary}
@@ -0,0 +1,84 @@
+"""
+Incremental ledger ingestion.
+
+Clients re-send their whole cumulative Tally export every month. Instead of re-analysing it
+from row one, each voucher is hashed on (date, voucher number, amount) and compared against
+the vouchers already ingested for that client. Only the new rows are written to the ledger
+store and added to the client's running totals, so a monthly refresh costs O(new rows).
+"""
+import numpy as np
+import pandas as pd
+
+import database
+from tools import financials, ledger_store
+
+# Tally exports name the voucher column in several ways
+VOUCHER_COLUMNS = ['Voucher No', 'Voucher No.', 'Voucher Number', 'Vch No.', 'Vch No', 'Voucher']
+
+
+def _voucher_column(df):
+    return next((col for col in VOUCHER_COLUMNS if col in df.columns), None)
+
+
+def voucher_hashes(df):
+    """
+    Returns an int64 hash per row of (date, voucher number, amount in paise).
+    Without a voucher number column, transaction type and description stand in for it.
+    Identical rows are told apart by their occurrence number, so a genuine repeat of a
+    voucher is kept while the same voucher re-sent next month is recognised.
+    """
+    dates = financials.parse_dates(df['Date']) if 'Date' in df.columns else pd.Series(pd.NaT, index=df.index)
+    key = pd.DataFrame({
+        'date': dates.dt.strftime('%Y-%m-%d').fillna(''),
+        'amount': financials.paise_values(df, 'Amount'),
+    }, index=df.index)
+    voucher_col = _voucher_column(df)
+    if voucher_col:
+        key['voucher'] = df[voucher_col].astype(str).str.strip()
+    else:
+        for col in ('Transaction Type', 'Description'):
+            key[col] = df[col].astype(str).str.strip() if col in df.columns else ''
+    key['occurrence'] = key.groupby(list(key.columns)).cumcount()
+    # hash_pandas_object uses a fixed key, so hashes are stable across runs and processes
+    return pd.util.hash_pandas_object(key, index=False).astype('int64')
+
+
+def delta_totals(df):
+    """Aggregates that are additive across deltas (profit, margin and tax derive from them)."""
+    income, expenses, _, _ = financials.analyze_financials(df)
+    _, tds = financials.estimate_tax(df)
+    input_gst, output_gst, _ = financials.summarize_gst(df)
+    return {
+        'income': float(income), 'expenses': float(expenses), 'tds': float(tds),
+        'input_gst': float(input_gst), 'output_gst': float(output_gst), 'row_count': len(df),
+    }
+
+
+def ingest_delta(client_id, df, source_name, store=True):
+    """
+    Ingests only the rows of `df` not seen before for this client.
+    Returns a dict with the new rows, counts, the stored document ID and the updated totals.
+    """
+    hashes = voucher_hashes(df)
+    seen = np.asarray(database.get_voucher_hashes(client_id), dtype='int64')
+    is_new = ~np.isin(hashes.to_numpy(), seen)
+    new_rows = df[is_new]
+
+    result = {'new_rows': new_rows, 'new_count': int(is_new.sum()), 'skipped_count': int((~is_new).sum()), 'document_id': None}
+    if new_rows.empty:
+        result['totals'] = database.get_ledger_totals(client_id)
+        return result
+
+    document_id = ledger_store.write_ledger(new_rows, client_id, source_name) if store else None
+    new_dates = financials.parse_dates(new_rows['Date']).dt.strftime('%Y-%m-%d') if 'Date' in new_rows.columns else pd.Series(None, index=new_rows.index)
+    vouchers = list(zip(hashes[is_new].tolist(), new_dates.where(new_dates.notna(), None).tolist(), [document_id] * len(new_rows)))
+    try:
+        database.record_ledger_delta(client_id, vouchers, delta_totals(new_rows))
+    except Exception:
+        # Keep the store and the voucher index consistent: drop the parts we just wrote
+        if document_id is not None:
+            ledger_store.delete_document(document_id, client_id)
+        raise
+    result['document_id'] = document_id
+    result['totals'] = database.get_ledger_totals(client_id)
+    return result
@@ -0,0 +1,170 @@
+"""
+Columnar store for historical ledger data.
+
+Every ingested ledger is written as Parquet into a Hive-partitioned tree:
+
+    data/ledger_store/client_id=<id>/fiscal_month=<YYYY-MM>/doc-<document id>.parquet
+
+Each ingest is registered as a row in the `documents` table (document_type 'Ledger Store'),
+and its rows carry that document_id, so a stored ledger can always be traced back to the
+upload it came from. Queries use pyarrow datasets: filters on client_id / fiscal_month prune
+whole directories and only the requested columns are read from disk.
+"""
+import os
+import shutil
+
+import pandas as pd
+
+import database
+from tools import financials
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - optional dependency
+    pa = ds = pq = None
+
+STORE_ROOT = os.path.join("data", "ledger_store")
+STORE_DOCUMENT_TYPE = "Ledger Store"
+UNDATED_MONTH = "undated"  # fiscal_month partition of rows without a parseable date
+
+# Core columns are always written with these types so files from different uploads can be
+# read as one dataset. Any other ledger columns are stored as strings.
+CORE_SCHEMA = {
+    "Date": "timestamp[ns]",
+    "Transaction Type": "string",
+    "Description": "string",
+    "Amount": "float64",
+    "Amount Paise": "int64",
+    "GST Included": "bool",
+    "TDS Deducted": "float64",
+    "TDS Paise": "int64",
+}
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError("The ledger store needs pyarrow. Install it with: pip install pyarrow")
+
+
+def _normalize_for_store(df, document_id):
+    """Casts a parsed ledger to the store schema and adds partition / lineage columns."""
+    frame = pd.DataFrame(index=df.index)
+    frame["Date"] = financials.parse_dates(df["Date"]) if "Date" in df.columns else pd.NaT
+    for column in ("Transaction Type", "Description"):
+        frame[column] = df[column].astype("string") if column in df.columns else pd.Series(pd.NA, index=df.index, dtype="string")
+    frame["Amount"] = pd.to_numeric(df.get("Amount", 0), errors="coerce").astype("float64")
+    frame["GST Included"] = financials.gst_included_mask(df) if "GST Included" in df.columns else False
+    frame["TDS Deducted"] = pd.to_numeric(df.get("TDS Deducted", 0), errors="coerce").fillna(0).astype("float64")
+    frame["Amount Paise"] = financials.paise_values(df, "Amount")
+    frame["TDS Paise"] = financials.paise_values(df, "TDS Deducted")
+    for column in df.columns:
+        if column not in CORE_SCHEMA:
+            frame[str(column)] = df[column].astype("string")
+    frame["document_id"] = document_id
+    frame["fiscal_year"] = financials.fiscal_year_label(frame["Date"])
+    frame["fiscal_month"] = frame["Date"].dt.strftime("%Y-%m").fillna(UNDATED_MONTH)
+    return frame
+
+
+def write_ledger(df, client_id, source_name, root=None):
+    """
+    Writes a parsed ledger into the store and links it through the documents table.
+    Returns the new document ID.
+    """
+    root = root or database.tenant_path(STORE_ROOT)
+    _require_pyarrow()
+    client_root = os.path.join(root, f"client_id={client_id}")
+    # The parts are named after the document ID, so the row comes first and goes again on failure
+    document_id = database.add_document(client_id, source_name, client_root, STORE_DOCUMENT_TYPE)
+    try:
+        frame = _normalize_for_store(df, document_id)
+        for fiscal_month, part in frame.groupby("fiscal_month"):
+            partition_dir = os.path.join(client_root, f"fiscal_month={fiscal_month}")
+            os.makedirs(partition_dir, exist_ok=True)
+            table = pa.Table.from_pandas(part.drop(columns=["fiscal_month"]), preserve_index=False)
+            pq.write_table(table, os.path.join(partition_dir, f"doc-{document_id}.parquet"))
+    except Exception:
+        delete_document(document_id, client_id, root)
+        raise
+    return document_id
+
+
+def delete_document(document_id, client_id, root=None):
+    """Removes every Parquet part written for one stored ledger, and its documents row. Returns the parts removed."""
+    root = root or database.tenant_path(STORE_ROOT)
+    database.delete_document(document_id)
+    client_root = os.path.join(root, f"client_id={client_id}")
+    if not os.path.isdir(client_root):
+        return 0
+    removed = 0
+    for partition in os.listdir(client_root):
+        part_path = os.path.join(client_root, partition, f"doc-{document_id}.parquet")
+        if os.path.exists(part_path):
+            os.remove(part_path)
+            removed += 1
+        partition_dir = os.path.join(client_root, partition)
+        if os.path.isdir(partition_dir) and not os.listdir(partition_dir):
+            shutil.rmtree(partition_dir)
+    return removed
+
+
+def _dataset(root):
+    _require_pyarrow()
+    return ds.dataset(root, format="parquet", partitioning="hive")
+
+
+def query_ledger(client_ids=None, start_month=None, end_month=None, columns=None, root=None):
+    """
+    Reads stored ledger rows as a DataFrame.
+    client_ids / start_month / end_month ('YYYY-MM', inclusive) are pushed down to the
+    partition directories; `columns` limits which columns are read. Rows without a date are
+    left out of any month range.
+    """
+    root = root or database.tenant_path(STORE_ROOT)
+    if not os.path.isdir(root):
+        return pd.DataFrame(columns=columns or [])
+    dataset = _dataset(root)
+    expression = None
+
+    def both(left, right):
+        return right if left is None else left & right
+
+    if client_ids is not None:
+        expression = both(expression, ds.field("client_id").isin(list(client_ids)))
+    if start_month or end_month:
+        # "undated" sorts after every 'YYYY-MM', so a range without an end would take it in
+        expression = both(expression, ds.field("fiscal_month") != UNDATED_MONTH)
+    if start_month:
+        expression = both(expression, ds.field("fiscal_month") >= start_month)
+    if end_month:
+        expression = both(expression, ds.field("fiscal_month") <= end_month)
+    return dataset.to_table(columns=columns, filter=expression).to_pandas()
+
+
+def yoy_income(client_id, root=None):
+    """Income per financial year with year-over-year growth for one client."""
+    df = query_ledger([client_id], columns=["fiscal_year", "Transaction Type", "Amount"], root=root)
+    if df.empty:
+        return pd.DataFrame(columns=["fiscal_year", "income", "yoy_growth"])
+    income = (
+        df[df["Transaction Type"].isin(financials.INCOME_TYPES)]
+        .groupby("fiscal_year")["Amount"].sum()
+        .rename("income")
+        .to_frame()
+    )
+    income["yoy_growth"] = income["income"].pct_change()
+    return income.reset_index()
+
+
+def gst_by_quarter(client_id, gst_rate=0.18, root=None):
+    """Input, output and net GST per financial-year quarter for one client."""
+    df = query_ledger([client_id], columns=["Date", "Transaction Type", "Amount", "GST Included"], root=root)
+    if df.empty:
+        return pd.DataFrame(columns=["quarter", "input_gst", "output_gst", "net_gst"])
+    input_gst, output_gst = financials.gst_components(df, gst_rate)
+    quarters = financials.fiscal_quarter_label(df["Date"])
+    result = pd.DataFrame({"input_gst": input_gst, "output_gst": output_gst}).groupby(quarters).sum()
+    result["net_gst"] = result["output_gst"] - result["input_gst"]
+    return result.rename_axis("quarter").reset_index()
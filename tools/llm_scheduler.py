@@ -0,0 +1,139 @@
+"""
+Shared gate in front of the local model server.
+
+Every Ollama call in the process (chat, drafting, metadata extraction, classification) goes
+through run(). Each Streamlit session is a thread of one process, so the gate is in-process:
+
+  concurrency  at most LLM_MAX_CONCURRENT generations run at once. More only make Ollama swap
+               and slow every one of them down.
+  priority     waiting calls are admitted by task: interactive chat first, then classification
+               and chat-history summaries, then bulk drafting and metadata extraction.
+  fairness     within a priority, the user with the fewest running calls goes first, and ties
+               go to whoever was admitted least recently. So one user with a queue of drafts
+               doesn't hold the gate while others wait. The user is set per thread with set_user()
+               (app.py uses one id per browser session) and defaults to "default".
+  coalescing   a call whose (model, prompt) is already queued or running waits for that call's
+               result instead of generating it again.
+
+Calls keep subprocess.run semantics: run() returns the CompletedProcess and raises
+CalledProcessError or OSError like the direct call did. Separate processes (batch ingest, the
+Celery worker) each have their own gate.
+"""
+import contextvars
+import itertools
+import os
+import subprocess
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import Future
+
+from tools import metrics
+
+MODEL = os.getenv("LLM_MODEL", "mistral")
+MAX_CONCURRENT = int(os.getenv("LLM_MAX_CONCURRENT", "2"))
+PRIORITIES = {"chat": 0, "classify": 1, "summarize": 1, "draft": 2, "metadata": 2}
+BULK_PRIORITY = 2
+
+_user = contextvars.ContextVar("llm_user", default="default")
+
+
+def set_user(user):
+    """Attributes this thread's later LLM calls to `user` for fairness."""
+    _user.set(user or "default")
+
+
+class _Ticket:
+    __slots__ = ("priority", "user", "seq", "queued")
+
+    def __init__(self, priority, user, seq):
+        self.priority = priority
+        self.user = user
+        self.seq = seq
+        self.queued = time.perf_counter()
+
+
+class Scheduler:
+    def __init__(self, max_concurrent=MAX_CONCURRENT, model=MODEL):
+        self.max_concurrent = max(1, max_concurrent)
+        self.model = model
+        self.cond = threading.Condition()
+        self.waiting = []
+        self.running = 0
+        self.running_by_user = defaultdict(int)
+        self.last_admitted = defaultdict(float)
+        self.in_flight = {}   # (model, prompt) -> Future of the call generating it
+        self.seq = itertools.count()
+
+    def _next(self):
+        return min(self.waiting, key=lambda t: (t.priority, self.running_by_user[t.user], self.last_admitted[t.user], t.seq))
+
+    def _admit(self, ticket):
+        """Blocks until `ticket` is the best waiting call and a slot is free. Called with cond held."""
+        self.waiting.append(ticket)
+        metrics.set_gauge("finiq_llm_queue_depth", len(self.waiting))
+        try:
+            while not (self.running < self.max_concurrent and self._next() is ticket):
+                self.cond.wait()
+        finally:
+            self.waiting.remove(ticket)
+            metrics.set_gauge("finiq_llm_queue_depth", len(self.waiting))
+            self.cond.notify_all()  # The next best ticket may now be admissible
+        self.running += 1
+        self.running_by_user[ticket.user] += 1
+        self.last_admitted[ticket.user] = time.monotonic()
+
+    def _release(self, ticket, key):
+        with self.cond:
+            self.running -= 1
+            self.running_by_user[ticket.user] -= 1
+            if not self.running_by_user[ticket.user]:
+                del self.running_by_user[ticket.user]
+            del self.in_flight[key]
+            self.cond.notify_all()
+
+    def run(self, task, prompt, user=None):
+        """Runs `prompt` through the model once admitted. Returns the CompletedProcess."""
+        key = (self.model, prompt)
+        user = user or _user.get()
+        with self.cond:
+            future = self.in_flight.get(key)
+            if future is None:
+                future = self.in_flight[key] = Future()
+                ticket = _Ticket(PRIORITIES.get(task, BULK_PRIORITY), user, next(self.seq))
+                try:
+                    self._admit(ticket)
+                except BaseException as e:
+                    del self.in_flight[key]
+                    future.set_exception(e)  # Callers coalesced onto this one stop waiting too
+                    raise
+            else:
+                ticket = None
+        if ticket is None:
+            metrics.inc("finiq_llm_coalesced_total", task=task)
+            return future.result()
+
+        metrics.observe("finiq_llm_queue_seconds", time.perf_counter() - ticket.queued, task=task)
+        try:
+            with metrics.llm_call(task, prompt) as call:
+                result = subprocess.run(
+                    ['ollama', 'run', self.model, prompt, '--verbose'],  # --verbose reports token counts on stderr
+                    capture_output=True, text=True, check=True, encoding='utf-8',
+                )
+                call.record(result)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            self._release(ticket, key)
+
+
+_scheduler = Scheduler()
+
+
+def run(task, prompt, user=None):
+    """Queues an LLM call on the process-wide scheduler and waits for its result."""
+    return _scheduler.run(task, prompt, user)
@@ -1,5 +1,6 @@
 import subprocess
 import re
+from tools import llm_scheduler
 
 def extract_metadata(text):
     # Use Ollama to extract metadata
@@ -15,7 +16,7 @@ def extract_metadata(text):
     - GST number: The GST number.
     Text: {text}"""
     try:
-        result = subprocess.run(['ollama', 'run', 'mistral', prompt], capture_output=True, text=True, check=True, encoding='utf-8')
+        result = llm_scheduler.run("metadata", prompt)
         output = result.stdout
         print("Ollama Output:")
         print(output)
@@ -0,0 +1,434 @@
+"""
+Lightweight pipeline instrumentation: counters, gauges and timing histograms.
+
+Recording is in-process and lock-protected, so it costs about a microsecond:
+
+    metrics.inc("finiq_ocr_pages_total", pages)
+    with metrics.timer("finiq_ocr_seconds"):
+        ...
+    @metrics.timed("finiq_db_query_seconds", function="get_reminders")
+    def get_reminders(): ...
+
+The app, the Celery worker and the completion server are separate processes, so each one
+periodically (every FLUSH_INTERVAL seconds, and at exit) writes its cumulative values to a small
+SQLite file shared by all of them (METRICS_DB_PATH), one row per process and series. snapshot()
+merges those rows: counters and histograms are summed across processes, gauges take the latest
+value. render_prometheus() formats the merge in the Prometheus text exposition format for the
+completion server's /metrics endpoint; the Streamlit admin panel reads the same snapshot.
+
+reset() clears the stored rows and records a reset time in the same file. Every other process
+checks it before its next flush and drops the counters and histograms it accumulated before
+then, so the reset holds across processes. Increments a process made between the reset and its
+next flush are dropped too.
+"""
+import atexit
+import json
+import math
+import os
+import re
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import ContextDecorator
+
+METRICS_DB_PATH = os.getenv("METRICS_DB_PATH", os.path.join("data", "metrics.db"))
+FLUSH_INTERVAL = 5.0          # Seconds between writes of this process's values to METRICS_DB_PATH
+RETENTION_DAYS = 7            # Rows of processes silent for longer are dropped
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+# HELP text for the series the app records; other names are exported without it
+METRIC_HELP = {
+    "finiq_ocr_seconds": "Time to OCR one document.",
+    "finiq_ocr_pages_total": "Pages OCR'd.",
+    "finiq_ocr_documents_total": "Documents sent to OCR, by status.",
+    "finiq_llm_seconds": "LLM call latency, by task and status.",
+    "finiq_llm_requests_total": "LLM calls, by task and status.",
+    "finiq_llm_tokens_total": "LLM tokens, by task and kind (prompt or completion).",
+    "finiq_llm_queue_seconds": "Time LLM calls waited for a scheduler slot, by task.",
+    "finiq_llm_queue_depth": "LLM calls waiting for a scheduler slot.",
+    "finiq_llm_coalesced_total": "LLM calls answered by an identical in-flight call, by task.",
+    "finiq_cache_requests_total": "Cache lookups, by cache and result (hit or miss).",
+    "finiq_db_query_seconds": "Time spent in each database.py function.",
+    "finiq_emails_total": "Reminder emails, by status.",
+    "finiq_reminder_scan_seconds": "Duration of the Celery Beat reminder scan.",
+    "finiq_reminders_scheduled": "Reminder emails queued by the latest scan.",
+}
+
+# `ollama run --verbose` reports token counts on stderr
+_TOKEN_PATTERNS = {
+    "prompt": re.compile(r"prompt eval count:\s*(\d+)"),
+    "completion": re.compile(r"^eval count:\s*(\d+)", re.M),
+}
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets=SECONDS_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # Last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        index = 0
+        while index < len(self.buckets) and value > self.buckets[index]:
+            index += 1
+        self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+    def to_dict(self):
+        return {"buckets": list(self.buckets), "counts": self.counts, "sum": self.sum, "count": self.count}
+
+
+class Registry:
+    """This process's series, keyed by (name, sorted label items)."""
+
+    def __init__(self, path=METRICS_DB_PATH):
+        self.path = path
+        self.process = f"{socket.gethostname()}:{os.getpid()}"
+        self.lock = threading.Lock()
+        self.counters, self.gauges, self.histograms = {}, {}, {}
+        self.last_flush = time.monotonic()
+        self.reset_seen = time.time()  # Resets recorded before this process started don't apply to it
+
+    def after_fork(self):
+        # A forked child (e.g. a Celery prefork worker) starts its own series; the copied values are the parent's
+        self.process = f"{socket.gethostname()}:{os.getpid()}"
+        self.lock = threading.Lock()
+        self.counters, self.gauges, self.histograms = {}, {}, {}
+        self.reset_seen = time.time()
+
+    def inc(self, name, value=1, labels=()):
+        with self.lock:
+            self.counters[(name, labels)] = self.counters.get((name, labels), 0) + value
+        self._maybe_flush()
+
+    def set(self, name, value, labels=()):
+        with self.lock:
+            self.gauges[(name, labels)] = (value, time.time())
+        self._maybe_flush()
+
+    def observe(self, name, value, labels=()):
+        with self.lock:
+            histogram = self.histograms.get((name, labels))
+            if histogram is None:
+                histogram = self.histograms[(name, labels)] = Histogram()
+            histogram.observe(value)
+        self._maybe_flush()
+
+    def _maybe_flush(self):
+        if time.monotonic() - self.last_flush >= FLUSH_INTERVAL:
+            self.flush()
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=5)
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS metric_values (
+            process TEXT NOT NULL,      -- host:pid that recorded the series
+            name TEXT NOT NULL,
+            labels TEXT NOT NULL,       -- JSON object
+            kind TEXT NOT NULL,         -- counter, gauge or histogram
+            value REAL,                 -- counter total or gauge value
+            histogram TEXT,             -- JSON buckets / counts / sum / count
+            updated_at REAL NOT NULL,   -- Unix time
+            PRIMARY KEY (process, name, labels)
+        )
+        """)
+        conn.execute("CREATE TABLE IF NOT EXISTS metric_resets (id INTEGER PRIMARY KEY CHECK (id = 1), reset_at REAL NOT NULL)")
+        return conn
+
+    def flush(self):
+        """Writes this process's cumulative values (idempotent upserts). Never raises."""
+        with self.lock:
+            self.last_flush = time.monotonic()
+            if not (self.counters or self.gauges or self.histograms):
+                return
+        try:
+            conn = self._connect()
+            with conn:
+                reset = conn.execute("SELECT reset_at FROM metric_resets").fetchone()
+                with self.lock:
+                    if reset and reset[0] > self.reset_seen:
+                        # Another process reset the metrics; what this one counted before then is void
+                        self.counters.clear()
+                        self.histograms.clear()
+                        self.reset_seen = reset[0]
+                    now = time.time()
+                    rows = [(name, labels, "counter", value, None, now) for (name, labels), value in self.counters.items()]
+                    rows += [(name, labels, "gauge", value, None, at) for (name, labels), (value, at) in self.gauges.items()]
+                    rows += [(name, labels, "histogram", None, json.dumps(h.to_dict()), now) for (name, labels), h in self.histograms.items()]
+                conn.executemany(
+                    """
+                    INSERT INTO metric_values (process, name, labels, kind, value, histogram, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(process, name, labels) DO UPDATE SET
+                        value = excluded.value, histogram = excluded.histogram, updated_at = excluded.updated_at
+                    """,
+                    [(self.process, name, json.dumps(dict(labels)), kind, value, histogram, at) for name, labels, kind, value, histogram, at in rows],
+                )
+                conn.execute("DELETE FROM metric_values WHERE updated_at < ?", (now - RETENTION_DAYS * 86400,))
+            conn.close()
+        except sqlite3.Error as e:
+            print(f"Could not write metrics to {self.path}: {e}")
+
+    def reset(self):
+        """Clears this process's series and every stored row, and tells the other processes to drop theirs."""
+        with self.lock:
+            self.counters.clear()
+            self.gauges.clear()
+            self.histograms.clear()
+            self.reset_seen = time.time()
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM metric_values")
+            conn.execute("INSERT OR REPLACE INTO metric_resets (id, reset_at) VALUES (1, ?)", (self.reset_seen,))
+        conn.close()
+
+
+_registry = Registry()
+atexit.register(_registry.flush)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_registry.after_fork)
+
+
+def _labels(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def inc(name, value=1, **labels):
+    """Adds to a counter."""
+    _registry.inc(name, value, _labels(labels))
+
+
+def set_gauge(name, value, **labels):
+    _registry.set(name, value, _labels(labels))
+
+
+def observe(name, value, **labels):
+    """Records a value (seconds, unless the name says otherwise) in a histogram."""
+    _registry.observe(name, value, _labels(labels))
+
+
+class timer(ContextDecorator):
+    """
+    Times a block or, as a decorator, every call, into the `name` histogram. An exception adds
+    status="error" to the labels, so failures don't skew the successful timings.
+    """
+
+    def __init__(self, name, **labels):
+        self.name = name
+        self.labels = labels
+
+    def _recreate_cm(self):
+        # A fresh timer per decorated call, so concurrent or recursive calls don't share a start time
+        return timer(self.name, **self.labels)
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.seconds = time.perf_counter() - self.start
+        labels = dict(self.labels, status="error") if exc_type else self.labels
+        observe(self.name, self.seconds, **labels)
+        return False
+
+
+timed = timer
+
+
+def cache_lookup(cache, hit):
+    inc("finiq_cache_requests_total", cache=cache, result="hit" if hit else "miss")
+
+
+class llm_call:
+    """
+    Records one LLM call: latency, request count and tokens, by task. Call record(result) with
+    the finished subprocess (run with `ollama run ... --verbose`, whose stderr carries the token
+    counts); without counts, tokens are estimated at four characters each.
+    """
+
+    def __init__(self, task, prompt=""):
+        self.task = task
+        self.prompt = prompt
+        self.result = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def record(self, result):
+        self.result = result
+
+    def __exit__(self, exc_type, exc, tb):
+        status = "error" if exc_type else "ok"
+        observe("finiq_llm_seconds", time.perf_counter() - self.start, task=self.task, status=status)
+        inc("finiq_llm_requests_total", task=self.task, status=status)
+        if self.result is not None:
+            stderr = self.result.stderr or ""
+            for kind, pattern in _TOKEN_PATTERNS.items():
+                match = pattern.search(stderr)
+                estimate = len(self.prompt if kind == "prompt" else self.result.stdout or "") // 4
+                inc("finiq_llm_tokens_total", int(match.group(1)) if match else estimate, task=self.task, kind=kind)
+        return False
+
+
+def flush():
+    _registry.flush()
+
+
+def reset():
+    _registry.reset()
+
+
+def redirect(path):
+    """
+    Sends this process's metrics to another file from now on and drops the values recorded so
+    far, so neither file gets the other's. Returns the previous path (used by the benchmarks).
+    """
+    with _registry.lock:
+        previous, _registry.path = _registry.path, path
+        _registry.counters.clear()
+        _registry.gauges.clear()
+        _registry.histograms.clear()
+    return previous
+
+
+# --- Reading ---
+
+def snapshot(path=None):
+    """
+    Flushes this process and merges every process's stored values. Returns
+    {name: {"kind": ..., "series": [(labels dict, value or histogram dict), ...]}}.
+    """
+    _registry.flush()
+    path = path or _registry.path
+    if not os.path.exists(path):
+        return {}
+    conn = sqlite3.connect(path, timeout=5)
+    try:
+        rows = conn.execute("SELECT name, labels, kind, value, histogram, updated_at FROM metric_values ORDER BY name, labels").fetchall()
+    except sqlite3.OperationalError:
+        rows = []
+    conn.close()
+
+    merged = {}
+    for name, labels, kind, value, histogram, updated_at in rows:
+        series = merged.setdefault(name, {"kind": kind, "series": {}})["series"]
+        if kind == "counter":
+            series[labels] = series.get(labels, 0) + value
+        elif kind == "gauge":
+            if labels not in series or series[labels][1] < updated_at:
+                series[labels] = (value, updated_at)
+        else:
+            data = json.loads(histogram)
+            total = series.get(labels)
+            if total is None or total["buckets"] != data["buckets"]:
+                series[labels] = data
+            else:
+                total["counts"] = [a + b for a, b in zip(total["counts"], data["counts"])]
+                total["sum"] += data["sum"]
+                total["count"] += data["count"]
+    for metric in merged.values():
+        metric["series"] = [
+            (json.loads(labels), value[0] if metric["kind"] == "gauge" else value)
+            for labels, value in metric["series"].items()
+        ]
+    return merged
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels, extra=None):
+    items = list(labels.items()) + list((extra or {}).items())
+    if not items:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in items) + "}"
+
+
+def _format_number(value):
+    if math.isinf(value):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_prometheus(data=None):
+    """The merged snapshot in the Prometheus text exposition format (version 0.0.4)."""
+    data = snapshot() if data is None else data
+    lines = []
+    for name in sorted(data):
+        metric = data[name]
+        if name in METRIC_HELP:
+            lines.append(f"# HELP {name} {METRIC_HELP[name]}")
+        lines.append(f"# TYPE {name} {metric['kind']}")
+        for labels, value in metric["series"]:
+            if metric["kind"] != "histogram":
+                lines.append(f"{name}{_format_labels(labels)} {_format_number(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(list(value["buckets"]) + [math.inf], value["counts"]):
+                cumulative += count
+                lines.append(f"{name}_bucket{_format_labels(labels, {'le': _format_number(float(bound))})} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_format_number(float(value['sum']))}")
+            lines.append(f"{name}_count{_format_labels(labels)} {value['count']}")
+    return "\n".join(lines) + "\n"
+
+
+def histogram_quantile(histogram, quantile):
+    """Estimates a quantile from bucket counts by linear interpolation, like PromQL's."""
+    if not histogram or not histogram["count"]:
+        return None
+    target = quantile * histogram["count"]
+    cumulative, lower = 0, 0.0
+    for bound, count in zip(histogram["buckets"], histogram["counts"]):
+        if count and cumulative + count >= target:
+            return lower + (bound - lower) * (target - cumulative) / count
+        cumulative += count
+        lower = bound
+    return histogram["buckets"][-1]
+
+
+def merge_series(data, name, **match):
+    """Sums a metric's series whose labels include `match`: a number, or a merged histogram dict."""
+    metric = data.get(name)
+    if not metric:
+        return None
+    selected = [value for labels, value in metric["series"] if all(labels.get(k) == str(v) for k, v in match.items())]
+    if not selected:
+        return None
+    if metric["kind"] != "histogram":
+        return sum(selected)
+    total = {"buckets": selected[0]["buckets"], "counts": list(selected[0]["counts"]), "sum": selected[0]["sum"], "count": selected[0]["count"]}
+    for histogram in selected[1:]:
+        if histogram["buckets"] == total["buckets"]:
+            total["counts"] = [a + b for a, b in zip(total["counts"], histogram["counts"])]
+            total["sum"] += histogram["sum"]
+            total["count"] += histogram["count"]
+    return total
+
+
+def summarize(data, name, by):
+    """
+    One row per value of the `by` label of a histogram: calls, total seconds, mean and p95 in
+    milliseconds, slowest total first. Used by the admin panel.
+    """
+    metric = data.get(name)
+    if not metric:
+        return []
+    rows = []
+    for key in sorted({labels.get(by, "") for labels, _ in metric["series"]}):
+        total = merge_series(data, name, **{by: key})
+        rows.append({
+            by: key,
+            "calls": total["count"],
+            "total_s": round(total["sum"], 4),
+            "mean_ms": round(total["sum"] / total["count"] * 1000, 2) if total["count"] else None,
+            "p95_ms": round(histogram_quantile(total, 0.95) * 1000, 2) if total["count"] else None,
+        })
+    return sorted(rows, key=lambda row: row["total_s"], reverse=True)
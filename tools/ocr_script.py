@@ -2,56 +2,50 @@ import os
 # import cv2 # No longer needed for basic OCR with DocumentConverter
 # Import the specific converter class
 from docling.document_converter import DocumentConverter
+# Re-exported for callers that import it from here; see tools/date_extractor.py
+from tools.date_extractor import extract_due_date
+from tools import metrics, profiling
 
 # Instantiate the converter once outside the function for efficiency
 converter = DocumentConverter()
 
+@profiling.profiled("perform_ocr")
 def perform_ocr(image_path):
     """
     Performs OCR on the given image using docling.DocumentConverter.
     """
     try:
         # Use the converter to process the file directly
-        result = converter.convert(image_path)
+        with metrics.timer("finiq_ocr_seconds"):
+            result = converter.convert(image_path)
 
         # Check if conversion was successful and a document object exists
         if result and result.document:
+            metrics.inc("finiq_ocr_documents_total", status="ok")
+            metrics.inc("finiq_ocr_pages_total", len(getattr(result.document, "pages", None) or {}) or 1)
             # Export the document content to Markdown format
             markdown_text = result.document.export_to_markdown()
             return markdown_text.strip()
         else:
             # Handle cases where conversion failed or no document was produced
+            metrics.inc("finiq_ocr_documents_total", status="empty")
             print(f"Warning: No document found in the result for {image_path}")
             return None
     
     # Catch potential exceptions during conversion
     except Exception as e:
+        metrics.inc("finiq_ocr_documents_total", status="error")
         print(f"Error processing image {image_path} with DocumentConverter: {e}")
         return None
 
-def extract_due_date(markdown_text):
-    """
-    Extracts due date from markdown text using regex.
-    """
-    import re
-    date_patterns = [
-        r"Due Date:?\s*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})",  # DD/MM/YYYY, DD-MM-YYYY, DD/MM/YY, DD-MM-YY
-        r"Payment Date:?\s*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})",
-        r"Date Due:?\s*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})",
-        r"Expiry Date:?\s*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})", # Added "Expiry Date" as a possible indicator
-        r"Last Date to Pay:?\s*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})" # Added "Last Date to Pay"
-        # Add more patterns as needed
-    ]
-    for pattern in date_patterns:
-        match = re.search(pattern, markdown_text, re.IGNORECASE)
-        if match:
-            return match.group(1)  # Return the first captured group (the date)
-    return None  # Return None if no date is found
-
 def main():
     """
-    Main function to iterate through images in the data folder and perform OCR.
+    Main function to iterate through images in the data folder, perform OCR and
+    draft responses for PDFs. For large or nested folders use tools/batch_ingest.py,
+    which runs concurrently and can resume after a crash.
     """
+    from tools.response_generator import auto_draft_response
+
     data_folder = "data"
     image_files = [f for f in os.listdir(data_folder) if f.endswith(('.png', '.jpg', '.jpeg', '.pdf'))]
 
@@ -67,6 +61,11 @@ def main():
         if extracted_text:
             print("Extracted Text:")
             print(extracted_text)
+            # Draft the response from the text we already have instead of OCR'ing the PDF again
+            if image_file.endswith('.pdf'):
+                response_letter = auto_draft_response(extracted_text)
+                with open(f"{image_file.replace('.pdf', '')}_response.txt", "w") as f:
+                    f.write(response_letter)
         else:
             print("No text extracted or error occurred.")
         print("-" * 30)
@@ -74,25 +73,6 @@ def main():
 if __name__ == "__main__":
     main()
 
-    # Call response generator
-    from tools.response_generator import auto_draft_response
-    import glob
-    
-    # Get the list of pdf files
-    pdf_files = glob.glob("data/*.pdf")
-    
-    # Loop through each pdf file
-    for pdf_file in pdf_files:
-        # Extract the file name
-        file_name = os.path.basename(pdf_file)
-        # Perform OCR
-        extracted_text = perform_ocr(pdf_file)
-        # Generate the response letter
-        response_letter = auto_draft_response(extracted_text)
-        # Save the response letter to a file
-        with open(f"{file_name.replace('.pdf', '')}_response.txt", "w") as f:
-            f.write(response_letter)
-
 
 # import os
 # import re
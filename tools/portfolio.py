@@ -0,0 +1,160 @@
+"""
+Firm-wide portfolio analytics.
+
+Computes the income/expense/tax/GST summary for every client ledger in parallel worker
+processes and stores one row per (client, period) in client_financial_summaries, so the
+firm-wide dashboard is a single indexed query. A client with several ledgers gets their
+figures added up per period.
+
+Ledgers are found in a folder (file or sub-folder named after the client ID, e.g.
+`12_tally_export.xlsx` or `12/ledger.xlsx`, or containing the client's name) and/or among
+the documents linked to clients with document_type 'Ledger'.
+
+Usage:
+    python -m tools.portfolio data/ledgers --workers 4
+"""
+import argparse
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import database
+from tools import financials
+
+ALL_PERIODS = 'ALL'
+
+
+def _normalize_name(name):
+    return re.sub(r'[^a-z0-9]', '', str(name).lower())
+
+
+def match_client(path, clients):
+    """
+    Returns the client ID a ledger file belongs to, or None.
+    Looks for a leading client ID in the file or parent folder name, then for the client's name.
+    """
+    client_ids = {client[0] for client in clients}
+    file_stem = os.path.splitext(os.path.basename(path))[0]
+    parent = os.path.basename(os.path.dirname(path))
+    for candidate in (file_stem, parent):
+        leading = re.match(r'^(\d+)(?:[_\-\s]|$)', candidate)
+        if leading and int(leading.group(1)) in client_ids:
+            return int(leading.group(1))
+    haystacks = (_normalize_name(file_stem), _normalize_name(parent))
+    # Longest names first so "Sharma Traders Pvt" wins over "Sharma Traders"
+    for client_id, name, *_ in sorted(clients, key=lambda c: len(c[1] or ''), reverse=True):
+        normalized = _normalize_name(name)
+        if normalized and any(normalized in haystack for haystack in haystacks):
+            return client_id
+    return None
+
+
+def discover_ledgers(folder=None, include_documents=True):
+    """Returns a list of (client_id, ledger path) pairs and a list of unmatched paths."""
+    clients = database.get_all_clients()
+    pairs, unmatched = [], []
+    if folder:
+        for dirpath, _, filenames in os.walk(folder):
+            for filename in sorted(filenames):
+                path = os.path.join(dirpath, filename)
+                if not financials.is_ledger_file(path):
+                    continue
+                client_id = match_client(path, clients)
+                if client_id is None:
+                    unmatched.append(path)
+                else:
+                    pairs.append((client_id, path))
+    if include_documents:
+        for client in clients:
+            for _, client_id, filename, filepath, document_type, _ in database.get_documents_by_client(client[0]):
+                if (document_type or '').lower() == 'ledger' and financials.is_ledger_file(filename) and os.path.exists(filepath):
+                    pairs.append((client_id, filepath))
+    return sorted(set(pairs)), unmatched
+
+
+def summarize_ledger(client_id, path):
+    """
+    Reads one ledger and returns summary dicts: one per financial year found in the
+    'Date' column plus an ALL row. Runs in a worker process.
+    """
+    df = financials.normalize_ledger(financials.read_ledger(path))
+    summaries = []
+
+    def add(period, frame):
+        summary = financials.financial_summary(frame)
+        summary.update({'client_id': client_id, 'period': period, 'row_count': len(frame), 'source': path})
+        summaries.append(summary)
+
+    add(ALL_PERIODS, df)
+    if 'Date' in df.columns:
+        periods = financials.fiscal_year_label(financials.parse_dates(df['Date']))
+        for period, frame in df.groupby(periods, sort=True):
+            add(period, frame)
+    return summaries
+
+
+def combine_summaries(summaries):
+    """
+    Adds up the summaries of a client's ledgers per (client_id, period). The margin is
+    recomputed from the totals and the source lists every ledger used.
+    """
+    additive = [field for field in database.FINANCIAL_SUMMARY_FIELDS if field != 'margin'] + ['row_count']
+    combined = {}
+    for summary in sorted(summaries, key=lambda s: (s['client_id'], s['period'], s['source'])):
+        key = (summary['client_id'], summary['period'])
+        if key not in combined:
+            combined[key] = dict(summary, source=[summary['source']])
+            continue
+        total = combined[key]
+        for field in additive:
+            total[field] += summary[field]
+        total['source'].append(summary['source'])
+    for total in combined.values():
+        total['margin'] = total['profit'] / total['income'] if total['income'] else 0.0
+        total['source'] = '; '.join(total['source'])
+    return list(combined.values())
+
+
+def run_portfolio_analysis(folder=None, include_documents=True, workers=None):
+    """
+    Summarizes every discovered ledger in parallel and stores the results.
+    Returns (number of summaries stored, list of (path, error) failures, unmatched paths).
+    """
+    pairs, unmatched = discover_ledgers(folder, include_documents)
+    summaries, failures, failed_clients = [], [], set()
+    if pairs:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(summarize_ledger, client_id, path): (client_id, path) for client_id, path in pairs}
+            for future in as_completed(futures):
+                try:
+                    summaries.extend(future.result())
+                except Exception as e:
+                    client_id, path = futures[future]
+                    failures.append((path, str(e)))
+                    failed_clients.add(client_id)
+    # A client whose ledgers didn't all read keeps its previous figures rather than partial totals
+    combined = combine_summaries(s for s in summaries if s['client_id'] not in failed_clients)
+    stored = database.replace_financial_summaries(combined) if combined else 0
+    return stored, failures, unmatched
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch Balance Sheet analysis across all clients.")
+    parser.add_argument("folder", nargs="?", help="Folder of client ledgers (walked recursively)")
+    parser.add_argument("--no-documents", action="store_true", help="Ignore ledgers linked in the documents table")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    args = parser.parse_args(argv)
+
+    database.create_database()
+    stored, failures, unmatched = run_portfolio_analysis(args.folder, not args.no_documents, args.workers)
+    for path in unmatched:
+        print(f"No client matched: {path}")
+    for path, error in failures:
+        print(f"Failed: {path}: {error}")
+    print(f"Stored {stored} summaries, {len(failures)} failed, {len(unmatched)} unmatched.")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,263 @@
+"""
+Opt-in profiling for slow Streamlit reruns, Celery tasks and OCR.
+
+Off unless FINIQ_PROFILE is set, and then only runs slower than FINIQ_PROFILE_THRESHOLD
+seconds are kept:
+
+  FINIQ_PROFILE=cprofile   deterministic cProfile; saves <run>.pstats (open with pstats, snakeviz)
+  FINIQ_PROFILE=sample     samples the profiled thread's stack every FINIQ_PROFILE_INTERVAL
+                           seconds from a helper thread; saves <run>.speedscope.json
+                           (open at https://www.speedscope.app). Much cheaper than cProfile on
+                           OCR-heavy runs.
+
+Files go to FINIQ_PROFILE_DIR and only the newest FINIQ_PROFILE_KEEP are retained.
+
+    @profiling.profiled("perform_ocr")
+    def perform_ocr(path): ...
+
+    session = profiling.start("app_rerun", replace=True)   # top of app.py
+    ...
+    profiling.stop(session)                                 # bottom of app.py
+
+When profiling is off, profiled() returns the function unchanged and start() returns None, so
+the only cost is one check at import time or per rerun. Profiles do not nest: a profiled call
+made inside another profile (perform_ocr during a rerun) shows up in the outer profile instead
+of starting its own. A sampled profile follows its own thread. cProfile is process-wide since
+Python 3.12, so only one cprofile session runs at a time; runs that start meanwhile (another
+user's rerun, a concurrent task) are not profiled.
+"""
+import argparse
+import cProfile
+import functools
+import glob
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+
+_flag = os.getenv("FINIQ_PROFILE", "").strip().lower()
+MODE = {"": None, "0": None, "false": None, "off": None, "1": "sample", "true": "sample"}.get(_flag, _flag)
+THRESHOLD = float(os.getenv("FINIQ_PROFILE_THRESHOLD", "2.0"))       # Seconds; faster runs are discarded
+PROFILE_DIR = os.getenv("FINIQ_PROFILE_DIR", os.path.join("data", "profiles"))
+KEEP = int(os.getenv("FINIQ_PROFILE_KEEP", "50"))
+SAMPLE_INTERVAL = float(os.getenv("FINIQ_PROFILE_INTERVAL", "0.005"))
+EXTENSIONS = {"cprofile": ".pstats", "sample": ".speedscope.json"}
+
+if MODE not in (None, *EXTENSIONS):
+    raise ValueError(f"FINIQ_PROFILE must be one of {', '.join(EXTENSIONS)} (got {MODE!r})")
+
+_local = threading.local()
+_cprofile_guard = threading.Lock()
+_cprofile_session = None  # The running cprofile session, if any
+
+
+def _claim_cprofile(session):
+    """Makes `session` the process's cprofile session. False if another live one holds it."""
+    global _cprofile_session
+    with _cprofile_guard:
+        owner = _cprofile_session
+        if owner is not None:
+            if owner.thread.is_alive():
+                return False
+            owner.profiler.disable()  # Its thread ended without stop() (a rerun cut short)
+        _cprofile_session = session
+        return True
+
+
+def _release_cprofile(session):
+    global _cprofile_session
+    with _cprofile_guard:
+        if _cprofile_session is session:
+            _cprofile_session = None
+
+
+class _Sampler(threading.Thread):
+    """Records one thread's Python stack at a fixed interval, in speedscope's sampled format."""
+
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        super().__init__(name="finiq-profiler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.finished = threading.Event()
+        self.frame_index = {}
+        self.frames = []
+        self.samples = []
+        self.weights = []
+
+    def run(self):
+        last = time.perf_counter()
+        while not self.finished.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            now = time.perf_counter()
+            if frame is None:
+                break
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                key = (code.co_name, code.co_filename, code.co_firstlineno)
+                index = self.frame_index.get(key)
+                if index is None:
+                    index = self.frame_index[key] = len(self.frames)
+                    self.frames.append({"name": key[0], "file": key[1], "line": key[2]})
+                stack.append(index)
+                frame = frame.f_back
+            stack.reverse()
+            self.samples.append(stack)
+            self.weights.append(now - last)
+            last = now
+
+    def stop(self):
+        self.finished.set()
+        self.join()
+
+    def to_speedscope(self, name):
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "finiq-profiling",
+            "shared": {"frames": self.frames},
+            "profiles": [{
+                "type": "sampled", "name": name, "unit": "seconds",
+                "startValue": 0, "endValue": sum(self.weights),
+                "samples": self.samples, "weights": self.weights,
+            }],
+        }
+
+
+class Session:
+    """One profiled run on the current thread."""
+
+    def __init__(self, name, mode=None):
+        self.name = name
+        self.mode = mode or MODE
+        self.thread = threading.current_thread()
+        self.profiler = None
+        self.started = None
+        self.elapsed = None
+
+    def start(self):
+        """Starts recording. Returns self, or None when cProfile is already in use elsewhere in the process."""
+        if self.mode == "cprofile":
+            if not _claim_cprofile(self):
+                return None
+            self.profiler = cProfile.Profile()
+            try:
+                self.profiler.enable()
+            except ValueError:  # Another profiling tool is active (Python 3.12+)
+                _release_cprofile(self)
+                return None
+        else:
+            self.profiler = _Sampler(threading.get_ident())
+            self.profiler.start()
+        self.started = time.perf_counter()
+        return self
+
+    def stop(self):
+        self.elapsed = time.perf_counter() - self.started
+        if self.mode == "cprofile":
+            self.profiler.disable()
+            _release_cprofile(self)
+        else:
+            self.profiler.stop()
+        return self.elapsed
+
+    def save(self, directory=PROFILE_DIR):
+        """Writes the profile next to earlier ones and prunes the oldest. Returns the path."""
+        os.makedirs(directory, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        path = os.path.join(directory, f"{stamp}_{self.name}_{os.getpid()}_{self.elapsed * 1000:.0f}ms{EXTENSIONS[self.mode]}")
+        if self.mode == "cprofile":
+            self.profiler.dump_stats(path)
+        else:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(self.profiler.to_speedscope(f"{self.name} ({self.elapsed:.2f}s)"), f)
+        prune(directory)
+        return path
+
+
+def start(name, replace=False):
+    """
+    Starts profiling the current thread, or returns None if profiling is off, a profile is
+    already running here or (cprofile) another thread holds cProfile. replace=True discards a
+    still-running profile here instead: a Streamlit rerun cut short by st.rerun() or an
+    exception never reaches its stop().
+    """
+    if MODE is None:
+        return None
+    current = getattr(_local, "session", None)
+    if current is not None:
+        if not replace:
+            return None
+        current.stop()
+    _local.session = Session(name).start()
+    return _local.session
+
+
+def stop(session):
+    """Ends a session from start(). Saves it if it ran past THRESHOLD; returns the path or None."""
+    if session is None:
+        return None
+    if getattr(_local, "session", None) is session:
+        _local.session = None
+    if session.stop() < THRESHOLD:
+        return None
+    try:
+        return session.save()
+    except OSError:
+        return None  # Never fail the profiled work over a profile
+
+
+def profiled(name):
+    """Decorator: profiles each call of the function. Returns it unchanged when profiling is off."""
+    def decorator(func):
+        if MODE is None:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            session = start(name)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                stop(session)
+        return wrapper
+    return decorator
+
+
+def prune(directory=PROFILE_DIR, keep=KEEP):
+    """Deletes all but the `keep` newest profiles."""
+    paths = profiles(directory)
+    for path in paths[keep:]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass  # Already removed by another process
+
+
+def profiles(directory=PROFILE_DIR):
+    """Saved profiles, newest first."""
+    paths = [path for extension in EXTENSIONS.values() for path in glob.glob(os.path.join(directory, "*" + extension))]
+    return sorted(paths, key=os.path.getmtime, reverse=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="List saved profiles or print the hottest functions of one.")
+    parser.add_argument("command", choices=["list", "show"])
+    parser.add_argument("path", nargs="?", help=".pstats file to show (speedscope files open at https://www.speedscope.app)")
+    parser.add_argument("--top", type=int, default=30)
+    args = parser.parse_args(argv)
+
+    if args.command == "list":
+        for path in profiles():
+            print(path)
+        return 0
+    if not args.path or not args.path.endswith(".pstats"):
+        parser.error("show needs a .pstats file")
+    pstats.Stats(args.path).sort_stats("cumulative").print_stats(args.top)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
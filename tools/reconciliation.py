@@ -0,0 +1,206 @@
+"""
+Ledger-to-bank-statement reconciliation.
+
+Entries are matched on signed amount (exact paise; ledger income and output-GST rows are
+credits, expense and input-GST rows debits) in three vectorized passes, each only seeing what
+the previous passes left unmatched:
+
+  1. exact    - hash join on (amount, date); repeated identical entries pair up in order
+  2. window   - merge_asof per amount bucket to the nearest bank date within the tolerance
+  3. fuzzy    - same amount, wider date window, best narration similarity above a threshold
+
+Every pass is a sort/merge over amount buckets rather than a ledger x bank loop, so 100k x 100k
+rows reconcile in seconds. Unmatched entries from both sides are returned for review.
+"""
+import pandas as pd
+
+from tools import financials
+
+DATE_COLUMNS = ['Date', 'Txn Date', 'Transaction Date', 'Value Date', 'Value Dt', 'Tran Date']
+NARRATION_COLUMNS = ['Narration', 'Description', 'Particulars', 'Remarks', 'Transaction Details', 'Details']
+AMOUNT_COLUMNS = ['Amount', 'Transaction Amount', 'Txn Amount']
+DEBIT_COLUMNS = ['Withdrawal', 'Withdrawals', 'Withdrawal Amt.', 'Withdrawal Amount', 'Debit', 'Debit Amount', 'Dr']
+CREDIT_COLUMNS = ['Deposit', 'Deposits', 'Deposit Amt.', 'Deposit Amount', 'Credit', 'Credit Amount', 'Cr']
+DIRECTION_COLUMNS = ['Dr/Cr', 'Dr / Cr', 'Cr/Dr', 'Type']
+
+DATE_TOLERANCE_DAYS = 3
+FUZZY_WINDOW_DAYS = 15
+FUZZY_THRESHOLD = 0.4
+# Payment-rail and filler words that say nothing about the counterparty
+NARRATION_STOPWORDS = {'neft', 'rtgs', 'imps', 'upi', 'ach', 'nach', 'chq', 'cheque', 'cms', 'trf', 'transfer', 'to', 'by', 'from', 'ref', 'no', 'payment', 'the'}
+
+
+def _first_column(df, candidates):
+    lookup = {str(column).strip().lower(): column for column in df.columns}
+    return next((lookup[c.lower()] for c in candidates if c.lower() in lookup), None)
+
+
+def normalize_bank_statement(df):
+    """
+    Maps a bank statement export to columns date, narration and amount_paise (deposits
+    positive, withdrawals negative). Accepts a signed Amount column, Amount plus Dr/Cr,
+    or separate withdrawal and deposit columns.
+    """
+    date_col = _first_column(df, DATE_COLUMNS)
+    if date_col is None:
+        raise ValueError(f"Bank statement needs a date column (one of: {', '.join(DATE_COLUMNS)}).")
+    narration_col = _first_column(df, NARRATION_COLUMNS)
+    amount_col = _first_column(df, AMOUNT_COLUMNS)
+    debit_col, credit_col = _first_column(df, DEBIT_COLUMNS), _first_column(df, CREDIT_COLUMNS)
+
+    if amount_col is not None:
+        amount = financials.to_paise(df[amount_col])
+        direction_col = _first_column(df, DIRECTION_COLUMNS)
+        if direction_col is not None:
+            is_debit = df[direction_col].astype(str).str.strip().str.upper().str.startswith('D')
+            amount = amount.abs().where(~is_debit, -amount.abs())
+    elif debit_col is not None or credit_col is not None:
+        credit = financials.to_paise(df[credit_col]) if credit_col is not None else 0
+        debit = financials.to_paise(df[debit_col]) if debit_col is not None else 0
+        amount = credit - debit
+    else:
+        raise ValueError("Bank statement needs an Amount column or Withdrawal/Deposit columns.")
+
+    return pd.DataFrame({
+        'date': financials.parse_dates(df[date_col]),
+        'narration': df[narration_col].astype(str) if narration_col is not None else '',
+        'amount_paise': amount,
+    }, index=df.index)
+
+
+def read_bank_statement(file, file_name=None):
+    """Reads a bank statement CSV/Excel (path or file-like object) and normalizes it."""
+    return normalize_bank_statement(financials.read_ledger(file, file_name))
+
+
+def _prepare_ledger(df):
+    """Ledger rows as date, narration and amount_paise signed like a bank statement (credits positive)."""
+    narration_col = _first_column(df, NARRATION_COLUMNS)
+    amount = financials.paise_values(df, 'Amount')
+    if 'Transaction Type' in df.columns:
+        types = df['Transaction Type']
+        # Other types (transfers, adjustments) keep the sign they were entered with
+        amount = amount.mask(types.isin(financials.OUTPUT_GST_TYPES), amount.abs()).mask(types.isin(financials.INPUT_GST_TYPES), -amount.abs())
+    return pd.DataFrame({
+        'date': financials.parse_dates(df['Date']) if 'Date' in df.columns else pd.NaT,
+        'narration': df[narration_col].astype(str) if narration_col is not None else '',
+        'amount_paise': amount,
+    }, index=df.index)
+
+
+def _keyed(frame, side):
+    """Adds the match key (signed paise, so a debit never pairs with a credit) and a row label column for one side."""
+    keyed = frame.assign(key=frame['amount_paise'])
+    keyed[f'{side}_row'] = frame.index
+    return keyed.dropna(subset=['date']).reset_index(drop=True)
+
+
+def _exact_pass(ledger, bank):
+    """Hash join on (amount, date). The n-th duplicate on one side pairs with the n-th on the other."""
+    left = ledger.assign(occurrence=ledger.groupby(['key', 'date']).cumcount())
+    right = bank.assign(occurrence=bank.groupby(['key', 'date']).cumcount())
+    matched = left.merge(right, on=['key', 'date', 'occurrence'], suffixes=('_ledger', '_bank'))
+    return pd.DataFrame({
+        'ledger_row': matched['ledger_row'], 'bank_row': matched['bank_row'],
+        'method': 'exact', 'date_gap_days': 0, 'score': 1.0,
+    })
+
+
+def _window_pass(ledger, bank, tolerance_days, max_rounds=5):
+    """
+    Nearest bank date within the tolerance for the same amount. merge_asof can hand one bank
+    row to several ledger rows, so each round keeps the closest claim per bank row and the
+    losers retry against what is left.
+    """
+    results = []
+    tolerance = pd.Timedelta(days=tolerance_days)
+    for _ in range(max_rounds):
+        if ledger.empty or bank.empty:
+            break
+        candidates = pd.merge_asof(
+            ledger.sort_values('date')[['date', 'key', 'ledger_row']],
+            bank.sort_values('date')[['date', 'key', 'bank_row']].assign(bank_date=lambda t: t['date']),
+            on='date', by='key', tolerance=tolerance, direction='nearest',
+        ).dropna(subset=['bank_row'])
+        if candidates.empty:
+            break
+        candidates['gap'] = (candidates['bank_date'] - candidates['date']).abs()
+        winners = candidates.sort_values(['gap', 'ledger_row']).drop_duplicates('bank_row')
+        results.append(pd.DataFrame({
+            'ledger_row': winners['ledger_row'].to_numpy(), 'bank_row': winners['bank_row'].to_numpy(),
+            'method': 'window', 'date_gap_days': winners['gap'].dt.days.to_numpy(), 'score': 1.0,
+        }))
+        ledger = ledger[~ledger['ledger_row'].isin(winners['ledger_row'])]
+        bank = bank[~bank['bank_row'].isin(winners['bank_row'])]
+    return _concat(results)
+
+
+def _tokens(narrations):
+    cleaned = narrations.str.lower().str.replace(r'[^a-z0-9 ]+', ' ', regex=True)
+    return [frozenset(word for word in text.split() if word not in NARRATION_STOPWORDS and not word.isdigit()) for text in cleaned]
+
+
+def _fuzzy_pass(ledger, bank, window_days, threshold):
+    """
+    Same amount within a wider date window, scored by narration token overlap (Jaccard).
+    Candidate pairs come from a join on amount, so only same-amount pairs are ever scored;
+    pairs are then taken greedily from best score down.
+    """
+    if ledger.empty or bank.empty:
+        return _concat([])
+    pairs = ledger[['key', 'date', 'ledger_row', 'narration']].merge(
+        bank[['key', 'date', 'bank_row', 'narration']], on='key', suffixes=('_ledger', '_bank'))
+    gap = (pairs['date_bank'] - pairs['date_ledger']).abs()
+    pairs = pairs[gap <= pd.Timedelta(days=window_days)].assign(gap=gap)
+    if pairs.empty:
+        return _concat([])
+    ledger_tokens, bank_tokens = _tokens(pairs['narration_ledger']), _tokens(pairs['narration_bank'])
+    pairs['score'] = [len(a & b) / len(a | b) if a and b else 0.0 for a, b in zip(ledger_tokens, bank_tokens)]
+    pairs = pairs[pairs['score'] >= threshold].sort_values(['score', 'gap'], ascending=[False, True])
+
+    used_ledger, used_bank, rows = set(), set(), []
+    for ledger_row, bank_row, score, pair_gap in zip(pairs['ledger_row'], pairs['bank_row'], pairs['score'], pairs['gap']):
+        if ledger_row in used_ledger or bank_row in used_bank:
+            continue
+        used_ledger.add(ledger_row)
+        used_bank.add(bank_row)
+        rows.append((ledger_row, bank_row, 'fuzzy', pair_gap.days, score))
+    return pd.DataFrame(rows, columns=['ledger_row', 'bank_row', 'method', 'date_gap_days', 'score'])
+
+
+def _concat(frames):
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        return pd.DataFrame(columns=['ledger_row', 'bank_row', 'method', 'date_gap_days', 'score'])
+    return pd.concat(frames, ignore_index=True)
+
+
+def reconcile(ledger_df, bank_df, tolerance_days=DATE_TOLERANCE_DAYS, fuzzy_window_days=FUZZY_WINDOW_DAYS, fuzzy_threshold=FUZZY_THRESHOLD):
+    """
+    Matches ledger rows (a parsed ledger with 'Date' and 'Amount') to bank rows (output of
+    normalize_bank_statement). Returns a dict with:
+      matches          - ledger_row, bank_row (original index labels), method, date_gap_days, score
+      unmatched_ledger - ledger rows with no bank counterpart
+      unmatched_bank   - bank rows with no ledger counterpart
+      summary          - counts per method and of unmatched rows
+    Rows without a parseable date are never matched.
+    """
+    ledger, bank = _keyed(_prepare_ledger(ledger_df), 'ledger'), _keyed(bank_df, 'bank')
+    passes = []
+
+    def remaining(frame, side):
+        done = passes[-1][f'{side}_row'] if passes else []
+        return frame[~frame[f'{side}_row'].isin(done)]
+
+    passes.append(_exact_pass(ledger, bank))
+    ledger, bank = remaining(ledger, 'ledger'), remaining(bank, 'bank')
+    passes.append(_window_pass(ledger, bank, tolerance_days))
+    ledger, bank = remaining(ledger, 'ledger'), remaining(bank, 'bank')
+    passes.append(_fuzzy_pass(ledger, bank, fuzzy_window_days, fuzzy_threshold))
+    matches = _concat(passes)
+
+    unmatched_ledger = ledger_df[~ledger_df.index.isin(matches['ledger_row'])]
+    unmatched_bank = bank_df[~bank_df.index.isin(matches['bank_row'])]
+    summary = matches['method'].value_counts().reindex(['exact', 'window', 'fuzzy'], fill_value=0).to_dict()
+    summary.update({'unmatched_ledger': len(unmatched_ledger), 'unmatched_bank': len(unmatched_bank)})
+    return {'matches': matches, 'unmatched_ledger': unmatched_ledger, 'unmatched_bank': unmatched_bank, 'summary': summary}
@@ -2,10 +2,18 @@ import subprocess
 from docx import Document
 from docx.shared import Inches
 import os
+from tools import llm_scheduler
 
-def auto_draft_response(metadata):
+# (issuing authority, notice name) used in the drafting prompt, by document type (see tools/document_classifier.py)
+NOTICE_PROMPTS = {
+    "Income Tax Notice": ("Income‑Tax Department", "an Income Tax Notice"),
+    "GST Notice": ("GST Department (CGST/SGST)", "a GST Notice"),
+}
+
+def auto_draft_response(metadata, document_type="Income Tax Notice"):
     # Use Ollama to draft the response
-    prompt = f"""You are a professional tax‑law assistant drafting formal reply letters to Income‑Tax Department notices.
+    authority, notice_name = NOTICE_PROMPTS.get(document_type, NOTICE_PROMPTS["Income Tax Notice"])
+    prompt = f"""You are a professional tax‑law assistant drafting formal reply letters to {authority} notices.
 
     Using the information below, compose a clear, concise, and courteous response letter. The tone should be respectful but firm, addressing each point raised in the Show‑Cause Notice. Include:
 
@@ -17,13 +25,13 @@ def auto_draft_response(metadata):
       • Date and place of signing
 
 ---
-Given the following extracted text from an Income Tax Notice, please draft a formal reply letter. Extract all the necessary information from the text.
+Given the following extracted text from {notice_name}, please draft a formal reply letter. Extract all the necessary information from the text.
 {metadata}
 ---
 Draft the letter below this line:
     """
     try:
-        result = subprocess.run(['ollama', 'run', 'mistral', prompt], capture_output=True, text=True, check=True, encoding='utf-8')
+        result = llm_scheduler.run("draft", prompt)
         response_letter = result.stdout
     except subprocess.CalledProcessError as e:
         print(f"Error running Ollama: {e}")
@@ -31,12 +39,68 @@ Draft the letter below this line:
     return response_letter
 
 from io import BytesIO
+from functools import lru_cache
+import zipfile
+import config
 
-def save_response_to_docx(response_letter):
-    docx_buffer = BytesIO()
+@lru_cache(maxsize=1)
+def _letterhead_template_bytes():
+    """
+    Builds the letterhead template once per process and caches it as bytes.
+    Uses LETTERHEAD_TEMPLATE_PATH if configured, otherwise a plain FinIQ letterhead.
+    """
+    if config.LETTERHEAD_TEMPLATE_PATH and os.path.exists(config.LETTERHEAD_TEMPLATE_PATH):
+        with open(config.LETTERHEAD_TEMPLATE_PATH, 'rb') as f:
+            return f.read()
     document = Document()
-    document.add_heading('Response Letter', 0)
-    document.add_paragraph(response_letter)
-    document.save(docx_buffer)
+    header = document.sections[0].header
+    header.paragraphs[0].text = "FinIQ - Empowering MSMEs with Actionable Insights"
+    buffer = BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+def new_document():
+    """Returns a fresh Document cloned from the cached letterhead template."""
+    return Document(BytesIO(_letterhead_template_bytes()))
+
+def write_docx(text, stream, heading=None):
+    """Writes `text` as a .docx (on the letterhead) into any writable binary stream."""
+    document = new_document()
+    if heading:
+        document.add_heading(heading, 0)
+    document.add_paragraph(text)
+    document.save(stream)
+
+def build_docx(text, heading=None):
+    """Returns an in-memory .docx buffer positioned at the start."""
+    docx_buffer = BytesIO()
+    write_docx(text, docx_buffer, heading)
     docx_buffer.seek(0)  # Go to the start of the buffer
-    return docx_buffer
\ No newline at end of file
+    return docx_buffer
+
+def save_response_to_docx(response_letter):
+    return build_docx(response_letter, heading='Response Letter')
+
+def export_reports_zip(reports, destination):
+    """
+    Writes many reports into one .zip archive.
+    `reports` is an iterable of (file_name, text, heading) tuples and may be a generator, so
+    the texts never need to be held in memory together; each .docx is written straight into
+    its zip entry. `destination` is a path or a writable binary file object.
+    Returns the number of reports written.
+    """
+    count = 0
+    used_names = set()
+    with zipfile.ZipFile(destination, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for file_name, text, heading in reports:
+            # Avoid silently overwriting entries when two notices share a name
+            base, ext = os.path.splitext(file_name)
+            name, suffix = file_name, 1
+            while name in used_names:
+                name = f"{base}_{suffix}{ext}"
+                suffix += 1
+            used_names.add(name)
+            with archive.open(name, 'w') as entry:
+                write_docx(text, entry, heading)
+            count += 1
+    return count
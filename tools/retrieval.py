@@ -0,0 +1,426 @@
+"""
+Local retrieval index for grounding chat answers in the firm's own notices and replies.
+
+Texts from document_texts (OCR Markdown and drafted responses) are split into overlapping word
+chunks and embedded on CPU with a small sentence-transformer (mean-pooled, L2-normalised), so
+cosine similarity is a dot product. Everything lives in one folder:
+
+    vectors.f16   every chunk vector, float16, row i = chunk i (append-only, memory-mapped)
+    ivf.f16       the indexed vectors reordered so each IVF list is one contiguous slice
+    ivf.npz       k-means centroids, list offsets and the chunk id at each ivf.f16 row
+    chunks.db     chunk text and provenance (SQLite), plus which source version is indexed
+
+Search is IVF approximate nearest-neighbour: the query is compared with the centroids and only
+the `nprobe` closest lists are scanned. Chunks added since the last build sit in a small tail
+that is scanned exhaustively; once the tail grows past TAIL_REBUILD_RATIO of the index, the
+IVF lists are rebuilt.
+
+The app shares one open index per tenant between its session threads (get_index()); calls
+that use it hold index.lock, and a meta.json rewritten by another process (the CLI, batch
+ingest) is picked up on the next get_index().
+
+Usage:
+    python -m tools.retrieval sync      # embed new / changed documents
+    python -m tools.retrieval rebuild   # recluster the IVF lists
+    python -m tools.retrieval query "notice under section 148A"
+"""
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+from functools import lru_cache
+
+import numpy as np
+
+import database
+from tools import metrics
+
+INDEX_ROOT = os.path.join("data", "retrieval_index")
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+CHUNK_WORDS = 180
+CHUNK_OVERLAP = 40
+NPROBE = 16
+TAIL_REBUILD_RATIO = 0.2
+MIN_INDEXED = 256  # Below this, exhaustive search is faster than clustering
+
+
+# --- Embedding ---
+
+class Embedder:
+    """Mean-pooled transformer sentence embeddings on CPU. The model loads on first use."""
+
+    def __init__(self, model_name=MODEL_NAME, max_length=256, batch_size=64):
+        self.model_name = model_name
+        self.max_length = max_length
+        self.batch_size = batch_size
+        self._tokenizer = self._model = None
+
+    def _load(self):
+        if self._model is None:
+            try:
+                from transformers import AutoModel, AutoTokenizer
+            except ImportError as e:
+                raise ImportError("Retrieval needs transformers and torch. Install them with: pip install transformers torch") from e
+            self._tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+            self._model = AutoModel.from_pretrained(self.model_name).eval()
+
+    @property
+    def dim(self):
+        self._load()
+        return self._model.config.hidden_size
+
+    def encode(self, texts):
+        """Returns an (n, dim) float32 array of unit-length embeddings."""
+        import torch
+        self._load()
+        batches = []
+        with torch.inference_mode():
+            for start in range(0, len(texts), self.batch_size):
+                encoded = self._tokenizer(texts[start:start + self.batch_size], padding=True, truncation=True, max_length=self.max_length, return_tensors="pt")
+                hidden = self._model(**encoded).last_hidden_state
+                mask = encoded["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+                pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)
+                batches.append(torch.nn.functional.normalize(pooled, dim=1).numpy())
+        return np.concatenate(batches) if batches else np.zeros((0, self.dim), dtype=np.float32)
+
+
+@lru_cache(maxsize=1)
+def get_embedder():
+    return Embedder()
+
+
+def chunk_text(text, max_words=CHUNK_WORDS, overlap=CHUNK_OVERLAP):
+    """Splits text into overlapping windows of whole words."""
+    words = (text or "").split()
+    if not words:
+        return []
+    step = max(max_words - overlap, 1)
+    return [" ".join(words[start:start + max_words]) for start in range(0, max(len(words) - overlap, 1), step)]
+
+
+# --- k-means for the IVF lists ---
+
+def kmeans(vectors, n_clusters, iterations=10, points_per_cluster=48, seed=0):
+    """
+    Spherical k-means (cosine) on a sample of points_per_cluster vectors per centroid, which is
+    plenty for list assignment. Returns unit-length float32 centroids; empty clusters are
+    re-seeded from random sample points.
+    """
+    rng = np.random.default_rng(seed)
+    sample_rows = rng.choice(len(vectors), size=min(len(vectors), points_per_cluster * n_clusters), replace=False)
+    sample = np.asarray(vectors[np.sort(sample_rows)], dtype=np.float32)
+    centroids = sample[rng.choice(len(sample), size=n_clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = _nearest(sample, centroids)
+        counts = np.bincount(assignment, minlength=n_clusters)
+        order = np.argsort(assignment, kind="stable")
+        sums = np.zeros_like(centroids)
+        present = counts > 0
+        # Sum each cluster's members in one pass over the sorted sample
+        sums[present] = np.add.reduceat(sample[order], np.concatenate([[0], np.cumsum(counts)[:-1]])[present])
+        empty = ~present
+        sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()), replace=False)]
+        centroids = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-12)
+    return centroids
+
+
+def _nearest(vectors, centroids, batch=16384):
+    """Index of the most similar centroid for every vector, in batches to bound memory."""
+    result = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), batch):
+        block = np.asarray(vectors[start:start + batch], dtype=np.float32)
+        result[start:start + batch] = (block @ centroids.T).argmax(axis=1)
+    return result
+
+
+def _top_k(scores, ids, k):
+    if len(scores) > k:
+        keep = np.argpartition(-scores, k)[:k]
+        scores, ids = scores[keep], ids[keep]
+    order = np.argsort(-scores)
+    return scores[order], ids[order]
+
+
+# --- Index ---
+
+class RetrievalIndex:
+    """Memory-mapped float16 vectors with an IVF list structure and SQLite chunk metadata."""
+
+    def __init__(self, root=None, dim=None):
+        root = root or database.tenant_path(INDEX_ROOT)
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self.meta_path = os.path.join(root, "meta.json")
+        self.meta = {"dim": dim, "count": 0, "indexed": 0}
+        self._meta_mtime = None
+        self.refresh()
+        self.lock = threading.RLock()  # Serializes threads sharing this index (see get_index)
+        self.conn = sqlite3.connect(os.path.join(root, "chunks.db"), check_same_thread=False)
+        self.conn.executescript("""
+        CREATE TABLE IF NOT EXISTS chunks (
+            id INTEGER PRIMARY KEY,     -- Row in vectors.f16
+            source_key TEXT NOT NULL,   -- '<document_texts id>:<ocr|response>'
+            client_id INTEGER,
+            filename TEXT,
+            kind TEXT,
+            text TEXT NOT NULL,
+            deleted INTEGER DEFAULT 0   -- Superseded by a newer version of the source
+        );
+        CREATE INDEX IF NOT EXISTS idx_chunks_source ON chunks(source_key);
+        CREATE TABLE IF NOT EXISTS sources (
+            source_key TEXT PRIMARY KEY,
+            version TEXT                -- SHA-1 of the text that was embedded
+        );
+        """)
+        self._ivf = None
+
+    def close(self):
+        self.conn.close()
+
+    def refresh(self):
+        """Reloads meta.json if another process has rewritten it since it was last read."""
+        try:
+            mtime = os.path.getmtime(self.meta_path)
+        except OSError:
+            return
+        if mtime != self._meta_mtime:
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                self.meta.update(json.load(f))
+            self._meta_mtime = mtime
+            self._ivf = None
+
+    def _save_meta(self):
+        with open(self.meta_path, "w", encoding="utf-8") as f:
+            json.dump(self.meta, f)
+        self._meta_mtime = os.path.getmtime(self.meta_path)
+
+    def _vectors(self, name="vectors.f16", rows=None):
+        rows = self.meta["count"] if rows is None else rows
+        if not rows:
+            return np.zeros((0, self.meta["dim"] or 0), dtype=np.float16)
+        return np.memmap(os.path.join(self.root, name), dtype=np.float16, mode="r", shape=(rows, self.meta["dim"]))
+
+    # Writing
+
+    def source_versions(self, keys=None):
+        if keys is None:
+            return dict(self.conn.execute("SELECT source_key, version FROM sources").fetchall())
+        keys = list(keys)
+        if not keys:
+            return {}
+        placeholders = ", ".join("?" * len(keys))
+        return dict(self.conn.execute(f"SELECT source_key, version FROM sources WHERE source_key IN ({placeholders})", keys).fetchall())
+
+    def add(self, records, vectors, source_versions=None):
+        """
+        Appends chunks and their vectors. `records` are dicts with source_key, client_id,
+        filename, kind and text; earlier chunks from the same sources are marked deleted.
+        """
+        vectors = np.asarray(vectors, dtype=np.float16)
+        if self.meta["dim"] is None:
+            self.meta["dim"] = int(vectors.shape[1])
+        start = self.meta["count"]
+        keys = sorted({record["source_key"] for record in records} | set(source_versions or {}))
+        with self.conn:
+            self.conn.executemany("UPDATE chunks SET deleted = 1 WHERE source_key = ?", [(key,) for key in keys])
+            self.conn.executemany(
+                "INSERT INTO chunks (id, source_key, client_id, filename, kind, text) VALUES (?, ?, ?, ?, ?, ?)",
+                [(start + i, r["source_key"], r.get("client_id"), r.get("filename"), r.get("kind"), r["text"]) for i, r in enumerate(records)],
+            )
+            self.conn.executemany("INSERT OR REPLACE INTO sources (source_key, version) VALUES (?, ?)", list((source_versions or {}).items()))
+        with open(os.path.join(self.root, "vectors.f16"), "ab") as f:
+            f.write(vectors.tobytes())
+        self.meta["count"] = start + len(records)
+        self._save_meta()
+        tail = self.meta["count"] - self.meta["indexed"]
+        if self.meta["count"] >= MIN_INDEXED and tail > TAIL_REBUILD_RATIO * max(self.meta["indexed"], 1):
+            self.rebuild()
+
+    def rebuild(self, n_lists=None):
+        """Reclusters every live vector into IVF lists and rewrites ivf.f16 in list order."""
+        live = np.array([row[0] for row in self.conn.execute("SELECT id FROM chunks WHERE deleted = 0 ORDER BY id")], dtype=np.int64)
+        vectors = self._vectors()
+        if len(live) == 0:
+            self.meta["indexed"] = self.meta["count"]
+            self._save_meta()
+            return
+        n_lists = n_lists or int(np.clip(2 * np.sqrt(len(live)), 1, 4096))
+        n_lists = min(n_lists, len(live))
+        live_vectors = vectors[live]
+        centroids = kmeans(live_vectors, n_lists)
+        assignment = _nearest(live_vectors, centroids)
+        order = np.argsort(assignment, kind="stable")
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(assignment, minlength=n_lists))])
+        ivf = np.memmap(os.path.join(self.root, "ivf.f16.tmp"), dtype=np.float16, mode="w+", shape=live_vectors.shape)
+        ivf[:] = live_vectors[order]
+        ivf.flush()
+        del ivf
+        os.replace(os.path.join(self.root, "ivf.f16.tmp"), os.path.join(self.root, "ivf.f16"))
+        np.savez(os.path.join(self.root, "ivf.npz"), centroids=centroids, offsets=offsets, ids=live[order])
+        self.meta.update({"indexed": self.meta["count"], "ivf_rows": int(len(live))})
+        self._save_meta()
+        self._ivf = None
+
+    # Searching
+
+    def _load_ivf(self):
+        if self._ivf is None and self.meta.get("ivf_rows"):
+            with np.load(os.path.join(self.root, "ivf.npz")) as data:
+                self._ivf = (data["centroids"], data["offsets"], data["ids"], self._vectors("ivf.f16", self.meta["ivf_rows"]))
+        return self._ivf
+
+    def search_vector(self, query, k=5, nprobe=NPROBE, exact=False):
+        """
+        Returns (scores, chunk ids) of the k nearest live chunks to a unit-length query vector.
+        exact=True scans every vector (used to measure recall).
+        """
+        query = np.asarray(query, dtype=np.float32).ravel()
+        all_scores, all_ids = [], []
+        ivf = None if exact else self._load_ivf()
+        if ivf is not None:
+            centroids, offsets, ids, ivf_vectors = ivf
+            probe = np.argpartition(-(centroids @ query), min(nprobe, len(centroids)) - 1)[:nprobe]
+            for lst in probe:
+                start, end = offsets[lst], offsets[lst + 1]
+                if end > start:
+                    all_scores.append(np.asarray(ivf_vectors[start:end], dtype=np.float32) @ query)
+                    all_ids.append(ids[start:end])
+            tail_start = self.meta["indexed"]
+        else:
+            tail_start = 0
+        if self.meta["count"] > tail_start:
+            tail = np.asarray(self._vectors()[tail_start:], dtype=np.float32)
+            all_scores.append(tail @ query)
+            all_ids.append(np.arange(tail_start, self.meta["count"]))
+        if not all_scores:
+            return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.int64)
+        # Over-fetch so chunks superseded since the last rebuild can be dropped
+        scores, ids = _top_k(np.concatenate(all_scores), np.concatenate(all_ids), k * 2)
+        live = self._live(ids)
+        keep = np.array([chunk_id in live for chunk_id in ids], dtype=bool)
+        return scores[keep][:k], ids[keep][:k]
+
+    def _live(self, ids):
+        if len(ids) == 0:
+            return set()
+        placeholders = ", ".join("?" * len(ids))
+        return {row[0] for row in self.conn.execute(f"SELECT id FROM chunks WHERE deleted = 0 AND id IN ({placeholders})", [int(i) for i in ids])}
+
+    def chunks(self, ids):
+        """Chunk records (dicts) for the given ids, in the same order."""
+        if len(ids) == 0:
+            return []
+        placeholders = ", ".join("?" * len(ids))
+        rows = self.conn.execute(f"SELECT id, source_key, client_id, filename, kind, text FROM chunks WHERE id IN ({placeholders})", [int(i) for i in ids])
+        by_id = {row[0]: dict(zip(["id", "source_key", "client_id", "filename", "kind", "text"], row)) for row in rows}
+        return [by_id[int(i)] for i in ids if int(i) in by_id]
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(root=None):
+    """The process-wide index for the current tenant (or `root`), opened on first use."""
+    root = root or database.tenant_path(INDEX_ROOT)
+    with _indexes_lock:
+        index = _indexes.get(root)
+        if index is None:
+            index = _indexes[root] = RetrievalIndex(root)
+    with index.lock:
+        index.refresh()
+    return index
+
+
+# --- Pipeline ---
+
+def sync_documents(index=None, embedder=None, text_ids=None):
+    """
+    Embeds the document_texts rows (OCR text and response) that are new or changed since they
+    were last embedded: all of them, or only `text_ids` (e.g. the document just uploaded).
+    Returns the number of chunks added.
+    """
+    index = index or get_index()
+    embedder = embedder or get_embedder()
+    texts = database.get_document_texts(text_ids)
+    with index.lock:
+        if text_ids is None:
+            versions = index.source_versions()
+        else:
+            versions = index.source_versions(f"{row[0]}:{kind}" for row in texts for kind in ("ocr", "response"))
+        records, source_versions, unchanged = [], {}, 0
+        for text_id, client_id, filename, ocr_text, response_text, _ in texts:
+            for kind, text in (("ocr", ocr_text), ("response", response_text)):
+                key = f"{text_id}:{kind}"
+                version = hashlib.sha1((text or "").encode("utf-8")).hexdigest()
+                if versions.get(key) == version:
+                    unchanged += 1
+                    continue
+                source_versions[key] = version
+                records.extend({"source_key": key, "client_id": client_id, "filename": filename, "kind": kind, "text": chunk} for chunk in chunk_text(text))
+        metrics.inc("finiq_cache_requests_total", unchanged, cache="embeddings", result="hit")
+        metrics.inc("finiq_cache_requests_total", len(source_versions), cache="embeddings", result="miss")
+        if not source_versions:
+            return 0
+        vectors = embedder.encode([record["text"] for record in records]) if records else np.zeros((0, index.meta["dim"] or embedder.dim), dtype=np.float32)
+        index.add(records, vectors, source_versions)
+        return len(records)
+
+
+def retrieve(question, k=4, client_id=None, index=None, embedder=None):
+    """Top-k chunk records for a question, each with a 'score' (cosine similarity)."""
+    index = index or get_index()
+    if not index.meta["count"]:
+        return []
+    embedder = embedder or get_embedder()
+    query = embedder.encode([question])[0]
+    with index.lock:
+        # Fetch extra when filtering by client so k results usually remain
+        scores, ids = index.search_vector(query, k * 4 if client_id else k)
+        chunks = index.chunks(ids)
+    results = []
+    for chunk, score in zip(chunks, scores):
+        if client_id is None or chunk["client_id"] == client_id:
+            results.append(dict(chunk, score=float(score)))
+    return results[:k]
+
+
+def format_context(chunks, max_chars=4000):
+    """Formats retrieved chunks as numbered excerpts for the chat prompt, within max_chars."""
+    parts, used = [], 0
+    for number, chunk in enumerate(chunks, start=1):
+        label = "reply" if chunk["kind"] == "response" else "notice"
+        part = f"[{number}] ({chunk['filename']}, {label}) {chunk['text']}"
+        if used + len(part) > max_chars:
+            break
+        parts.append(part)
+        used += len(part)
+    return "\n\n".join(parts)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain and query the local document retrieval index.")
+    parser.add_argument("command", choices=["sync", "rebuild", "query"])
+    parser.add_argument("question", nargs="?", help="Question for the query command")
+    parser.add_argument("-k", type=int, default=5, help="Results to return")
+    args = parser.parse_args(argv)
+
+    database.create_database()
+    index = RetrievalIndex()
+    if args.command == "sync":
+        print(f"Added {sync_documents(index)} chunks ({index.meta['count']} total).")
+    elif args.command == "rebuild":
+        index.rebuild()
+        print(f"Rebuilt IVF lists over {index.meta.get('ivf_rows', 0)} chunks.")
+    else:
+        for chunk in retrieve(args.question or "", args.k, index=index):
+            print(f"{chunk['score']:.3f}  {chunk['filename']} ({chunk['kind']}): {chunk['text'][:160]}")
+    index.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+"""
+Period-bucketed GST and income-tax computation.
+
+GSTR-3B needs monthly (or quarterly, under QRMP) GST figures and advance tax needs cumulative
+figures up to each installment date. compute_periods() derives per-row components once, buckets
+them by calendar month with a single groupby, and builds quarterly, financial-year and
+cumulative views from the monthly table, so every period comes out of one pass over the rows.
+"""
+import pandas as pd
+
+from tools import financials
+
+COMPONENTS = ['income', 'expenses', 'tds', 'input_gst', 'output_gst']
+PAISE_COMPONENTS = ['income', 'expenses', 'tds']
+
+# Advance tax installments: (month, day, cumulative share of the year's tax due by then)
+ADVANCE_TAX_SCHEDULE = [(6, 15, 0.15), (9, 15, 0.45), (12, 15, 0.75), (3, 15, 1.00)]
+
+
+def row_components(df, gst_rate=0.18):
+    """
+    Per-row income, expenses, TDS, input and output GST as a DataFrame aligned with df.
+    Income, expenses and TDS are int64 paise so period sums are exact; GST is in rupees.
+    """
+    amounts = financials.paise_values(df, 'Amount')
+    types = df['Transaction Type']
+    frame = pd.DataFrame({
+        'income': amounts.where(types.isin(financials.INCOME_TYPES), 0),
+        'expenses': amounts.where(types == 'Expense', 0),
+        'tds': financials.paise_values(df, 'TDS Deducted'),
+    }, index=df.index)
+    if 'GST Included' in df.columns:
+        frame['input_gst'], frame['output_gst'] = financials.gst_components(df, gst_rate)
+    else:
+        frame['input_gst'] = frame['output_gst'] = 0.0
+    return frame
+
+
+def _add_derived(table, slabs):
+    table['profit'] = table['income'] - table['expenses']
+    table['net_gst'] = table['output_gst'] - table['input_gst']
+    if slabs is not None:
+        table['income_tax'] = financials.slab_tax(table['profit'].to_numpy(), slabs)
+    return table
+
+
+def compute_periods(df, gst_rate=0.18, slabs=financials.NEW_REGIME_SLABS):
+    """
+    Returns a dict of DataFrames:
+      monthly     - one row per calendar month, with cumulative-to-date columns within each FY
+      quarterly   - one row per financial-year quarter
+      fiscal_year - one row per financial year, with slab-based income tax on profit
+      advance_tax - cumulative profit and installment due at each advance-tax due date
+    Rows without a parseable 'Date' are left out of every bucket.
+    """
+    if financials.missing_columns(df) or 'Date' not in df.columns:
+        raise ValueError("Period computation needs 'Date', 'Transaction Type' and 'Amount' columns.")
+    dates = financials.parse_dates(df['Date'])
+    components = row_components(df, gst_rate)[dates.notna()]
+    months = dates[dates.notna()].dt.to_period('M')
+
+    # The only pass over the rows; every other view aggregates this (tiny) monthly table
+    monthly = components.groupby(months).sum().sort_index()
+    monthly[PAISE_COMPONENTS] = monthly[PAISE_COMPONENTS] / 100
+    monthly.index.name = 'month'
+    month_starts = monthly.index.to_timestamp()
+    monthly['fiscal_year'] = financials.fiscal_year_label(pd.Series(month_starts, index=monthly.index))
+    monthly['quarter'] = financials.fiscal_quarter_label(pd.Series(month_starts, index=monthly.index))
+
+    for column in COMPONENTS:
+        monthly[f'cumulative_{column}'] = monthly.groupby('fiscal_year')[column].cumsum()
+
+    quarterly = _add_derived(monthly.groupby('quarter')[COMPONENTS].sum(), None)
+    fiscal_year = _add_derived(monthly.groupby('fiscal_year')[COMPONENTS].sum(), slabs)
+    monthly = _add_derived(monthly, None)
+
+    return {
+        'monthly': monthly.reset_index().assign(month=lambda t: t['month'].astype(str)),
+        'quarterly': quarterly.reset_index(),
+        'fiscal_year': fiscal_year.reset_index(),
+        'advance_tax': advance_tax_schedule(monthly, fiscal_year),
+    }
+
+
+def advance_tax_schedule(monthly, fiscal_year):
+    """
+    Cumulative profit up to each advance-tax due date and the installment payable by then
+    (share of the year's slab tax net of TDS). Installment dates fall mid-month, so the
+    cumulative figure uses months fully completed before the due date.
+    """
+    rows = []
+    for fy_label, fy_row in fiscal_year.iterrows():
+        start_year = int(fy_label[2:6])
+        fy_months = monthly[monthly['fiscal_year'] == fy_label]
+        net_tax = max(fy_row.get('income_tax', 0.0) - fy_row['tds'], 0.0)
+        for month, day, share in ADVANCE_TAX_SCHEDULE:
+            due_date = pd.Timestamp(start_year + (1 if month < 4 else 0), month, day)
+            completed = fy_months[fy_months.index < due_date.to_period('M')]
+            rows.append({
+                'fiscal_year': fy_label,
+                'due_date': due_date.date(),
+                'cumulative_share': share,
+                'cumulative_profit': float(completed['profit'].sum()),
+                'cumulative_tds': float(completed['tds'].sum()),
+                'installment_due': net_tax * share,
+            })
+    return pd.DataFrame(rows, columns=['fiscal_year', 'due_date', 'cumulative_share', 'cumulative_profit', 'cumulative_tds', 'installment_due'])